@@ -0,0 +1,148 @@
+import asyncio
+from contextlib import asynccontextmanager
+import ib_insync
+from IBconnect.InteractiveBrokerTradeAPI_test import BrokerAPI, OrderBatch
+from datetime import datetime, timedelta
+import math
+
+
+class AsyncBrokerAPI(BrokerAPI):
+    ''' asyncio variant of BrokerAPI on the *Async methods of ib_insync.
+
+    Network calls are coroutines, so many requests are in flight at once:
+    fetch_last_prices prices a whole portfolio in about the time of its
+    slowest quote instead of one polling loop per ticker. The client is
+    injectable (api_client), so a fake IB client can stand in for TWS.
+    Account info is read from the client cache and stays synchronous.
+    '''
+
+    def __init__(self, default_currency='USD', api_client=None, host='127.0.0.1', port=7497, client_id=101,
+                 quote_timeout=10, calendar_file=None):
+        super().__init__(default_currency, calendar_file)
+        self.api_client = api_client
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.quote_timeout = quote_timeout
+
+    @asynccontextmanager
+    async def establish_connection(self):
+        if self.api_client is None:
+            self.api_client = ib_insync.IB()
+        self.api_client.orderStatusEvent += self._handle_order_status
+        await self.api_client.connectAsync(self.host, self.port, self.client_id)
+        self.api_client.reqMarketDataType(3)  # delayed data when there is no live subscription
+        print("=" * 30)
+        print("Connected to the API")
+        print("=" * 30)
+
+        try:
+            yield self
+        finally:
+            self.api_client.orderStatusEvent -= self._handle_order_status
+            self.api_client.disconnect()
+            print("=" * 30)
+            print("Disconnected from the API")
+            print("=" * 30)
+
+    async def _qualify(self, tickers):
+        contracts = self._cached_contracts(tickers)
+        missing = [contract for contract in contracts.values() if not contract.conId]
+        if missing:
+            await self.api_client.qualifyContractsAsync(*missing)  # one round trip for all of them
+            self._cache_contracts(missing)
+        return [contracts[ticker] for ticker in tickers]
+
+    async def _snapshot_last(self, contract, timeout):
+        ''' Last price of one snapshot request, resolved on the first tick that carries it.'''
+        market_quote = self.api_client.reqMktData(
+            contract,
+            genericTickList="",
+            snapshot=True,
+            regulatorySnapshot=False,
+            mktDataOptions=None
+        )
+
+        async def last_tick():
+            while math.isnan(market_quote.last):
+                await market_quote.updateEvent
+            return market_quote.last
+
+        try:
+            return await asyncio.wait_for(last_tick(), timeout)
+        except asyncio.TimeoutError:
+            print(f'No last price available for {contract.symbol}')
+            return 0
+
+    async def fetch_last_prices(self, tickers, timeout=None):
+        ''' Last prices of many tickers as {ticker: price}, requested concurrently;
+        a ticker without a price after timeout seconds is reported as 0.
+        '''
+        timeout = self.quote_timeout if timeout is None else timeout
+        contracts = await self._qualify(tickers)
+        prices = await asyncio.gather(*[self._snapshot_last(contract, timeout) for contract in contracts])
+        return dict(zip(tickers, prices))
+
+    async def fetch_last_price(self, ticker: str, timeout=None):
+        return (await self.fetch_last_prices([ticker], timeout))[ticker]
+
+    async def submit_orders(self, orders: dict, timeout: float = 30):
+        ''' Place all orders ({ticker: signed qty}) at once and wait until every one of them is
+        terminal, or timeout seconds. Returns one dict per order with its status and latency.
+        '''
+        contracts = await self._qualify(list(orders))
+        batch = OrderBatch()
+        finished = asyncio.Event()
+        batch.on_done = finished.set
+        self.api_client.orderStatusEvent += batch.on_status
+        try:
+            self._place_orders(orders, contracts, batch)
+            if not batch.done:
+                await asyncio.wait_for(finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.api_client.orderStatusEvent -= batch.on_status
+        order_details = batch.report()
+        self._print_order_report(order_details)
+        return order_details
+
+    async def submit_order(self, ticker: str, qty: int, limit_price: float = 0, timeout: float = 30):
+        await self.submit_orders({ticker: qty}, timeout)
+
+        return True
+
+    async def trading_calendar(self):
+        if self._calendar_is_current():
+            return self.calendar
+        spy_stock, = await self._qualify(['SPY'])
+        return self._update_calendar((await self.api_client.reqContractDetailsAsync(spy_stock))[0])
+
+    async def is_trading_day_open(self, offset_days=0):
+        day = (datetime.now(self.local_timezone) + timedelta(days=offset_days)).date()
+        return (await self.trading_calendar()).is_trading_day(day)
+
+    async def is_market_open_now(self):
+        return (await self.trading_calendar()).is_open(datetime.now(self.local_timezone))
+
+    async def fetch_transaction_history(self):
+        pass
+
+
+async def main():
+    trading_api = AsyncBrokerAPI()
+    print(datetime.now().strftime('Current date: %Y-%m-%d'))
+    async with trading_api.establish_connection() as api_instance:
+        accounts_info, positions_info, orders_info = api_instance.retrieve_account_info()
+        print(ib_insync.util.df(accounts_info))
+        print(ib_insync.util.df(positions_info))
+        market_open = await api_instance.is_trading_day_open()
+        market_open_now = await api_instance.is_market_open_now()  # same calendar, no second request
+        print(f'Market Open: {market_open}')
+        print(f'Market Open Now: {market_open_now}')
+        print(await api_instance.fetch_last_prices(['SSO', 'SPY', 'AAPL', 'MSFT']))
+
+
+# Entry point for the application
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,21 +1,73 @@
 from contextlib import contextmanager
 import ib_insync
 from IBconnect.TradeAPI_interface import AbstractTradeInterface
+from IBconnect.tradingCalendar import TradingCalendar
 from datetime import datetime, timedelta
 import math
+import os
+import time
 from zoneinfo import ZoneInfo
 
+
+class OrderBatch(object):
+    ''' Orders placed together, completed by orderStatusEvent.
+
+    The latency of an order is the time from placeOrder to its terminal
+    status (filled, cancelled or inactive).
+    '''
+    TERMINAL_STATES = ib_insync.OrderStatus.DoneStates | {'Inactive'}
+
+    def __init__(self):
+        self.trades = []
+        self.sent_at = {}
+        self.latency = {}
+        self.on_done = None  # called once every order is terminal
+
+    def add(self, trade, sent_at):
+        self.trades.append(trade)
+        self.sent_at[trade.order.orderId] = sent_at
+
+    @property
+    def done(self):
+        return len(self.latency) == len(self.trades)
+
+    def on_status(self, trade):
+        order_id = trade.order.orderId
+        if order_id in self.sent_at and order_id not in self.latency \
+                and trade.orderStatus.status in self.TERMINAL_STATES:
+            self.latency[order_id] = time.perf_counter() - self.sent_at[order_id]
+            if self.done and self.on_done is not None:
+                self.on_done()
+
+    def report(self):
+        order_details = []
+        for trade in self.trades:
+            order_info = {}
+            order_info['id'] = trade.order.orderId
+            order_info['ticker'] = trade.contract.symbol
+            order_info['side'] = trade.order.action
+            order_info['quantity'] = trade.order.totalQuantity
+            order_info['filled'] = trade.orderStatus.filled
+            order_info['avg_fill_price'] = trade.orderStatus.avgFillPrice
+            order_info['status'] = trade.orderStatus.status
+            order_info['latency'] = self.latency.get(trade.order.orderId)  # None: not terminal before the timeout
+            order_details.append(order_info)
+        return order_details
+
 class BrokerAPI(AbstractTradeInterface):
-    def __init__(self, default_currency='USD'):
+    def __init__(self, default_currency='USD', calendar_file=None):
         self.api_client = None
         self.user_accounts = []
         self.default_currency = default_currency
         self.local_timezone = ZoneInfo('US/Eastern')
+        self.contracts = {}  # ticker -> qualified contract, conIds do not change between connections
+        self.calendar_file = calendar_file  # persisted trading calendar, also used when not connected
+        self.calendar = None
 
     @contextmanager
     def establish_connection(self):
         self.api_client = ib_insync.IB()
-        self.api_client.orderStatusEvent += self.__handle_order_status
+        self.api_client.orderStatusEvent += self._handle_order_status
         self.api_client.connect('127.0.0.1', 7497, 101)
         print("=" * 30)
         print("Connected to the API")
@@ -24,7 +76,6 @@ class BrokerAPI(AbstractTradeInterface):
         yield self
 
         self.api_client.disconnect()
-        self.api_client.sleep(2)
         print("=" * 30)
         print("Disconnected from the API")
         print("=" * 30)
@@ -77,22 +128,75 @@ class BrokerAPI(AbstractTradeInterface):
             order_details.append(order_info)
         return account_details, position_details, order_details
 
-    def submit_order(self, ticker: str, qty: int, limit_price: float = 0):
-        stock_contract = ib_insync.Stock(ticker.upper(), 'SMART', self.default_currency)
-        self.api_client.qualifyContracts(stock_contract)
+    def _qualify(self, tickers):
+        ''' Qualified contracts of tickers, only the ones not seen before are sent to the broker.'''
+        contracts = self._cached_contracts(tickers)
+        missing = [contract for contract in contracts.values() if not contract.conId]
+        if missing:
+            self.api_client.qualifyContracts(*missing)
+            self._cache_contracts(missing)
+        return [contracts[ticker] for ticker in tickers]
+
+    def _cached_contracts(self, tickers):
+        return {ticker: self.contracts.get(ticker.upper()) or ib_insync.Stock(ticker.upper(), 'SMART', self.default_currency)
+                for ticker in tickers}
+
+    def _cache_contracts(self, contracts):
+        for contract in contracts:
+            if contract.conId:  # unqualified contracts are looked up again next time
+                self.contracts[contract.symbol] = contract
+            else:
+                print(f'Contract for {contract.symbol} could not be qualified')
+
+    @staticmethod
+    def _market_order(qty):
         if qty >= 0:
-            order = ib_insync.MarketOrder('BUY', qty)
-        else:
-            order = ib_insync.MarketOrder('SELL', -qty)
-        self.api_client.placeOrder(stock_contract, order)
-        self.api_client.sleep(5)
+            return ib_insync.MarketOrder('BUY', qty)
+        return ib_insync.MarketOrder('SELL', -qty)
+
+    def _place_orders(self, orders, contracts, batch):
+        for (ticker, qty), contract in zip(orders.items(), contracts):
+            sent_at = time.perf_counter()
+            batch.add(self.api_client.placeOrder(contract, self._market_order(qty)), sent_at)
+
+    @staticmethod
+    def _print_order_report(order_details):
+        for order_info in order_details:
+            if order_info['latency'] is None:
+                print(f"Order [{order_info['ticker']}] {order_info['status']}, not done before the timeout")
+            else:
+                print(f"Order [{order_info['ticker']}] {order_info['status']} {order_info['filled']}/"
+                      f"{order_info['quantity']} in {order_info['latency']:.3f}s")
+
+    def submit_orders(self, orders: dict, timeout: float = 30):
+        ''' Place all orders ({ticker: signed qty}) at once and wait until every one of them is
+        terminal, or timeout seconds. Returns one dict per order with its status and latency.
+        '''
+        contracts = self._qualify(list(orders))
+        batch = OrderBatch()
+        self.api_client.orderStatusEvent += batch.on_status
+        try:
+            self._place_orders(orders, contracts, batch)
+            deadline = time.perf_counter() + timeout
+            while not batch.done:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.api_client.waitOnUpdate(timeout=remaining)  # wakes on the next message from TWS
+        finally:
+            self.api_client.orderStatusEvent -= batch.on_status
+        order_details = batch.report()
+        self._print_order_report(order_details)
+        return order_details
+
+    def submit_order(self, ticker: str, qty: int, limit_price: float = 0, timeout: float = 30):
+        self.submit_orders({ticker: qty}, timeout)
 
         return True
 
     def fetch_last_price(self, ticker: str):
-        stock_contract = ib_insync.Stock(ticker.upper(), 'SMART', self.default_currency)
         self.api_client.reqMarketDataType(3)
-        self.api_client.qualifyContracts(stock_contract)
+        stock_contract, = self._qualify([ticker])
         market_quote = self.api_client.reqMktData(
             stock_contract,
             genericTickList="",
@@ -109,7 +213,7 @@ class BrokerAPI(AbstractTradeInterface):
         print(f'No last price available for {ticker}')
         return 0
 
-    def __handle_order_status(self, trade):
+    def _handle_order_status(self, trade):
         ''' Callback function for order status updates '''
         print(f'Order [{trade.contract.symbol}] status changed: {trade.orderStatus.status}')
         match trade.orderStatus.status:
@@ -118,37 +222,38 @@ class BrokerAPI(AbstractTradeInterface):
             case _:
                 print(f'Other order status: {trade.orderStatus.status}')
 
-    def is_trading_day_open(self, offset_days=0):
-        spy_stock = ib_insync.Stock('SPY', 'SMART', self.default_currency)
-        self.api_client.qualifyContracts(spy_stock)
-        trading_hours = self.api_client.reqContractDetails(spy_stock)[0].liquidHours
-        trading_hours_dict = {d.split(':')[0]: d.split(':')[1] for d in trading_hours.split(';')}
-        print(trading_hours_dict)
+    def _calendar_is_current(self):
+        ''' The calendar is fetched at most once a day; without a live connection (none yet, or a client
+        left after a disconnect) the persisted one is used. Shared by AsyncBrokerAPI.
+        '''
+        if self.calendar is None and self.calendar_file and os.path.isfile(self.calendar_file):
+            self.calendar = TradingCalendar.load(self.calendar_file)
+        if self.calendar is None:
+            return False
+        connected = self.api_client is not None and self.api_client.isConnected()
+        return not connected or self.calendar.fetched_on == datetime.now(self.local_timezone).date()
 
-        today_formatted = (datetime.now().astimezone(self.local_timezone) + timedelta(days=offset_days)).strftime('%Y%m%d')
+    def _update_calendar(self, contract_details):
+        self.calendar = TradingCalendar.from_liquid_hours(contract_details.liquidHours,
+                                                          contract_details.timeZoneId or 'US/Eastern',
+                                                          datetime.now(self.local_timezone).date())
+        if self.calendar_file:
+            self.calendar.save(self.calendar_file)
+        return self.calendar
 
-        for k, v in trading_hours_dict.items():
-            if (today_formatted in k) and (v == 'CLOSED'):
-                return False
+    def trading_calendar(self):
+        ''' SPY trading sessions (liquid hours) as a TradingCalendar.'''
+        if self._calendar_is_current():
+            return self.calendar
+        spy_stock, = self._qualify(['SPY'])
+        return self._update_calendar(self.api_client.reqContractDetails(spy_stock)[0])
 
-        return True
+    def is_trading_day_open(self, offset_days=0):
+        day = (datetime.now(self.local_timezone) + timedelta(days=offset_days)).date()
+        return self.trading_calendar().is_trading_day(day)
 
     def is_market_open_now(self):
-        spy_stock = ib_insync.Stock('SPY', 'SMART', self.default_currency)
-        self.api_client.qualifyContracts(spy_stock)
-        trading_hours = self.api_client.reqContractDetails(spy_stock)[0].liquidHours
-        trading_hours_list = [d.split('-') for d in trading_hours.split(';')]
-        print(trading_hours_list)
-
-        today_formatted = datetime.now().astimezone(self.local_timezone).strftime('%Y%m%d')
-        current_time = datetime.now().astimezone(self.local_timezone).strftime('%H%M')
-
-        for d in trading_hours_list:
-            if len(d) > 1 and today_formatted in d[0].split()[0]:
-                if current_time > d[0].split(':')[1] and current_time < d[1].split(':')[1]:
-                    return True
-
-        return False
+        return self.trading_calendar().is_open(datetime.now(self.local_timezone))
 
     def fetch_transaction_history(self):
         pass
@@ -0,0 +1,284 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import ib_insync
+from eventkit import Event
+from IBconnect.InteractiveBrokerTradeAPI_test import BrokerAPI
+from BacktestBase import BacktestBase  # flat, as in event_based_backtest: needs it on the path, see pytest.ini
+from priceCache import get_price_cache
+
+DEFAULT_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                                 'pyalgo_eikon_eod_data.csv')
+
+
+class SimulatedClient(object):
+    ''' In-process stand-in for ib_insync.IB, replaying the close prices of a local price file.
+
+    Orders are filled at the close of the current bar, latency seconds after
+    placeOrder, with commission computed by commission(units, price). State
+    is reported with the ib_insync objects (Trade, Fill, AccountValue, ...)
+    so BrokerAPI, AsyncBrokerAPI and DatabaseManager run on it unchanged.
+    Fills are delivered by waitOnUpdate/sleep, or by the running event loop
+    when orders are placed from a coroutine.
+    '''
+
+    def __init__(self, prices, cash=100000., latency=0., commission=BacktestBase.calculate_commission,
+                 account='DU0000001', currency='USD'):
+        self.prices = prices.ffill()
+        self.symbols = [str(symbol) for symbol in prices.columns]
+        self._columns = {symbol.upper(): i for i, symbol in enumerate(self.symbols)}
+        self._values = self.prices.to_numpy(dtype=float)
+        self.bar = 0
+        self.latency = latency
+        self.commission = commission
+        self.account = account
+        self.currency = currency
+        self.cash = cash
+        self.positions = {}  # symbol -> [units, average cost]
+        self._contracts = {}
+        self._trades = []
+        self._pending = []  # (due, orderId, trade) of orders waiting for their fill
+        self._next_order_id = 1
+        self.connected = False
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.updateEvent = Event('updateEvent')
+
+    @classmethod
+    def from_csv(cls, file_path=DEFAULT_FILE_PATH, start=None, end=None, **kwargs):
+        prices = get_price_cache(file_path).load_frame(start=start, end=end)
+        return cls(prices.dropna(how='all'), **kwargs)
+
+    # replay
+    @property
+    def date(self):
+        return self.prices.index[self.bar]
+
+    def advance(self, bars=1):
+        ''' Move to a later bar, False when the replay is over.'''
+        if self.bar + bars >= len(self._values):
+            return False
+        self.bar += bars
+        return True
+
+    def last_price(self, symbol):
+        column = self._columns.get(symbol.upper())
+        return float(self._values[self.bar, column]) if column is not None else math.nan
+
+    # connection
+    def connect(self, host='127.0.0.1', port=7497, clientId=1, **kwargs):
+        self.connected = True
+        return self
+
+    async def connectAsync(self, host='127.0.0.1', port=7497, clientId=1, **kwargs):
+        return self.connect()
+
+    def disconnect(self):
+        self.connected = False
+
+    def isConnected(self):
+        return self.connected
+
+    # account
+    def managedAccounts(self):
+        return [self.account]
+
+    def _market_value(self):
+        return sum(units * self.last_price(symbol) for symbol, (units, _) in self.positions.items())
+
+    def accountValues(self, account=''):
+        if account not in ('', self.account):
+            return []
+        return [ib_insync.AccountValue(self.account, 'TotalCashBalance', str(self.cash), self.currency, ''),
+                ib_insync.AccountValue(self.account, 'StockMarketValue', str(self._market_value()), self.currency, '')]
+
+    def portfolio(self, account=''):
+        items = []
+        for symbol, (units, average_cost) in self.positions.items():
+            if units == 0:
+                continue
+            price = self.last_price(symbol)
+            items.append(ib_insync.PortfolioItem(self._contracts[symbol], units, price, units * price, average_cost,
+                                                 units * (price - average_cost), 0., self.account))
+        return items
+
+    def trades(self):
+        return list(self._trades)
+
+    def fills(self):
+        return [fill for trade in self._trades for fill in trade.fills]
+
+    # contracts and market data
+    def qualifyContracts(self, *contracts):
+        for contract in contracts:
+            column = self._columns.get(contract.symbol.upper())
+            if column is not None:
+                contract.conId = column + 1
+                contract.primaryExchange = contract.primaryExchange or 'SMART'
+                self._contracts[contract.symbol] = contract
+        return [contract for contract in contracts if contract.conId]
+
+    async def qualifyContractsAsync(self, *contracts):
+        return self.qualifyContracts(*contracts)
+
+    def reqMarketDataType(self, marketDataType):
+        pass
+
+    def reqMktData(self, contract, genericTickList='', snapshot=False, regulatorySnapshot=False, mktDataOptions=None):
+        return ib_insync.Ticker(contract=contract, time=datetime.now(timezone.utc),
+                                last=self.last_price(contract.symbol), close=self.last_price(contract.symbol))
+
+    def reqContractDetails(self, contract):
+        ''' Contract details whose liquidHours are the replayed dates, 09:30-16:00 each.'''
+        days = sorted({date.strftime('%Y%m%d') for date in self.prices.index})
+        liquid_hours = ';'.join(f'{day}:0930-{day}:1600' for day in days)
+        return [ib_insync.ContractDetails(contract=contract, liquidHours=liquid_hours, timeZoneId='US/Eastern')]
+
+    async def reqContractDetailsAsync(self, contract):
+        return self.reqContractDetails(contract)
+
+    # orders
+    def placeOrder(self, contract, order):
+        if not order.orderId:
+            order.orderId = self._next_order_id
+            self._next_order_id += 1
+        order.permId = order.permId or order.orderId
+        order.account = order.account or self.account
+        now = datetime.now(timezone.utc)
+        trade = ib_insync.Trade(contract, order, ib_insync.OrderStatus(orderId=order.orderId, status='PendingSubmit'),
+                                [], [ib_insync.TradeLogEntry(now, 'PendingSubmit')])
+        self._trades.append(trade)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            loop.call_later(self.latency, self._fill, trade)
+        else:
+            heapq.heappush(self._pending, (time.perf_counter() + self.latency, order.orderId, trade))
+        return trade
+
+    def _fill(self, trade):
+        contract, order, order_status = trade.contract, trade.order, trade.orderStatus
+        now = datetime.now(timezone.utc)
+        price = self.last_price(contract.symbol)
+        if math.isnan(price):
+            order_status.status = 'Inactive'
+            trade.log.append(ib_insync.TradeLogEntry(now, 'Inactive', f'No price for {contract.symbol}'))
+            self.orderStatusEvent.emit(trade)
+            return
+
+        units = order.totalQuantity
+        sign = 1 if order.action == 'BUY' else -1
+        commission = self.commission(units, price) if self.commission else 0.
+        self.cash -= sign * units * price + commission
+        held, average_cost = self.positions.get(contract.symbol, (0., 0.))
+        position = held + sign * units
+        if position == 0:
+            average_cost = 0.
+        elif held == 0 or (held > 0) != (position > 0):  # opened or flipped side
+            average_cost = price
+        elif abs(position) > abs(held):  # added to the position
+            average_cost = (abs(held) * average_cost + units * price) / abs(position)
+        self.positions[contract.symbol] = [position, average_cost]
+
+        exec_id = f'{order.permId}.1'
+        execution = ib_insync.Execution(execId=exec_id, time=now, acctNumber=order.account, exchange='SMART',
+                                        side='BOT' if sign > 0 else 'SLD', shares=units, price=price,
+                                        permId=order.permId, orderId=order.orderId, cumQty=units, avgPrice=price)
+        report = ib_insync.CommissionReport(execId=exec_id, commission=commission, currency=self.currency)
+        trade.fills.append(ib_insync.Fill(contract, execution, report, now))
+        order.filledQuantity = units
+        order_status.status = 'Filled'
+        order_status.filled = units
+        order_status.remaining = 0
+        order_status.avgFillPrice = price
+        order_status.lastFillPrice = price
+        trade.log.append(ib_insync.TradeLogEntry(now, 'Filled', f'Fill {units}@{price}'))
+        self.orderStatusEvent.emit(trade)
+
+    def waitOnUpdate(self, timeout=0):
+        ''' Deliver the fills that are due, waiting up to timeout seconds for the next one.'''
+        if not self._pending:
+            time.sleep(timeout)
+            return False
+        wait = self._pending[0][0] - time.perf_counter()
+        if wait > timeout:
+            time.sleep(timeout)
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        now = time.perf_counter()
+        while self._pending and self._pending[0][0] <= now:
+            self._fill(heapq.heappop(self._pending)[2])
+        self.updateEvent.emit()
+        return True
+
+    def sleep(self, secs=0.02):
+        deadline = time.perf_counter() + secs
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return True
+            self.waitOnUpdate(remaining)
+
+
+class SimulatedBroker(BrokerAPI):
+    ''' BrokerAPI on a SimulatedClient: the AbstractTradeInterface without TWS, e.g. for
+    DatabaseManager(broker=SimulatedBroker(...)) in offline load tests.
+    '''
+
+    def __init__(self, client=None, default_currency='USD', calendar_file=None, verbose=False):
+        super().__init__(default_currency, calendar_file)
+        self.client = client or SimulatedClient.from_csv(currency=default_currency)
+        self.verbose = verbose
+
+    @contextmanager
+    def establish_connection(self):
+        self.api_client = self.client
+        if self.verbose:
+            self.api_client.orderStatusEvent += self._handle_order_status
+        self.api_client.connect()
+
+        yield self
+
+        if self.verbose:
+            self.api_client.orderStatusEvent -= self._handle_order_status
+        self.api_client.disconnect()
+
+    def fetch_transaction_history(self):
+        return self.client.fills()
+
+    def _print_order_report(self, order_details):
+        if self.verbose:
+            super()._print_order_report(order_details)
+
+
+# Offline stress test of the order -> DB pipeline
+if __name__ == '__main__':
+    import tempfile
+    import numpy as np
+    from database.databaseManager import DatabaseManager
+
+    broker = SimulatedBroker(SimulatedClient.from_csv(cash=1e9))
+    db_manager = DatabaseManager(broker=broker, db_name=os.path.join(tempfile.mkdtemp(), 'SIMULATED.db'))
+    symbols = [symbol for symbol in broker.client.symbols if '=' not in symbol and symbol != '.VIX']
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    n_orders = 0
+    with broker.establish_connection() as sim:
+        while sim.client.advance(5):
+            orders = {symbol: int(qty) for symbol, qty in zip(symbols, rng.integers(-50, 50, len(symbols))) if qty}
+            sim.submit_orders(orders, timeout=1)
+            n_orders += len(orders)
+    elapsed = time.perf_counter() - start
+    print(f'{n_orders} orders in {elapsed:.2f}s ({n_orders / elapsed:.0f} orders/s)')
+
+    start = time.perf_counter()
+    db_manager.update_orders_in_db()
+    print(f'Order sync {time.perf_counter() - start:.3f}s, commission {db_manager.get_commission_from_db(1):.2f}')
+    db_manager.close()
@@ -0,0 +1,95 @@
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date
+from zoneinfo import ZoneInfo
+
+
+class TradingCalendar(object):
+    ''' Trading sessions as sorted (open, close) intervals, parsed once from a liquidHours string.
+
+    Questions about market hours are answered by binary search on the
+    session bounds, without a round trip to the broker. The calendar can be
+    saved to and loaded from a JSON file for offline use.
+    '''
+
+    def __init__(self, sessions=(), closed_days=(), timezone='US/Eastern', fetched_on=None):
+        self.timezone = timezone
+        self.tz = ZoneInfo(timezone)
+        sessions = sorted(sessions)
+        self.opens = [session[0] for session in sessions]
+        self.closes = [session[1] for session in sessions]
+        self.closed_days = sorted(closed_days)
+        self.fetched_on = fetched_on
+
+    @classmethod
+    def from_liquid_hours(cls, liquid_hours, timezone='US/Eastern', fetched_on=None):
+        ''' Parse the liquidHours of ContractDetails, e.g. '20240102:0930-20240102:1600;20240106:CLOSED'
+        (older TWS versions send '20240102:0930-1600'). Times are in the contract time zone.
+        '''
+        tz = ZoneInfo(timezone)
+
+        def local_time(day, hhmm):
+            return datetime.strptime(day + hhmm, '%Y%m%d%H%M').replace(tzinfo=tz)
+
+        sessions, closed_days = [], []
+        for entry in liquid_hours.split(';'):
+            if not entry:
+                continue
+            day, hours = entry.split(':', 1)
+            if hours == 'CLOSED':
+                closed_days.append(datetime.strptime(day, '%Y%m%d').date())
+                continue
+            start, end = hours.split('-')
+            end_day, end_time = end.split(':') if ':' in end else (day, end)
+            sessions.append((local_time(day, start), local_time(end_day, end_time)))
+        return cls(sessions, closed_days, timezone, fetched_on)
+
+    def _localize(self, t):
+        if t is None:
+            return datetime.now(self.tz)
+        return t.replace(tzinfo=self.tz) if t.tzinfo is None else t
+
+    def _session(self, t):
+        ''' Index of the last session opened at or before t, -1 if there is none.'''
+        return bisect_right(self.opens, t) - 1
+
+    def is_open(self, t=None):
+        ''' True if t (default now, naive times are in the calendar time zone) is inside a session.'''
+        t = self._localize(t)
+        i = self._session(t)
+        return i >= 0 and t < self.closes[i]
+
+    def next_open(self, t=None):
+        ''' Open of the first session starting after t, None past the end of the calendar.'''
+        i = bisect_right(self.opens, self._localize(t))
+        return self.opens[i] if i < len(self.opens) else None
+
+    def next_close(self, t=None):
+        ''' Close of the session t is in, or of the next session, None past the end of the calendar.'''
+        i = bisect_right(self.closes, self._localize(t))
+        return self.closes[i] if i < len(self.closes) else None
+
+    def is_trading_day(self, day):
+        ''' False only for days the broker lists as CLOSED, as is_trading_day_open always did.'''
+        i = bisect_left(self.closed_days, day)
+        return not (i < len(self.closed_days) and self.closed_days[i] == day)
+
+    def save(self, file_path):
+        calendar = {'timezone': self.timezone,
+                    'fetched_on': self.fetched_on.isoformat() if self.fetched_on else None,
+                    'sessions': [[o.strftime('%Y%m%d%H%M'), c.strftime('%Y%m%d%H%M')]
+                                 for o, c in zip(self.opens, self.closes)],
+                    'closed_days': [day.isoformat() for day in self.closed_days]}
+        with open(file_path, 'w') as file:
+            json.dump(calendar, file)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path) as file:
+            calendar = json.load(file)
+        tz = ZoneInfo(calendar['timezone'])
+        sessions = [tuple(datetime.strptime(t, '%Y%m%d%H%M').replace(tzinfo=tz) for t in session)
+                    for session in calendar['sessions']]
+        closed_days = [date.fromisoformat(day) for day in calendar['closed_days']]
+        fetched_on = date.fromisoformat(calendar['fetched_on']) if calendar['fetched_on'] else None
+        return cls(sessions, closed_days, calendar['timezone'], fetched_on)
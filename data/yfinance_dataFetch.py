@@ -1,6 +1,9 @@
+import os
+import time
 import pandas as pd
 import datetime
 import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 
 
 def get_sp500_stocks():
@@ -14,18 +17,88 @@ def get_sp500_stocks():
     return sp500_df['Symbol'].tolist()
 
 
+def yfinance_source(symbols, start, end):
+    """
+    Default network source: adjusted close prices of several symbols in one bulk yf.download call.
+
+    :param symbols: List of stock symbols.
+    :param start: First date to fetch (inclusive).
+    :param end: Last date to fetch (exclusive, as in yf.download).
+    :return: A DataFrame of adjusted close prices, one column per symbol.
+    """
+    stock_data = yf.download(symbols, start=start, end=end, auto_adjust=False, progress=False, threads=False)
+    closes = stock_data['Adj Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+    return closes
+
+
+class LocalPriceSource:
+    def __init__(self, prices, latency=0.0):
+        """
+        Stand-in for yfinance_source that serves prices from a local DataFrame, for tests and benchmarks.
+
+        :param prices: DataFrame of prices indexed by date, one column per symbol.
+        :param latency: Seconds to sleep per request, to mimic the network round trip.
+        """
+        self.prices = prices
+        self.latency = latency
+        self.requests = 0
+
+    def __call__(self, symbols, start, end):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        dates = self.prices.index
+        rows = (dates >= pd.Timestamp(start)) & (dates < pd.Timestamp(end))
+        return self.prices.loc[rows, [symbol for symbol in symbols if symbol in self.prices.columns]]
+
+
 class StockDataFetcher:
-    def __init__(self, start_date, end_date, symbols=None):
+    ADJUSTMENT_TOLERANCE = 1e-8  # relative change of a stored adjusted close taken as a new adjustment
+
+    def __init__(self, start_date, end_date, symbols=None, source=yfinance_source, batch_size=50, max_workers=8):
         """
         Initialize the SP500DataFetcher with a start date and an end date.
 
         :param start_date: The start date for fetching historical data (format: 'YYYY-MM-DD').
         :param end_date: The end date for fetching historical data (format: 'YYYY-MM-DD').
         :param symbols: List of stock symbols to fetch data for. If None, fetches S&P 500 stocks.
+        :param source: Callable (symbols, start, end) -> DataFrame of adjusted closes; yfinance by default.
+        :param batch_size: Number of symbols per bulk request.
+        :param max_workers: Maximum number of requests in flight at the same time.
         """
         self.start_date = start_date
         self.end_date = end_date
         self.symbols = symbols if symbols else get_sp500_stocks()
+        self.source = source
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def _fetch_batch(self, symbols, start_date):
+        try:
+            return self.source(symbols, start_date, self.end_date)
+        except Exception as e:
+            print(f"Could not fetch data for {', '.join(symbols)}: {e}")
+            return None
+
+    def _fetch(self, requests):
+        """
+        Run (symbols, start date) requests in batches of batch_size on a bounded thread pool.
+
+        :return: A DataFrame of all fetched prices, or None if nothing came back.
+        """
+        batches = [(symbols[i:i + self.batch_size], start_date)
+                   for symbols, start_date in requests
+                   for i in range(0, len(symbols), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            frames = [frame for frame in pool.map(lambda batch: self._fetch_batch(*batch), batches)
+                      if frame is not None and not frame.empty]
+        if not frames:
+            return None
+        closing_prices = pd.concat(frames, axis=1, sort=False)  # sorted below
+        # a symbol fetched in two batches (different start dates) is merged into one column
+        return closing_prices.T.groupby(level=0, sort=False).first().T.sort_index()
 
     def fetch_data(self):
         """
@@ -33,18 +106,58 @@ class StockDataFetcher:
 
         :return: A DataFrame containing the adjusted close prices of S&P 500 stocks.
         """
-        data_dict = {}
-        for symbol in self.symbols:
-            print(f"Fetching data for {symbol}...")
-            try:
-                stock_data = yf.download(symbol, start=self.start_date, end=self.end_date)
-                data_dict[symbol] = stock_data['Adj Close']
-            except Exception as e:
-                print(f"Could not fetch data for {symbol}: {e}")
+        print(f"Fetching data for {len(self.symbols)} symbols...")
+        closing_prices = self._fetch([(self.symbols, self.start_date)])
+        if closing_prices is None:
+            return pd.DataFrame(columns=self.symbols)
         # Combine all data into a single DataFrame
-        closing_prices = pd.concat(data_dict, axis=1)
+        return closing_prices.reindex(columns=[s for s in self.symbols if s in closing_prices.columns])
+
+    def update_csv(self, filename):
+        """
+        Incrementally refresh a CSV saved by save_to_csv: symbols already in the file are only
+        fetched from its last date on, new symbols over the whole range, and the result is merged
+        into the file.
 
-        return closing_prices
+        The last stored date is fetched again to compare the adjusted closes: a split or dividend
+        since the file was saved has rescaled the whole history of a symbol, so its stored prices
+        are rescaled by the same ratio before the new bars are appended to them.
+
+        :param filename: The name of the CSV file.
+        :return: The merged DataFrame.
+        """
+        if not os.path.isfile(filename):
+            closing_prices = self.fetch_data()
+            self.save_to_csv(closing_prices, filename)
+            return closing_prices
+
+        stored = pd.read_csv(filename, index_col=0, parse_dates=True)
+        last_date = stored.index.max()
+        known = [s for s in self.symbols if s in stored.columns]
+        new = [s for s in self.symbols if s not in stored.columns]
+        requests = [(symbols, start_date) for symbols, start_date in
+                    ((known, last_date.strftime('%Y-%m-%d')), (new, self.start_date)) if symbols]
+        print(f"Updating {len(known)} symbols from {last_date:%Y-%m-%d} and fetching {len(new)} new symbols...")
+
+        fetched = self._fetch(requests)
+        if fetched is None:
+            print(f"Nothing new for {filename}.")
+            return stored
+        if last_date in fetched.index:
+            overlap = [s for s in known if s in fetched.columns]
+            ratio = fetched.loc[last_date, overlap].astype(float) / stored.loc[last_date, overlap].astype(float)
+            adjusted = ratio[(ratio - 1.).abs() > self.ADJUSTMENT_TOLERANCE]  # NaN on either side: no comparison
+            if not adjusted.empty:
+                print(f"Rescaling the stored history of {len(adjusted)} symbols adjusted since {last_date:%Y-%m-%d}...")
+                stored[adjusted.index] = stored[adjusted.index] * adjusted
+        merged = fetched.combine_first(stored)  # fresh bars win over stored ones on the same date
+        merged = merged.reindex(columns=list(stored.columns) + [s for s in new if s in merged.columns])
+        merged.index.name = stored.index.name
+        if merged.equals(stored):
+            print(f"Nothing new for {filename}.")
+            return stored
+        self.save_to_csv(merged, filename)
+        return merged
 
     def save_to_csv(self, df, filename):
         """
@@ -69,3 +182,7 @@ if __name__ == "__main__":
     closing_prices = fetcher.fetch_data()
     fetcher.save_to_csv(closing_prices, 'SPY_2007_2012.csv')
     #fetcher.save_to_csv(closing_prices, 'sp500_closing_prices_last_10_years.csv')
+
+    # Daily refresh: only the bars after the last stored date are requested
+    # fetcher = StockDataFetcher(start_date="2014-01-01", end_date=datetime.datetime.now())
+    # fetcher.update_csv('sp500_closing_prices_last_10_years.csv')
@@ -0,0 +1,213 @@
+import os
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+
+
+########################################################################
+# Long-format SQLite store of close prices
+########################################################################
+
+class BarStore:
+    BAR_STORE_DB_NAME = 'BAR_STORE.db'
+    BAR_TBL_NAME = 'bars'
+    SOURCE_TBL_NAME = 'bar_sources'  # per bar table: size and mtime of the CSV loaded into it, number of symbols
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.BAR_STORE_DB_NAME)
+        self.db_path = db_path
+        self.db_conn = sqlite3.connect(db_path)
+        self.db_conn.execute('PRAGMA journal_mode=WAL;')  # readers are not blocked by a bulk load
+        self.db_conn.execute('PRAGMA synchronous=NORMAL;')
+        self.db_conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.SOURCE_TBL_NAME}
+            (TBL_NAME TEXT PRIMARY KEY,
+            SIZE INTEGER,
+            MTIME_NS INTEGER,
+            SYMBOLS INTEGER NOT NULL);
+        ''')
+
+    def close(self):
+        self.db_conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def table_name(csv_path):
+        ''' Table of a price CSV: one table per source file, so e.g. the SPY columns of different files do not mix.'''
+        return re.sub(r'\W', '_', os.path.splitext(os.path.basename(csv_path))[0])
+
+    def _create_table(self, tbl_name):
+        self.db_conn.execute(f'''CREATE TABLE IF NOT EXISTS {tbl_name}
+            (SYMBOL TEXT NOT NULL,
+            TS INTEGER NOT NULL,
+            CLOSE FLOAT NOT NULL,
+            PRIMARY KEY (SYMBOL, TS)) WITHOUT ROWID;
+        ''')
+        # date ranges across all symbols (complete_rows, iter_chunks) are index range scans
+        self.db_conn.execute(f'CREATE INDEX IF NOT EXISTS {tbl_name}_ts ON {tbl_name} (TS);')
+
+    def _update_source(self, tbl_name, csv_path=None):
+        ''' Record the number of symbols of tbl_name after a load, and the size and mtime of its CSV.'''
+        stat = os.stat(csv_path) if csv_path is not None else None
+        n_symbols = self.db_conn.execute(f'SELECT COUNT(DISTINCT SYMBOL) FROM {tbl_name};').fetchone()[0]
+        with self.db_conn:
+            self.db_conn.execute(f'''INSERT OR REPLACE INTO {self.SOURCE_TBL_NAME} (TBL_NAME, SIZE, MTIME_NS, SYMBOLS)
+                VALUES (?, ?, ?, ?);''', (tbl_name, stat and stat.st_size, stat and stat.st_mtime_ns, n_symbols))
+
+    def _symbol_count(self, tbl_name):
+        return self.db_conn.execute(f'SELECT SYMBOLS FROM {self.SOURCE_TBL_NAME} WHERE TBL_NAME = ?;',
+                                    (tbl_name,)).fetchone()[0]
+
+    def tables(self):
+        db_c = self.db_conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name != ?;",
+                                    (self.SOURCE_TBL_NAME,))
+        return [row[0] for row in db_c.fetchall()]
+
+    def symbols(self, tbl_name=BAR_TBL_NAME):
+        db_c = self.db_conn.execute(f'SELECT DISTINCT SYMBOL FROM {tbl_name} ORDER BY SYMBOL;')
+        return [row[0] for row in db_c.fetchall()]
+
+    def load_frame(self, df, tbl_name=BAR_TBL_NAME, chunk_size=100000):
+        ''' Insert a wide price frame (date index, one column per symbol) as long rows.
+        Missing prices are skipped, existing (SYMBOL, TS) rows are replaced.
+        '''
+        n = self._insert_frame(df, tbl_name, chunk_size)
+        self._update_source(tbl_name)
+        return n
+
+    def _insert_frame(self, df, tbl_name, chunk_size=100000):
+        self._create_table(tbl_name)
+        sql = f'INSERT OR REPLACE INTO {tbl_name} (SYMBOL, TS, CLOSE) VALUES (?, ?, ?);'
+        timestamps = pd.DatetimeIndex(df.index).as_unit('ns').asi8
+        symbols = np.asarray(df.columns, dtype=object)
+        values = df.to_numpy(dtype=float)
+        rows, cols = np.nonzero(~np.isnan(values))
+        n = 0
+        with self.db_conn:  # one transaction for the whole load
+            for i in range(0, len(rows), chunk_size):
+                r, c = rows[i:i + chunk_size], cols[i:i + chunk_size]
+                self.db_conn.executemany(sql, zip(symbols[c].tolist(), timestamps[r].tolist(), values[r, c].tolist()))
+                n += len(r)
+        return n
+
+    def load_csv(self, csv_path, tbl_name=None, chunk_rows=5000):
+        ''' Bulk load a wide price CSV, chunk_rows dates at a time. Returns the table name.'''
+        tbl_name = tbl_name or self.table_name(csv_path)
+        n = 0
+        for chunk in pd.read_csv(csv_path, index_col=0, parse_dates=True, chunksize=chunk_rows):
+            n += self._insert_frame(chunk, tbl_name)
+        self._update_source(tbl_name, csv_path)
+        print(f'{n} bars of {csv_path} loaded into {tbl_name}')
+        return tbl_name
+
+    def is_current(self, csv_path, tbl_name=None):
+        ''' True if the table of csv_path was loaded from the CSV as it is now (same size and mtime).'''
+        row = self.db_conn.execute(f'SELECT SIZE, MTIME_NS FROM {self.SOURCE_TBL_NAME} WHERE TBL_NAME = ?;',
+                                   (tbl_name or self.table_name(csv_path),)).fetchone()
+        stat = os.stat(csv_path)
+        return row is not None and tuple(row) == (stat.st_size, stat.st_mtime_ns)
+
+    def sync_csv(self, csv_path, tbl_name=None):
+        ''' Load csv_path into its table unless that is current, replacing the old bars if the CSV changed.
+        Returns the table name.
+        '''
+        tbl_name = tbl_name or self.table_name(csv_path)
+        if not self.is_current(csv_path, tbl_name):
+            with self.db_conn:
+                self.db_conn.execute(f'DROP TABLE IF EXISTS {tbl_name};')
+            self.load_csv(csv_path, tbl_name)
+        return tbl_name
+
+    @staticmethod
+    def _bounds(start, end):
+        ''' Inclusive TS bounds; a date-only end covers that whole day, as in .loc[start:end].'''
+        lower = pd.Timestamp(start).as_unit('ns').value if start is not None else np.iinfo(np.int64).min
+        if end is None:
+            upper = np.iinfo(np.int64).max
+        else:
+            upper = pd.Timestamp(end)
+            if upper == upper.normalize() and (not isinstance(end, str) or len(end) <= 10):
+                upper += pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+            upper = upper.as_unit('ns').value
+        return lower, upper
+
+    def query(self, symbols=None, start=None, end=None, tbl_name=BAR_TBL_NAME, complete_rows=False):
+        ''' Close prices of many symbols between start and end in one query.
+        Returns (timestamps, symbols, prices): the union of the timestamps as
+        datetime64[ns], the symbol list and a (timestamps x symbols) float
+        array with NaN where a symbol has no bar.
+        complete_rows keeps only the timestamps with a bar for every symbol of
+        the table, the rows read_csv(...).dropna() keeps on the source CSV;
+        only the timestamps between start and end are checked.
+        '''
+        lower, upper = self._bounds(start, end)
+        if symbols is None:
+            symbols = self.symbols(tbl_name)
+        return self._query_range(list(symbols), lower, upper, tbl_name, complete_rows)
+
+    def _query_range(self, symbols, lower, upper, tbl_name, complete_rows):
+        ''' query between the inclusive TS bounds lower and upper (ns).'''
+        placeholders = ','.join('?' * len(symbols))
+        complete, params = '', ()
+        if complete_rows:
+            complete = f''' AND TS IN (SELECT TS FROM {tbl_name} WHERE TS BETWEEN ? AND ? GROUP BY TS
+                HAVING COUNT(*) = ?)'''
+            params = (lower, upper, self._symbol_count(tbl_name))
+        db_c = self.db_conn.execute(f'''SELECT SYMBOL, TS, CLOSE FROM {tbl_name}
+            WHERE SYMBOL IN ({placeholders}) AND TS BETWEEN ? AND ?{complete};''', (*symbols, lower, upper, *params))
+        rows = db_c.fetchall()
+
+        if not rows:
+            return np.array([], dtype='datetime64[ns]'), symbols, np.empty((0, len(symbols)))
+        row_symbols, ts, close = zip(*rows)
+        ts, row = np.unique(np.array(ts, dtype=np.int64), return_inverse=True)
+        position = {symbol: i for i, symbol in enumerate(symbols)}
+        col = np.fromiter((position[symbol] for symbol in row_symbols), dtype=np.int64, count=len(rows))
+        prices = np.full((len(ts), len(symbols)), np.nan)
+        prices[row, col] = close
+        return ts.view('datetime64[ns]'), symbols, prices
+
+    def query_frame(self, symbols=None, start=None, end=None, tbl_name=BAR_TBL_NAME, complete_rows=False):
+        ''' Same as query, as a DataFrame indexed by Date.'''
+        ts, symbols, prices = self.query(symbols, start, end, tbl_name, complete_rows)
+        return pd.DataFrame(prices, index=pd.DatetimeIndex(ts, name='Date'), columns=symbols)
+
+    def iter_chunks(self, symbols=None, start=None, end=None, tbl_name=BAR_TBL_NAME, chunk_bars=65536,
+                    complete_rows=False):
+        ''' query_frame(symbols, start, end, tbl_name, complete_rows) as consecutive frames of up to
+        chunk_bars timestamps, each read with one range query, e.g. for barFeed.BarFeed.
+        '''
+        lower, upper = self._bounds(start, end)
+        if symbols is None:
+            symbols = self.symbols(tbl_name)
+        symbols = list(symbols)
+        placeholders = ','.join('?' * len(symbols))
+        while lower <= upper:
+            # the last timestamp of the next chunk_bars, so that a chunk never splits the bars of one timestamp
+            db_c = self.db_conn.execute(f'''SELECT MAX(TS) FROM (SELECT DISTINCT TS FROM {tbl_name}
+                WHERE SYMBOL IN ({placeholders}) AND TS BETWEEN ? AND ? ORDER BY TS LIMIT ?);''',
+                                        (*symbols, lower, upper, chunk_bars))
+            last = db_c.fetchone()[0]
+            if last is None:
+                return
+            ts, _, prices = self._query_range(symbols, lower, last, tbl_name, complete_rows)
+            if len(ts):
+                yield pd.DataFrame(prices, index=pd.DatetimeIndex(ts, name='Date'), columns=symbols)
+            lower = last + 1
+
+
+# Example usage
+if __name__ == "__main__":
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    with BarStore() as store:
+        for file_name in ['pyalgo_eikon_eod_data.csv', 'SPY_last_10_years.csv', 'sp500_closing_prices_last_10_years.csv']:
+            csv_path = os.path.join(data_dir, file_name)
+            if os.path.isfile(csv_path):
+                store.sync_csv(csv_path)
+        print(store.tables())
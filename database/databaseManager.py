@@ -1,8 +1,9 @@
+import json
 import os
 import sqlite3
 from contextlib import contextmanager
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from IBconnect.InteractiveBrokerTradeAPI_test import BrokerAPI
 import ib_insync
 
@@ -12,46 +13,86 @@ import ib_insync
 ########################################################################
 
 class DatabaseManager:
-    def __init__(self):
-        self.IB_SQLITE_DB_NAME = 'IB_SQLITE_DB.db'
+    def __init__(self, broker=None, db_name='IB_SQLITE_DB.db'):
+        self.IB_SQLITE_DB_NAME = db_name  # file in this directory, or an absolute path
         self.IB_SQLITE_TRANSACTION_TBL_NAME = 'transactions'
         self.IB_SQLITE_ORDER_TBL_NAME = 'orders'
-        self.broker = BrokerAPI()
+        self.IB_SQLITE_SYNC_STATE_TBL_NAME = 'sync_state'
+        self.IB_SQLITE_SCHEMA_VERSION = 1  # PRAGMA user_version; 1: CREATE_TIME in UTC
+        self.broker = broker or BrokerAPI()  # any AbstractTradeInterface, e.g. IBconnect.simulatedBroker
         with self.broker.establish_connection() as ib_conn:
             self.accounts, self.positions, self.orders = ib_conn.retrieve_account_info()
             self.client = ib_conn.api_client
         #self.client = self.broker.client
         self.currency = 'USD'
         self.timezone = None  # Replace with actual timezone
+        self.db_conn = self._sqlite_open()
+        self._sqlite_create_schema(self.db_conn)
+        # (time, execIds at that time) of the newest synced execution, and the synced fills still waiting for
+        # their commission report (execId -> Fill), both persisted in the sync_state table
+        self._exec_watermark, self._pending_fills = self._sqlite_get_sync_state(self.db_conn)
+
+    def _sqlite_open(self):
+        ''' One long-lived connection per manager, in WAL mode so snapshots do not block readers.'''
+        dirs = os.path.dirname(os.path.abspath(__file__))
+        db_path = os.path.join(dirs, self.IB_SQLITE_DB_NAME)
+        db_conn = sqlite3.connect(db_path)
+        db_conn.execute('PRAGMA journal_mode=WAL;')
+        db_conn.execute('PRAGMA synchronous=NORMAL;')  # WAL stays consistent, fsync only at checkpoints
+        db_conn.execute('PRAGMA temp_store=MEMORY;')
+        db_conn.execute('PRAGMA cache_size=-16000;')  # 16 MB page cache
+        print(f'Sqlite connection established')
+        return db_conn
+
+    def close(self):
+        self.db_conn.close()
+        print(f'Sqlite connection closed')
 
     @contextmanager
     def sqlite_connect(self):
-        dirs = os.path.dirname(os.path.abspath(__file__))
+        ''' The persistent connection; kept as a context manager for existing callers.'''
         try:
-            db_path = os.path.join(dirs, self.IB_SQLITE_DB_NAME)
-            db_conn = sqlite3.connect(db_path)
-            print(f'Sqlite connection established')
-            yield db_conn
-            db_conn.close()
-            print(f'Sqlite connection closed')
+            yield self.db_conn
         except OSError as e:
             print(f'We are having an OS error')
 
+    def _sqlite_create_schema(self, db_conn):
+        ''' Create all tables once, at startup, and migrate a database written by an older version.'''
+        with db_conn:
+            self._sqlite_create_table(db_conn, self.IB_SQLITE_TRANSACTION_TBL_NAME)
+            self._sqlite_create_table(db_conn, self.IB_SQLITE_ORDER_TBL_NAME)
+            self._sqlite_create_table(db_conn, self.IB_SQLITE_SYNC_STATE_TBL_NAME)
+        if db_conn.execute('PRAGMA user_version;').fetchone()[0] < self.IB_SQLITE_SCHEMA_VERSION:
+            self._sqlite_migrate_create_time(db_conn)
+
+    def _sqlite_migrate_create_time(self, db_conn):
+        ''' Rewrite the CREATE_TIME of rows stored before times were kept in UTC (naive local time, or another
+        offset) in the UTC text format, then mark the database as migrated so this runs once.
+        '''
+        with db_conn:  # the rewrite and the new user_version commit together
+            for tbl_name in [self.IB_SQLITE_TRANSACTION_TBL_NAME, self.IB_SQLITE_ORDER_TBL_NAME]:
+                rows = db_conn.execute(f"SELECT ID, CREATE_TIME FROM {tbl_name} WHERE CREATE_TIME NOT LIKE '%+00:00';")
+                db_conn.executemany(f'UPDATE {tbl_name} SET CREATE_TIME = ? WHERE ID = ?;',
+                                    [(self._sqlite_utc(datetime.fromisoformat(create_time)), row_id)
+                                     for row_id, create_time in rows.fetchall()])
+            db_conn.execute(f'PRAGMA user_version = {self.IB_SQLITE_SCHEMA_VERSION};')
+
     def _sqlite_create_table(self, db_conn=None, tbl_name=None):
         if not tbl_name or not db_conn:
             return False
 
         if tbl_name == self.IB_SQLITE_TRANSACTION_TBL_NAME:
-            db_conn.execute(f'''CREATE TABLE {self.IB_SQLITE_TRANSACTION_TBL_NAME}
+            db_conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.IB_SQLITE_TRANSACTION_TBL_NAME}
                 (ID INTEGER PRIMARY KEY AUTOINCREMENT,
                 CREATE_TIME DATETIME NOT NULL,
                 PORTFOLIO_CLOSE_VALUE FLOAT NOT NULL,
                 SPY_CLOSE_PRICE FLOAT NOT NULL,
                 COMMISSION FLOAT NOT NULL);
             ''')
+            db_conn.execute(f'''CREATE INDEX IF NOT EXISTS {tbl_name}_create_time ON {tbl_name} (CREATE_TIME);''')
 
         elif tbl_name == self.IB_SQLITE_ORDER_TBL_NAME:
-            db_conn.execute(f'''CREATE TABLE {self.IB_SQLITE_ORDER_TBL_NAME}
+            db_conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.IB_SQLITE_ORDER_TBL_NAME}
                 (ID INTEGER PRIMARY KEY AUTOINCREMENT,
                 CREATE_TIME DATETIME NOT NULL,
                 SYMBOL TEXT NOT NULL,
@@ -62,9 +103,28 @@ class DatabaseManager:
                 COMMISSION FLOAT NOT NULL,
                 ACCOUNT TEXT NOT NULL);
             ''')
+            # time windows (commission of the last days, range queries) are index range scans
+            db_conn.execute(f'''CREATE INDEX IF NOT EXISTS {tbl_name}_create_time ON {tbl_name} (CREATE_TIME);''')
+
+        elif tbl_name == self.IB_SQLITE_SYNC_STATE_TBL_NAME:
+            # a few JSON values of the order sync, see _sqlite_get_sync_state
+            db_conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.IB_SQLITE_SYNC_STATE_TBL_NAME}
+                (NAME TEXT PRIMARY KEY,
+                VALUE TEXT NOT NULL);
+            ''')
 
         return True
 
+    def _sqlite_get_sync_state(self, db_conn=None):
+        ''' The execution watermark, (time, execIds at that time) or (None, set()) before the first sync, and
+        the execIds waiting for a commission report. Their fills are looked up on the next sync.
+        '''
+        db_c = db_conn.execute(f'SELECT NAME, VALUE FROM {self.IB_SQLITE_SYNC_STATE_TBL_NAME};')
+        state = {name: json.loads(value) for name, value in db_c.fetchall()}
+        exec_time, exec_ids = state.get('EXEC_WATERMARK', (None, []))
+        watermark = (datetime.fromisoformat(exec_time) if exec_time else None, set(exec_ids))
+        return watermark, dict.fromkeys(state.get('PENDING_EXEC_IDS', []))
+
     def _sqlite_is_table_exist(self, db_conn=None, tbl_name=None):
         if not tbl_name or not db_conn:
             return False
@@ -83,57 +143,127 @@ class DatabaseManager:
             # Table does not exist
             return False
 
-    def _sqlite_query_data(self, db_conn=None, tbl_name=None):
+    def _sqlite_query_data(self, db_conn=None, tbl_name=None, start=None, end=None):
         if not db_conn or not tbl_name:
             return None
 
-        if not self._sqlite_is_table_exist(db_conn, tbl_name):
-            self._sqlite_create_table(db_conn, tbl_name)
-
-        df = pd.read_sql_query(f'SELECT * from {tbl_name};', db_conn)
+        where, params = self._sqlite_time_range(start, end)
+        df = pd.read_sql_query(f'SELECT * from {tbl_name}{where} ORDER BY CREATE_TIME;', db_conn, params=params)
         return df
 
+    @staticmethod
+    def _sqlite_utc(time):
+        ''' A datetime as stored in CREATE_TIME: converted to UTC, naive ones taken as local time.
+        All rows then share one text format ('YYYY-MM-DD HH:MM:SS[.ffffff]+00:00') and compare in time order.
+        '''
+        return time.astimezone(timezone.utc) if isinstance(time, datetime) else time
+
+    @classmethod
+    def _sqlite_time_range(cls, start=None, end=None):
+        ''' WHERE clause and parameters for start <= CREATE_TIME < end, either bound may be None.
+        Times are compared in the text format the sqlite3 datetime adapter stores, datetimes in UTC.
+        '''
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('CREATE_TIME >= ?')
+            params.append(str(cls._sqlite_utc(start)))
+        if end is not None:
+            conditions.append('CREATE_TIME < ?')
+            params.append(str(cls._sqlite_utc(end)))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return where, params
+
     def _sqlite_insert_record(self, db_conn=None, sql=None, value_tuple: tuple = None, tbl_name=None):
-        if not self._sqlite_is_table_exist(db_conn, tbl_name):
-            self._sqlite_create_table(db_conn, tbl_name)
+        return self._sqlite_insert_records(db_conn, sql, [value_tuple], tbl_name)
 
+    def _sqlite_insert_records(self, db_conn=None, sql=None, value_tuples=None, tbl_name=None):
+        ''' Write all rows with one executemany, committed as a single transaction.'''
         if not sql:
             raise RuntimeError(f'SQL string is empty')
 
-        db_conn.execute(sql, value_tuple)
-        db_conn.commit()
+        with db_conn:
+            db_conn.executemany(sql, value_tuples)
         return True
 
 ################################################################################################
 # Public functions
 ################################################################################################
 
-    def get_transactions(self):
+    def get_transactions(self, start=None, end=None):
         with self.sqlite_connect() as db_conn:
-            df = self._sqlite_query_data(db_conn, self.IB_SQLITE_TRANSACTION_TBL_NAME)
+            df = self._sqlite_query_data(db_conn, self.IB_SQLITE_TRANSACTION_TBL_NAME, start, end)
         return df
 
-    def update_orders_in_db(self):
-        sql = f'''INSERT OR IGNORE INTO {self.IB_SQLITE_ORDER_TBL_NAME} (CREATE_TIME, SYMBOL, ORDER_ID, ACTION, QUANTITY, ORDER_STATUS, COMMISSION, ACCOUNT) VALUES (?, ?, ?, ?, ?, ?, ?, ?);'''
-
+    def get_orders(self, start=None, end=None):
         with self.sqlite_connect() as db_conn:
-            trades = self.client.trades()  # Replace with actual trades fetching method
-            for trade in trades:
-                perm_id = trade.order.permId
-                qty = trade.order.filledQuantity
-                symbol = trade.contract.symbol
-                action = trade.order.action
-                commission = sum([fill.commissionReport.commission for fill in trade.fills])
-                status = trade.orderStatus.status
-                exec_time = trade.log[0].time
-                account = trade.order.account
-                self._sqlite_insert_record(
-                    db_conn,
-                    sql,
-                    (exec_time, symbol, perm_id, action, qty, status, commission, account),
-                    self.IB_SQLITE_ORDER_TBL_NAME
-                )
-        print(f'Database {self.IB_SQLITE_ORDER_TBL_NAME} updated')
+            df = self._sqlite_query_data(db_conn, self.IB_SQLITE_ORDER_TBL_NAME, start, end)
+        return df
+
+    def update_orders_in_db(self):
+        # upsert on ORDER_ID: cumQty is the quantity filled so far, each fill adds its commission once
+        sql = f'''INSERT INTO {self.IB_SQLITE_ORDER_TBL_NAME} (CREATE_TIME, SYMBOL, ORDER_ID, ACTION, QUANTITY, ORDER_STATUS, COMMISSION, ACCOUNT) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ORDER_ID) DO UPDATE SET QUANTITY=MAX(QUANTITY, excluded.QUANTITY), ORDER_STATUS=excluded.ORDER_STATUS, COMMISSION=COMMISSION + excluded.COMMISSION;'''
+        state_sql = f'''INSERT OR REPLACE INTO {self.IB_SQLITE_SYNC_STATE_TBL_NAME} (NAME, VALUE) VALUES (?, ?);'''
+
+        # Incremental: only the executions past the watermark and the fills still waiting for their commission
+        # report are read, so a sync without new executions costs the same however long the history is.
+        fills = self.client.fills()
+        watermark_time, watermark_ids = self._exec_watermark
+        new_fills = []
+        for fill in reversed(fills):  # newest first, executions are reported in time order
+            execution = fill.execution
+            if watermark_time is not None and execution.time <= watermark_time:
+                if execution.time < watermark_time:
+                    break
+                if execution.execId in watermark_ids:
+                    continue
+            new_fills.append(fill)
+
+        pending = dict(self._pending_fills)
+        if None in pending.values():  # pending since an earlier run: find their fills once, drop the ones gone
+            by_exec_id = {fill.execution.execId: fill for fill in fills}
+            pending = {exec_id: fill or by_exec_id[exec_id] for exec_id, fill in pending.items() if exec_id in by_exec_id}
+        reported = [fill for fill in pending.values() if fill.commissionReport.execId]  # the report arrived since
+        if not new_fills and not reported:
+            self._pending_fills = pending
+            return
+
+        trades = {trade.order.permId: trade for trade in self.client.trades()}
+        orders = {}  # permId -> row
+        for fill in new_fills + reported:
+            execution = fill.execution
+            row = orders.get(execution.permId)
+            if row is None:
+                row = orders[execution.permId] = self._order_row(fill, trades.get(execution.permId))
+            row[4] = max(row[4], execution.cumQty)
+            if fill.commissionReport.execId:
+                row[6] += fill.commissionReport.commission
+                pending.pop(execution.execId, None)
+            else:
+                pending[execution.execId] = fill
+
+        if new_fills:
+            newest = max(fill.execution.time for fill in new_fills)
+            exec_ids = {fill.execution.execId for fill in new_fills if fill.execution.time == newest}
+            watermark_time, watermark_ids = newest, (exec_ids | watermark_ids if newest == watermark_time else exec_ids)
+        state = [('EXEC_WATERMARK', json.dumps([str(watermark_time), sorted(watermark_ids)])),
+                 ('PENDING_EXEC_IDS', json.dumps(sorted(pending)))]
+        with self.sqlite_connect() as db_conn, db_conn:  # the orders and the state they were synced to commit together
+            db_conn.executemany(sql, orders.values())
+            db_conn.executemany(state_sql, state)
+        self._exec_watermark, self._pending_fills = (watermark_time, watermark_ids), pending
+        print(f'Database {self.IB_SQLITE_ORDER_TBL_NAME} updated with {len(orders)} orders')
+
+    def _order_row(self, fill, trade=None):
+        ''' Row of the orders table for the order of fill, with no quantity and commission yet.
+        Without its trade (an execution of an earlier session) the order is taken as filled at the execution time.
+        '''
+        execution = fill.execution
+        exec_time = trade.log[0].time if trade is not None and trade.log else execution.time
+        status = trade.orderStatus.status if trade is not None else 'Filled'
+        action = 'BUY' if execution.side == 'BOT' else 'SELL'
+        return [self._sqlite_utc(exec_time), fill.contract.symbol, str(execution.permId), action, 0, status, 0.,
+                execution.acctNumber]
 
     def update_transactions_in_db(self):
         sql = f'''INSERT OR IGNORE INTO {self.IB_SQLITE_TRANSACTION_TBL_NAME} (CREATE_TIME, PORTFOLIO_CLOSE_VALUE, SPY_CLOSE_PRICE, COMMISSION) VALUES (?,?,?,?);'''
@@ -141,7 +271,7 @@ class DatabaseManager:
         # Portfolio value
         portfolio_value = 0
         for account in self.accounts:
-            data = self.client.accountValues(account)  # Replace with actual account value fetching method
+            data = self.client.accountValues(account['account_id'])  # Replace with actual account value fetching method
             for row in data:
                 if row.tag in ['TotalCashBalance', 'StockMarketValue'] and row.currency == self.currency:
                     portfolio_value += float(row.value)
@@ -157,20 +287,31 @@ class DatabaseManager:
             self._sqlite_insert_record(
                 db_conn,
                 sql,
-                (datetime.now(), portfolio_value, benchmark_value, commission),
+                (self._sqlite_utc(datetime.now()), portfolio_value, benchmark_value, commission),
                 self.IB_SQLITE_TRANSACTION_TBL_NAME
             )
         print(f'Database {self.IB_SQLITE_TRANSACTION_TBL_NAME} updated')
 
     def get_commission_from_db(self, time_delta: int = 0) -> float:
-        with self.sqlite_connect() as db_c:
-            df = self._sqlite_query_data(db_c, self.IB_SQLITE_ORDER_TBL_NAME)
+        # summed in SQL over the CREATE_TIME index: the cost grows with the window, not with the table
+        where, params = self._sqlite_time_range(datetime.now(timezone.utc) - timedelta(days=time_delta))
+        with self.sqlite_connect() as db_conn:
+            db_c = db_conn.execute(f'''SELECT COALESCE(SUM(COMMISSION), 0) FROM {self.IB_SQLITE_ORDER_TBL_NAME}{where};''',
+                                   params)
+            return db_c.fetchone()[0]
 
-        if df.empty:
-            return 0
-        else:
-            return df[(datetime.now(self.timezone) - pd.to_datetime(df['CREATE_TIME'], utc=False)) < timedelta(
-                days=time_delta)]['COMMISSION'].sum()
+    def get_order_rollup(self, by: str = 'SYMBOL', time_delta: int = None) -> pd.DataFrame:
+        ''' Orders, filled quantity and commission per SYMBOL or ACCOUNT, over the last time_delta days or all orders.'''
+        if by not in ('SYMBOL', 'ACCOUNT'):
+            raise ValueError(f'Cannot roll up orders by {by}, use SYMBOL or ACCOUNT')
+
+        start = datetime.now(timezone.utc) - timedelta(days=time_delta) if time_delta is not None else None
+        where, params = self._sqlite_time_range(start)
+        with self.sqlite_connect() as db_conn:
+            df = pd.read_sql_query(f'''SELECT {by}, COUNT(*) AS ORDERS, SUM(QUANTITY) AS QUANTITY,
+                SUM(COMMISSION) AS COMMISSION FROM {self.IB_SQLITE_ORDER_TBL_NAME}{where}
+                GROUP BY {by} ORDER BY {by};''', db_conn, params=params, index_col=by)
+        return df
 
 
 # Example usage
@@ -178,13 +319,7 @@ if __name__ == "__main__":
 
     db_manager = DatabaseManager()
 
-    # Create tables only if they do not exist
-    with db_manager.sqlite_connect() as db_conn:
-        if not db_manager._sqlite_is_table_exist(db_conn, db_manager.IB_SQLITE_TRANSACTION_TBL_NAME):
-            db_manager._sqlite_create_table(db_conn, db_manager.IB_SQLITE_TRANSACTION_TBL_NAME)
-
-        if not db_manager._sqlite_is_table_exist(db_conn, db_manager.IB_SQLITE_ORDER_TBL_NAME):
-            db_manager._sqlite_create_table(db_conn, db_manager.IB_SQLITE_ORDER_TBL_NAME)
+    # Tables are created by the constructor if they do not exist
 
     # Example usage of public methods
     transactions_df = db_manager.get_transactions()
@@ -196,3 +331,4 @@ if __name__ == "__main__":
     # Fetching commission from DB
     commission = db_manager.get_commission_from_db(time_delta=1)
     print(f"Commission from last day: {commission}")
+    db_manager.close()
@@ -4,9 +4,17 @@ import matplotlib.pyplot as plt
 import matplotlib as mpl
 import os
 import requests
+from contextlib import nullcontext
 from performance import *
+from profiling import RunProfile
+from priceCache import get_price_cache
+from barFeed import BarFeed
+from tradeLedger import TradeLedger
+from journal import Journal, ConsoleSink, DEBUG, INFO, SUMMARY
 
 #print(plt.style.available)
+NO_PHASE = nullcontext()  # what phase() returns when profiling is off
+
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', 10)
 
@@ -15,12 +23,19 @@ mpl.rcParams['font.family'] = 'serif'
 
 
 class BacktestBase(object):
-    # TODO data fetch migration, accepting numerous symbols,
-    def __init__(self, symbol, start, end, cash, commission_included=False, verbose=True):
+    # TODO data fetch migration
+    DEFAULT_FILE_PATH = '../data/pyalgo_eikon_eod_data.csv'
+    BENCHMARK_SYMBOL = 'SPY'
+
+    def __init__(self, symbol, start, end, cash, commission_included=False, verbose=True, file_path=None,
+                 bar_store=None, data=None, profile=None, journal=None, stream=False):
         self.data = None
         self.symbol = symbol
         self.start = start
         self.end = end
+        self.file_path = file_path or self.DEFAULT_FILE_PATH
+        self.bar_store = bar_store  # database.barStore.BarStore holding the bars of file_path, read instead of the CSV
+        self.price_data = data  # prices as a DataFrame (one column per symbol) instead of a file, e.g. synthetic ones
         self.initial_amount = cash
         self.cash = cash
         self.commission = 0
@@ -29,23 +44,84 @@ class BacktestBase(object):
         self.trades = 0
         self.commission_included = commission_included
         self.verbose = verbose
-        self.get_data()  # lead to a new dataframe: self.data
-        self.tradeRecord = pd.DataFrame(columns=['units', 'price'])
+        # journal.Journal of the trades and events; by default printed at the end of a run, with
+        # every trade and balance if verbose, else only the run header and results
+        self.journal = journal if journal is not None else Journal(DEBUG if verbose else SUMMARY, [ConsoleSink()])
+        # RunProfile with the timings of every phase; True for timings only, None to switch it off
+        self.profile = RunProfile() if profile is True else (profile or None)
+        # stream: the run reads the bars chunk by chunk through feed(), self.data only holds its results
+        self.stream = stream
+        self.trade_ledger = TradeLedger()
+        if stream:
+            self.set_date_format(None)  # set from the first chunk of the run
+            return
+        with self.phase('get_data', lambda: len(self.data)):
+            self.get_data()  # lead to a new dataframe: self.data
+        self.set_date_format(self.data.index)
 
+    def set_date_format(self, index):
+        ''' Date format of the journal: with the time of day for intraday bars.'''
+        self.date_format = '%Y-%m-%d %H:%M' if is_intraday(index) else '%Y-%m-%d'
+        self.journal.date_format = self.date_format
 
-    def get_data(self):
-        """ Retrieves and prepares the data. """
-        file_path = '../data/pyalgo_eikon_eod_data.csv'
-        if os.path.isfile(file_path):
-            raw = pd.read_csv(file_path, index_col=0, parse_dates=True).dropna()
-        else:
+    def phase(self, name, bars=None):
+        ''' Context manager timing one phase of the run into self.profile, a no-op when profiling is off.'''
+        if self.profile is None:
+            return NO_PHASE
+        return self.profile.phase(name, bars)
+
+    @property
+    def tradeRecord(self):
+        ''' Signed units and price of every fill, as a DataFrame built from the trade ledger.'''
+        frame = self.trade_ledger.to_frame()
+        return pd.DataFrame({'units': self.trade_ledger.signed_units, 'price': frame['price']}, index=frame.index)
+
+
+    def load_prices(self, symbols, complete_rows=False):
+        """ Prices of symbols between start and end, one column per symbol on a shared date index. """
+        if self.price_data is not None:
+            rows = self.price_data.loc[self.start:self.end]
+            return (rows.dropna() if complete_rows else rows)[symbols]
+
+        if self.bar_store is not None:
+            return self.bar_store.query_frame(symbols, self.start, self.end, self.sync_bar_store(),
+                                              complete_rows=complete_rows)
+
+        self.download_default_file()
+        # binary search + slice on the memory-mapped cache instead of parsing the whole CSV
+        return get_price_cache(self.file_path).load_frame(symbols, self.start, self.end, complete_rows=complete_rows)
+
+    def download_default_file(self):
+        ''' Download the default price file if it is not on disk yet.'''
+        if not os.path.isfile(self.file_path) and self.file_path == self.DEFAULT_FILE_PATH:
             response = requests.get('http://hilpisch.com/pyalgo_eikon_eod_data.csv')
-            with open(file_path, 'wb') as file:
+            with open(self.file_path, 'wb') as file:
                 file.write(response.content)
-            raw = pd.read_csv(file_path, index_col=0, parse_dates=True).dropna()
 
-        raw = pd.DataFrame(raw[self.symbol])
-        raw = raw.loc[self.start:self.end]
+    def sync_bar_store(self):
+        ''' Table of file_path in bar_store, (re)loaded from the price file first unless it holds the file as it
+        is now; without the file, the bars already in the table are read.
+        '''
+        self.download_default_file()
+        if os.path.isfile(self.file_path):
+            return self.bar_store.sync_csv(self.file_path)
+        return self.bar_store.table_name(self.file_path)
+
+    def feed(self, chunk_bars=65536, binary=True):
+        ''' The bars of get_data as a barFeed.BarFeed, read chunk_bars dates at a time from the source
+        load_prices reads (data, bar_store or the price file, binary through its price cache).
+        '''
+        if self.bar_store is not None:
+            self.sync_bar_store()
+        elif self.price_data is None:
+            self.download_default_file()
+        return BarFeed(self.file_path, [self.symbol], self.start, self.end, chunk_bars, binary, complete_rows=True,
+                       data=self.price_data, bar_store=self.bar_store)
+
+    def get_data(self):
+        """ Retrieves and prepares the data. """
+        # complete_rows keeps the dates read_csv(...).dropna() used to keep
+        raw = self.load_prices([self.symbol], complete_rows=True)
         #raw.rename(columns={self.symbol: 'price'}, inplace=True)
         #raw['return'] = np.log(raw / raw.shift(1))
 
@@ -59,11 +135,11 @@ class BacktestBase(object):
         return date, price
 
     def print_balance(self, bar):
-        ''' Print out current cash balance info.'''
-        date, price = self.get_date_price(bar)
-        print(f'{str(date)[:10]} | current balance {self.cash:.2f}')
+        ''' Journal the current cash balance.'''
+        self.journal.record(DEBUG, 'balance', self.data.index[bar], cash=self.cash)
 
-    def calculate_commission(self, num_shares, price_per_share):
+    @staticmethod
+    def calculate_commission(num_shares, price_per_share):
         # Define commission rate and limits
         commission_rate = 0.0035
         min_commission = 0.35
@@ -75,47 +151,47 @@ class BacktestBase(object):
         return commission
 
     def place_buy_order(self, bar, units=None, cash=None):
-        # TODO save the buying date and price
         ''' Place a buy order. '''
         date, price = self.get_date_price(bar)
         #self.buydates.append(bar)
         if units is None:
             units = int(cash / price)
 
-        self.tradeRecord.loc[date] = [units, price]
         if self.commission_included:
             self.commission = self.calculate_commission(units, price)
         else:
             self.commission = 0
+        self.trade_ledger.append(date, TradeLedger.BUY, units, price, self.commission)
 
         self.cash -= (units * price) + self.commission
         self.units += units
         self.trades += 1
-        if self.verbose:
-            print(f'{str(date)[:10]} | buying {units} units at {price:.2f} ')
-            self.print_balance(bar)
+        journal = self.journal
+        if journal.level <= INFO:
+            journal.record(INFO, 'buy', date, self.symbol, units, price, units * price)
+            journal.record(DEBUG, 'balance', date, cash=self.cash)
         #self.data.loc[self.data.index[bar], 'units'] = self.units  # store in the df ###########
 
     def place_sell_order(self, bar, units=None, cash=None):
-        # TODO save the selling date and price
         ''' Place a sell order.'''
         date, price = self.get_date_price(bar)
         #self.selldates.append(bar)
         if units is None:
             units = int(cash / price)
-        self.tradeRecord.loc[date] = [-units, price]
 
         if self.commission_included:
             self.commission = self.calculate_commission(units, price)
         else:
             self.commission = 0
+        self.trade_ledger.append(date, TradeLedger.SELL, units, price, self.commission)
 
         self.cash += (units * price) - self.commission  #cash out
         self.units -= units
         self.trades += 1
-        if self.verbose:
-            print(f'{str(date)[:10]} | selling {units} units at {price:.2f} ')
-            self.print_balance(bar)
+        journal = self.journal
+        if journal.level <= INFO:
+            journal.record(INFO, 'sell', date, self.symbol, units, price, units * price)
+            journal.record(DEBUG, 'balance', date, cash=self.cash)
         #self.data.loc[self.data.index[bar], 'units'] = self.units  # store in the df ###########
 
     def close_out(self, bar):
@@ -124,59 +200,77 @@ class BacktestBase(object):
         self.cash += self.units * price
         self.units = 0
         self.trades += 1
-        if self.verbose:
-            print(f'{str(date)[:10]} | inventory {self.units} units at {price:.2f}')
-            print('=' * 55)
-        print('Final balance   [$] {:.2f}'.format(self.cash))
+        self.journal.record(INFO, 'close_out', date, self.symbol, self.units, price)
+        self.journal.record(SUMMARY, 'final', date, units=self.trades, cash=self.cash)
         # perf = ((self.cash - self.initial_amount) /
         #         self.initial_amount * 100)
         # print('Net Performance [%] {:.2f}'.format(perf))
-        print('Trades Executed [#] {:.2f}'.format(self.trades))
-        print('=' * 55)
+        self.journal.flush()
 
 
     def plot_data(self):
         """ Plots the closing prices for symbol."""
-        plt.figure(1)
-        plt.subplot(2, 1, 1)
-        plt.plot(self.data.index, self.data[self.symbol], linewidth=1., label='Stock Price')
+        with self.phase('plot_data', len(self.data)):
+            plt.figure(1)
+            plt.subplot(2, 1, 1)
+            plt.plot(self.data.index, self.data[self.symbol], linewidth=1., label='Stock Price')
+
+            #self.data[self.symbol].plot(title=self.symbol, linewidth=1., label='stock price')
 
-        #self.data[self.symbol].plot(title=self.symbol, linewidth=1., label='stock price')
+            ledger = self.trade_ledger
+            longs = ledger.side == TradeLedger.BUY
+            shorts = ledger.side == TradeLedger.SELL
+            plt.plot(ledger.timestamp[longs], ledger.price[longs], '^', markersize=5, color='g', label='Long')
+            plt.plot(ledger.timestamp[shorts], ledger.price[shorts], 'v', markersize=5, color='r', label='short')
 
-        long_dates = []
-        long_prices = []
+            plt.subplot(2, 1, 2)
+            self.data['equity_curve'].plot(title="Equity curve", color='#FFAF33')
 
-        for date, row in self.tradeRecord.iterrows():
-            if row['units'] > 0:
-                plt.plot(date, row['price'], '^', markersize=5, color='g', label='Long')
-            elif row['units'] < 0:
-                plt.plot(date, row['price'], 'v', markersize=5, color='r', label='short')
+            plt.subplots_adjust(left=0.1,
+                                bottom=0.1,
+                                right=0.9,
+                                top=0.9,
+                                wspace=0.4,
+                                hspace=0.6)
+            plt.show()
 
-        plt.subplot(2, 1, 2)
-        self.data['equity_curve'].plot(title="Equity curve", color='#FFAF33')
+    def benchmark_returns(self):
+        """ Returns of BENCHMARK_SYMBOL on the bars of self.data, None if the price source has no such column. """
+        try:
+            prices = self.load_prices([self.BENCHMARK_SYMBOL])[self.BENCHMARK_SYMBOL]
+        except KeyError:
+            return None
+        prices = prices.reindex(self.data.index).ffill()
+        if prices.isna().all():
+            return None
+        return prices.pct_change().fillna(0)
 
-        plt.subplots_adjust(left=0.1,
-                            bottom=0.1,
-                            right=0.9,
-                            top=0.9,
-                            wspace=0.4,
-                            hspace=0.6)
-        plt.show()
+    def close_out_prices(self):
+        ''' Price close_out sells the position at, to score it as a round trip of the trade ledger.'''
+        return self.data[self.symbol].iloc[-1]
 
     def summary_stats(self):
-        # TODO   CAGR, Information Ratio, , Sortino, winning rate
-
-        self.data = create_equity_curve_dataframe(self.data)
-        total_return = self.data['equity_curve'].iloc[-1]
-        sharpe_ratio = calculate_sharpe_ratio(self.data['returns'])
-        max_dd, dd_duration = calculate_drawdowns(self.data['equity_curve'])
-        calmar_ratio = calculate_calmar_ratio(self.data['equity_curve'])
-
-        stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
-                 ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
-                 ("Calmar Ratio", "%0.2f" % calmar_ratio),
-                 ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
-                 ("Drawdown Duration", "%d" % dd_duration)]
-
-        for stat in stats:
-            print(f"{stat[0]}: {stat[1]}")
+        with self.phase('summary_stats', len(self.data)):
+            self.data = create_equity_curve_dataframe(self.data)
+            benchmark_returns = self.benchmark_returns()
+            metrics = calculate_metrics(self.data['returns'], benchmark_returns)  # one pass for all the stats
+
+            stats = [("Total Return", "%0.2f%%" % (metrics.total_return * 100.0)),
+                     ("CAGR", "%0.2f%%" % (metrics.cagr * 100.0)),
+                     ("Sharpe Ratio", "%0.2f" % metrics.sharpe_ratio),
+                     ("Sortino Ratio", "%0.2f" % metrics.sortino_ratio),
+                     ("Calmar Ratio", "%0.2f" % metrics.calmar_ratio),
+                     ("Max Drawdown", "%0.2f%%" % (metrics.max_drawdown * 100.0)),
+                     ("Drawdown Duration", "%d" % metrics.drawdown_duration),
+                     ("Win Rate", "%0.2f%%" % (self.trade_ledger.win_rate(self.close_out_prices()) * 100.0))]
+            if benchmark_returns is not None:
+                benchmark = self.BENCHMARK_SYMBOL
+                stats += [(f"Information Ratio ({benchmark})", "%0.2f" % metrics.information_ratio),
+                          (f"Beta ({benchmark})", "%0.2f" % metrics.beta),
+                          (f"Alpha ({benchmark})", "%0.2f%%" % (metrics.alpha * 100.0))]
+            stats += [("Fills", "%d" % len(self.trade_ledger)),
+                      ("Commission Paid", "%0.2f" % self.trade_ledger.commission.sum())]
+
+            for stat in stats:
+                print(f"{stat[0]}: {stat[1]}")
+        return metrics
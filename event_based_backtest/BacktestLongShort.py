@@ -1,11 +1,11 @@
 from BacktestBase import *
+import indicators  # module import: run_mean_reversion_strategy's SMA argument shadows the class
 
 
 class BacktestLongShort(BacktestBase):
 
     def go_long(self, bar, units=None, amount=None):
         if self.position == -1:
-            print(self.units)
             self.place_buy_order(bar, units=-self.units)  # close the short position
         if units:
             self.place_buy_order(bar, units=units)
@@ -28,44 +28,59 @@ class BacktestLongShort(BacktestBase):
         msg = f'\n\nRunning SMA strategy | SMA1={SMA1} & SMA2={SMA2}'
         msg += f'\nfixed costs {self.ftc} | '
         msg += f'proportional costs {self.ptc}'
-        print(msg)
-        print('=' * 55)
+        self.journal.record(SUMMARY, 'start', text=msg)
         self.position = 0  # initial neutral position
         self.trades = 0  # no trades yet
         self.amount = self.initial_amount  # reset initial capital
-        self.data['SMA1'] = self.data['price'].rolling(SMA1).mean()
-        self.data['SMA2'] = self.data['price'].rolling(SMA2).mean()
+        # streaming SMAs, updated bar by bar and still warm for live bars after the run
+        self.sma1 = indicators.SMA(SMA1)
+        self.sma2 = indicators.SMA(SMA2)
+        price = self.data[self.symbol].tolist()
+        sma1 = np.empty(len(price))
+        sma2 = np.empty(len(price))
 
-        for bar in range(SMA2, len(self.data)):
+        for bar in range(len(price)):
+            sma1[bar] = self.sma1.update(price[bar])
+            sma2[bar] = self.sma2.update(price[bar])
+            if bar < SMA2:  # warm-up
+                continue
             if self.position in [0, -1]:
-                if self.data['SMA1'].iloc[bar] > self.data['SMA2'].iloc[bar]:
+                if sma1[bar] > sma2[bar]:
                     self.go_long(bar, amount='all')
                     self.position = 1  # long position
             if self.position in [0, 1]:
-                if self.data['SMA1'].iloc[bar] < self.data['SMA2'].iloc[bar]:
+                if sma1[bar] < sma2[bar]:
                     self.go_short(bar, amount='all')
                     self.position = -1  # short position
+        self.data['SMA1'] = sma1
+        self.data['SMA2'] = sma2
         self.close_out(bar)
 
     def run_momentum_strategy(self, momentum):
         msg = f'\n\nRunning momentum strategy | {momentum} days'
         msg += f'\nfixed costs {self.ftc} | '
         msg += f'proportional costs {self.ptc}'
-        print(msg)
-        print('=' * 55)
+        self.journal.record(SUMMARY, 'start', text=msg)
         self.position = 0  # initial neutral position
         self.trades = 0  # no trades yet
         self.amount = self.initial_amount  # reset initial capital
-        self.data['momentum'] = self.data['return'].rolling(momentum).mean()
-        for bar in range(momentum, len(self.data)):
+        self.momentum = indicators.Momentum(momentum)  # mean log return of the last momentum bars
+        price = self.data[self.symbol].tolist()
+        signal = np.empty(len(price))
+
+        for bar in range(len(price)):
+            signal[bar] = self.momentum.update(price[bar])
+            if bar < momentum:  # warm-up
+                continue
             if self.position in [0, -1]:
-                if self.data['momentum'].iloc[bar] > 0:
+                if signal[bar] > 0:
                     self.go_long(bar, amount='all')
                     self.position = 1  # long position
             if self.position in [0, 1]:
-                if self.data['momentum'].iloc[bar] <= 0:
+                if signal[bar] <= 0:
                     self.go_short(bar, amount='all')
                     self.position = -1  # short position
+        self.data['momentum'] = signal
         self.close_out(bar)
 
     def run_mean_reversion_strategy(self, SMA, threshold):
@@ -73,32 +88,34 @@ class BacktestLongShort(BacktestBase):
         msg += f'SMA={SMA} & thr={threshold}'
         msg += f'\nfixed costs {self.ftc} | '
         msg += f'proportional costs {self.ptc}'
-        print(msg)
-        print('=' * 55)
+        self.journal.record(SUMMARY, 'start', text=msg)
         self.position = 0  # initial neutral position
         self.trades = 0  # no trades yet
         self.amount = self.initial_amount  # reset initial capital
+        self.sma = indicators.SMA(SMA)
+        price = self.data[self.symbol].tolist()
+        sma = np.empty(len(price))
 
-        self.data['SMA'] = self.data['price'].rolling(SMA).mean()
-
-        for bar in range(SMA, len(self.data)):
+        for bar in range(len(price)):
+            sma[bar] = self.sma.update(price[bar])
+            if bar < SMA:  # warm-up
+                continue
             if self.position == 0:
-                if (self.data['price'].iloc[bar] <
-                        self.data['SMA'].iloc[bar] - threshold):
+                if price[bar] < sma[bar] - threshold:
                     self.go_long(bar, amount=self.initial_amount)
                     self.position = 1
-                elif (self.data['price'].iloc[bar] >
-                        self.data['SMA'].iloc[bar] + threshold):
+                elif price[bar] > sma[bar] + threshold:
                     self.go_short(bar, amount=self.initial_amount)
                     self.position = -1
             elif self.position == 1:
-                if self.data['price'].iloc[bar] >= self.data['SMA'].iloc[bar]:
+                if price[bar] >= sma[bar]:
                     self.place_sell_order(bar, units=self.units)
                     self.position = 0
             elif self.position == -1:
-                if self.data['price'].iloc[bar] <= self.data['SMA'].iloc[bar]:
+                if price[bar] <= sma[bar]:
                     self.place_buy_order(bar, units=-self.units)
                     self.position = 0
+        self.data['SMA'] = sma
         self.close_out(bar)
 
 
@@ -0,0 +1,149 @@
+from BacktestBase import *
+
+
+class BacktestPortfolio(BacktestBase):
+    ''' Backtest of many symbols at once on one aligned (bars x symbols) price matrix.
+
+    The initial cash is split equally into one sleeve per symbol. Units, cash
+    and net wealth are arrays with one entry per symbol, and orders are placed
+    for all selected symbols of a bar in one vectorized step.
+    '''
+
+    calculate_commissions = staticmethod(np.vectorize(BacktestBase.calculate_commission, otypes=[float]))
+
+    def __init__(self, symbols, start, end, cash, commission_included=False, verbose=True, file_path=None,
+                 bar_store=None, data=None, profile=None, journal=None):
+        self.symbols = list(symbols)
+        super().__init__(self.symbols, start, end, cash, commission_included, verbose, file_path, bar_store, data,
+                         profile, journal)
+        self.reset()
+
+    def get_data(self):
+        """ Retrieves the prices of all symbols as one aligned price matrix. """
+        raw = self.load_prices(self.symbols).dropna(how='all')  # a symbol may be missing before listing / after delisting
+        self.data = raw
+        self.prices = raw.to_numpy(dtype=float)  # bars x symbols
+        self.valuation_prices = raw.ffill().to_numpy(dtype=float)  # last known price, to value held units
+
+    def reset(self):
+        ''' Equal cash sleeves, no units and no trades for every symbol.'''
+        n_bars, n_symbols = self.prices.shape
+        self.cash = np.full(n_symbols, self.initial_amount / n_symbols)
+        self.units = np.zeros(n_symbols)
+        self.position = np.zeros(n_symbols, dtype=int)
+        self.trades = 0
+        self.units_ledger = np.zeros((n_bars, n_symbols))
+        self.cash_ledger = np.tile(self.cash, (n_bars, 1))
+        self.net_wealth = self.cash_ledger.copy()
+        self.trade_ledger = TradeLedger(self.symbols)
+
+    def print_balance(self, bar):
+        ''' Journal the current total cash balance.'''
+        date = self.data.index[bar]
+        self.journal.record(DEBUG, 'balance', date, cash=self.cash.sum())
+
+    def place_buy_orders(self, bar, mask, units=None):
+        ''' Place a buy order for every symbol selected by mask, with all sleeve cash if units is None.'''
+        date = self.data.index[bar]
+        price = self.prices[bar, mask]
+        if units is None:
+            units = np.trunc(self.cash[mask] / price)
+        if self.commission_included:
+            commission = self.calculate_commissions(units, price)
+        else:
+            commission = 0
+
+        self.cash[mask] -= (units * price) + commission
+        self.units[mask] += units
+        self.trades += int(mask.sum())
+        self.trade_ledger.extend(date, TradeLedger.BUY, units, price, commission, np.flatnonzero(mask))
+        journal = self.journal
+        if journal.level <= INFO:
+            journal.record(INFO, 'buy_basket', date, units=int(mask.sum()), value=(units * price).sum())
+            journal.record(DEBUG, 'balance', date, cash=self.cash.sum())
+
+    def place_sell_orders(self, bar, mask, units=None):
+        ''' Place a sell order for every symbol selected by mask, all held units if units is None.'''
+        date = self.data.index[bar]
+        price = self.prices[bar, mask]
+        if units is None:
+            units = self.units[mask]
+        if self.commission_included:
+            commission = self.calculate_commissions(units, price)
+        else:
+            commission = 0
+
+        self.cash[mask] += (units * price) - commission
+        self.units[mask] -= units
+        self.trades += int(mask.sum())
+        self.trade_ledger.extend(date, TradeLedger.SELL, units, price, commission, np.flatnonzero(mask))
+        journal = self.journal
+        if journal.level <= INFO:
+            journal.record(INFO, 'sell_basket', date, units=int(mask.sum()), value=(units * price).sum())
+            journal.record(DEBUG, 'balance', date, cash=self.cash.sum())
+
+    def record_bar(self, bar):
+        ''' Store units, cash and net wealth of every symbol for bar.'''
+        self.units_ledger[bar] = self.units
+        self.cash_ledger[bar] = self.cash
+        self.net_wealth[bar] = self.units * self.valuation_prices[bar] + self.cash
+
+    def close_out(self, bar):
+        ''' Closing out all positions.'''
+        date = self.data.index[bar]
+        self.cash += self.units * self.valuation_prices[bar]
+        self.trades += int((self.units != 0).sum())
+        self.units[:] = 0
+        self.data['net_wealth'] = self.net_wealth.sum(axis=1)  # portfolio level, as used by summary_stats
+        self.journal.record(INFO, 'close_out_basket', date, units=len(self.symbols))
+        self.journal.record(SUMMARY, 'final', date, units=self.trades, cash=self.cash.sum())
+        self.journal.flush()
+
+    def close_out_prices(self):
+        ''' Prices close_out values the positions at, one per symbol.'''
+        return self.valuation_prices[-1]
+
+    def plot_data(self):
+        """ Plots the equity curve of the portfolio."""
+        with self.phase('plot_data', len(self.data)):
+            self.data['equity_curve'].plot(title="Equity curve", color='#FFAF33')
+            plt.show()
+
+
+class PortfolioSMAsCross(BacktestPortfolio):
+
+    def signal_calculation(self, SMA1, SMA2):
+        ''' Backtesting the SMAsCross strategy on every symbol of the portfolio.
+        SMA1, SMA2: int
+            shorter and longer term simple moving average (in days)
+        '''
+        msg = f'\n\nRunning portfolio SMA strategy | {len(self.symbols)} symbols | SMA1={SMA1} & SMA2={SMA2}'
+        msg += f'\nCommission costs included {self.commission_included} | '
+        self.journal.record(SUMMARY, 'start', text=msg)
+        self.reset()
+        with self.phase('indicators', len(self.prices)):
+            prices = self.data[self.symbols]
+            sma1 = prices.rolling(SMA1).mean().to_numpy()
+            sma2 = prices.rolling(SMA2).mean().to_numpy()
+
+        with self.phase('bar_loop', len(self.prices)):
+            for bar in range(SMA2, len(self.prices)):
+                buy = (self.position == 0) & (sma1[bar] > sma2[bar])  # NaN SMAs (not listed) compare False
+                sell = (self.position == 1) & (sma1[bar] < sma2[bar])
+                if buy.any():
+                    self.place_buy_orders(bar, buy)  # buy with all sleeve cash
+                    self.position[buy] = 1  # long position
+                if sell.any():
+                    self.place_sell_orders(bar, sell)  # sell units
+                    self.position[sell] = 0  # market neutral
+                self.record_bar(bar)
+
+        self.close_out(bar)
+
+
+if __name__ == '__main__':
+    symbols = ['AAPL.O', 'MSFT.O', 'INTC.O', 'AMZN.O', 'GS.N', 'GLD', 'GDX']
+    pobt = PortfolioSMAsCross(symbols, '2010-1-1', '2019-12-31', 10000 * len(symbols), verbose=False)
+    pobt.signal_calculation(5, 66)
+    pobt.summary_stats()
+    pobt.plot_data()
@@ -1,22 +1,64 @@
 from BacktestBase import *
+from indicators import SMA
+from eventEngine import EventEngine, SMACrossStrategy, Portfolio, SimulatedExecution, bar_feed, FILL
 
 
 class SMAsCross(BacktestBase):
 
-    def signal_calculation(self, SMA1, SMA2):
+    def signal_calculation(self, SMA1, SMA2, engine=None):
         ''' Backtesting a SMA-based strategy.
         SMA1, SMA2: int
             shorter and longer term simple moving average (in days)
+        engine: str
+            'numpy' runs the bar loop over preallocated arrays and writes the
+            ledger columns back once, 'pandas' writes into self.data every bar,
+            'stream' feeds streaming SMA indicators bar by bar instead of
+            computing the rolling means over the full history first, 'event'
+            runs the strategy as handlers of an eventEngine.EventEngine;
+            by default 'numpy', or 'event' for a stream backtest, which only
+            runs on the event engine
         '''
         msg = f'\n\nRunning SMA strategy | SMA1={SMA1} & SMA2={SMA2}'
         msg += f'\nCommission costs included {self.commission_included} | '
-        print(msg)
-        print('=' * 55)
+        self.journal.record(SUMMARY, 'start', text=msg)
         self.position = 0  # initial neutral position
         self.trades = 0  # no trades yet
         self.cash = self.initial_amount  # reset initial cash
-        self.data['SMA1'] = self.data[self.symbol].rolling(SMA1).mean()
-        self.data['SMA2'] = self.data[self.symbol].rolling(SMA2).mean()
+        if self.stream:
+            if engine not in (None, 'event'):
+                raise ValueError(f'A stream backtest runs on the "event" engine only, not {engine!r}')
+            with self.phase('bar_loop', lambda: len(self.data)):
+                bar = self._run_event_feed(SMA1, SMA2)
+            self.close_out(bar)
+            return
+        engine = engine or 'numpy'
+        if engine == 'stream':
+            with self.phase('bar_loop', len(self.data)):  # indicators are updated inside the loop
+                bar = self._run_stream_loop(SMA1, SMA2)
+            self.close_out(bar)
+            return
+        if engine == 'event':
+            with self.phase('bar_loop', len(self.data)):
+                bar = self._run_event_engine(SMA1, SMA2)
+            self.close_out(bar)
+            return
+
+        with self.phase('indicators', len(self.data)):
+            self.data['SMA1'] = self.data[self.symbol].rolling(SMA1).mean()
+            self.data['SMA2'] = self.data[self.symbol].rolling(SMA2).mean()
+
+        with self.phase('bar_loop', len(self.data)):
+            if engine == 'numpy':
+                bar = self._run_numpy_loop(SMA2)
+            elif engine == 'pandas':
+                bar = self._run_pandas_loop(SMA2)
+            else:
+                raise ValueError(f'Unknown engine {engine!r}, expected "numpy", "pandas", "stream" or "event"')
+
+        self.close_out(bar)
+
+    def _run_pandas_loop(self, SMA2):
+        ''' Reference bar loop, storing units/cash/net_wealth via self.data.loc every bar.'''
         self.data.iloc[:SMA2, self.data.columns.get_loc('net_wealth')] = self.cash  # initialize the first SMA2 days are with cash dollars
         self.data.iloc[:SMA2, self.data.columns.get_loc('cash')] = self.cash
 
@@ -35,8 +77,165 @@ class SMAsCross(BacktestBase):
             #self.data.loc[self.data.index[bar], 'position'] = self.position  # store in the df ###########
             self.data.loc[self.data.index[bar], 'cash'] = self.cash
             self.data.loc[self.data.index[bar], 'net_wealth'] = self.units * price + self.cash  # store in the df ##########
+        return bar
 
-        self.close_out(bar)
+    def _run_numpy_loop(self, SMA2):
+        ''' Same bar loop as _run_pandas_loop, but over preallocated NumPy ledgers.
+        Prices and SMAs are read from plain lists, the ledgers are written back
+        into self.data in one go once the loop is done.
+        '''
+        n = len(self.data)
+        price = self.data[self.symbol].to_numpy(dtype=float)
+        price_list = price.tolist()
+        sma1 = self.data['SMA1'].tolist()
+        sma2 = self.data['SMA2'].tolist()
+
+        units = np.full(n, None, dtype=object)  # no units stored during the SMA2 warm-up, as in the pandas loop
+        cash = np.full(n, self.cash, dtype=float)  # the first SMA2 days are with cash dollars
+        net_wealth = np.full(n, self.cash, dtype=float)
+
+        for bar in range(SMA2, n):
+            if self.position == 0:
+                if sma1[bar] > sma2[bar]:
+                    self.place_buy_order(bar, cash=self.cash)  # buy cash amount
+                    self.position = 1  # long position
+            elif self.position == 1:
+                if sma1[bar] < sma2[bar]:
+                    self.place_sell_order(bar, units=self.units)  # sell units
+                    self.position = 0  # market neutral
+
+            units[bar] = self.units
+            cash[bar] = self.cash
+            net_wealth[bar] = self.units * price_list[bar] + self.cash
+
+        self.data['units'] = units
+        self.data['cash'] = cash
+        self.data['net_wealth'] = net_wealth
+        return bar
+
+    def next_signal(self, price):
+        ''' Feed one new price to the streaming SMAs and return the order it triggers:
+        1 to buy, -1 to sell, 0 to hold. Works the same on historical and live bars.
+        '''
+        sma1 = self.sma1.update(price)
+        sma2 = self.sma2.update(price)
+        if self.position == 0 and sma1 > sma2:
+            return 1
+        if self.position == 1 and sma1 < sma2:
+            return -1
+        return 0
+
+    def _run_stream_loop(self, SMA1, SMA2):
+        ''' Same bar loop as _run_numpy_loop, with the SMAs updated one bar at a time.
+        self.sma1/self.sma2 stay warm afterwards, so next_signal can carry on with live
+        prices (e.g. from BrokerAPI.fetch_last_price) without recomputing history.
+        '''
+        self.sma1 = SMA(SMA1)
+        self.sma2 = SMA(SMA2)
+        n = len(self.data)
+        price_list = self.data[self.symbol].to_numpy(dtype=float).tolist()
+
+        sma1 = np.empty(n)
+        sma2 = np.empty(n)
+        units = np.full(n, None, dtype=object)
+        cash = np.full(n, self.cash, dtype=float)
+        net_wealth = np.full(n, self.cash, dtype=float)
+
+        for bar in range(n):
+            signal = self.next_signal(price_list[bar])
+            sma1[bar] = self.sma1.value
+            sma2[bar] = self.sma2.value
+            if bar < SMA2:  # trading starts after the SMA2 warm-up, as in the other engines
+                continue
+            if signal == 1:
+                self.place_buy_order(bar, cash=self.cash)  # buy cash amount
+                self.position = 1  # long position
+            elif signal == -1:
+                self.place_sell_order(bar, units=self.units)  # sell units
+                self.position = 0  # market neutral
+
+            units[bar] = self.units
+            cash[bar] = self.cash
+            net_wealth[bar] = self.units * price_list[bar] + self.cash
+
+        self.data['SMA1'] = sma1
+        self.data['SMA2'] = sma2
+        self.data['units'] = units
+        self.data['cash'] = cash
+        self.data['net_wealth'] = net_wealth
+        return bar
+
+    def _run_event_engine(self, SMA1, SMA2):
+        ''' Same strategy as _run_stream_loop, as market/signal/order/fill events through an
+        EventEngine: SMACrossStrategy signals, Portfolio sizes the orders and books the fills,
+        SimulatedExecution fills them at the close.
+        '''
+        engine, strategy, portfolio = self._event_handlers(SMA1, SMA2)
+        engine.add_feed(bar_feed(self.data[[self.symbol]]))
+        engine.run()
+        return self._store_event_results(SMA2, strategy, portfolio)
+
+    def _run_event_feed(self, SMA1, SMA2):
+        ''' _run_event_engine on the bars of self.feed(), read one chunk at a time instead of
+        loading them first; self.data is built afterwards from the prices, the SMA1/SMA2
+        columns (SMA.update_many per chunk, warm across chunks) and the results of the run.
+        '''
+        engine, strategy, portfolio = self._event_handlers(SMA1, SMA2)
+        sma1, sma2 = SMA(SMA1), SMA(SMA2)
+        chunks = []
+
+        def on_chunk(chunk):
+            if not chunks:
+                self.set_date_format(chunk.index)
+            price = chunk[self.symbol].to_numpy(dtype=float)
+            chunks.append((chunk.index, price, sma1.update_many(price), sma2.update_many(price)))
+
+        engine.add_feed(self.feed().events(on_chunk))
+        engine.run()
+        if not chunks:
+            raise ValueError(f'No bars of {self.symbol} between {self.start} and {self.end}')
+
+        index = chunks[0][0].append([chunk[0] for chunk in chunks[1:]])
+        self.data = pd.DataFrame({self.symbol: np.concatenate([chunk[1] for chunk in chunks])}, index=index)
+        self.data['SMA1'] = np.concatenate([chunk[2] for chunk in chunks])
+        self.data['SMA2'] = np.concatenate([chunk[3] for chunk in chunks])
+        return self._store_event_results(SMA2, strategy, portfolio)
+
+    def _event_handlers(self, SMA1, SMA2):
+        ''' EventEngine with the SMACrossStrategy, Portfolio and SimulatedExecution of a run
+        subscribed, and the fills journaled.
+        '''
+        engine = EventEngine()
+        strategy = SMACrossStrategy(engine, self.symbol, SMA1, SMA2)
+        portfolio = Portfolio(engine, self.cash, [self.symbol])
+        SimulatedExecution(engine, self.calculate_commission if self.commission_included else None)
+        if self.journal.level <= INFO:
+            def journal_fill(event):  # subscribed after the portfolio, which has booked the fill already
+                date = pd.Timestamp(event.timestamp)
+                self.journal.record(INFO, 'buy' if event.side == TradeLedger.BUY else 'sell', date, event.symbol,
+                                    event.units, event.price, event.units * event.price)
+                self.journal.record(DEBUG, 'balance', date, cash=portfolio.cash)
+            engine.subscribe(FILL, journal_fill)
+        return engine, strategy, portfolio
+
+    def _store_event_results(self, SMA2, strategy, portfolio):
+        ''' Take over the state of an event run and store its units/cash/net_wealth in self.data.'''
+        n = len(self.data)
+        ledger = portfolio.trade_ledger
+        held = np.zeros(n, dtype=int)  # units held after each bar, from the fills
+        np.add.at(held, self.data.index.searchsorted(ledger.timestamp), ledger.signed_units.astype(int))
+        units = np.full(n, None, dtype=object)  # no units stored during the SMA2 warm-up, as in the other engines
+        units[SMA2:] = np.cumsum(held)[SMA2:].tolist()
+        self.sma1, self.sma2 = strategy.sma1, strategy.sma2
+        self.position = strategy.position
+        self.trade_ledger = portfolio.trade_ledger
+        self.cash = portfolio.cash
+        self.units = portfolio.units.get(self.symbol, 0)
+        self.trades += portfolio.trades
+        self.data['units'] = units
+        self.data['cash'] = portfolio.cash_balance
+        self.data['net_wealth'] = portfolio.net_wealth
+        return n - 1
 
     # def run_momentum_strategy(self, momentum):
     #     ''' Backtesting a momentum-based strategy.
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from eventEngine import bar_feed
+from priceCache import get_price_cache
+
+
+class BarFeed(object):
+    ''' Bars of a wide price file (date index + one column per symbol), read chunk_bars dates at a time.
+
+    binary=False parses the CSV itself chunk by chunk, binary=True slices
+    the memory-mapped columns of its priceCache.PriceCache. Either way at
+    most one chunk is held in memory, whatever the length of the file; the
+    backtest loop carries its own state across chunks, e.g. streaming
+    indicators or SMA.update_many(chunk), which keeps the warm-up window.
+    start, end and complete_rows select the same bars as
+    PriceCache.load_frame.
+    The bars can also come from the other price sources of BacktestBase:
+    data, a DataFrame already in memory, or bar_store, the
+    database.barStore.BarStore holding the bars of file_path, which is then
+    read with one range query per chunk.
+    '''
+
+    def __init__(self, file_path, symbols=None, start=None, end=None, chunk_bars=65536, binary=False,
+                 complete_rows=False, data=None, bar_store=None):
+        self.file_path = file_path
+        self.symbols = list(symbols) if symbols is not None else None
+        self.start = start
+        self.end = end
+        self.chunk_bars = chunk_bars
+        self.binary = binary
+        self.complete_rows = complete_rows
+        self.data = data
+        self.bar_store = bar_store
+
+    def chunks(self):
+        ''' Consecutive DataFrames of up to chunk_bars dates.'''
+        if self.data is not None:
+            rows = self.data.loc[self.start:self.end]
+            if self.complete_rows:
+                rows = rows.dropna()
+            if self.symbols is not None:
+                rows = rows[self.symbols]
+            for start in range(0, len(rows), self.chunk_bars):
+                yield rows.iloc[start:start + self.chunk_bars]
+            return
+
+        if self.bar_store is not None:
+            yield from self.bar_store.iter_chunks(self.symbols, self.start, self.end,
+                                                  self.bar_store.table_name(self.file_path), self.chunk_bars,
+                                                  self.complete_rows)
+            return
+
+        if self.binary:
+            yield from get_price_cache(self.file_path).iter_chunks(self.symbols, self.start, self.end,
+                                                                     self.chunk_bars, self.complete_rows)
+            return
+
+        for chunk in pd.read_csv(self.file_path, index_col=0, parse_dates=True, chunksize=self.chunk_bars):
+            rows = chunk.index.slice_indexer(self.start, self.end)
+            selected = chunk.iloc[rows]
+            if self.complete_rows:  # complete in every column of the file, as the price cache mask
+                selected = selected[selected.notna().all(axis=1).to_numpy()]
+            if len(selected):
+                yield selected if self.symbols is None else selected[self.symbols]
+            if rows.stop < len(chunk):  # past end, the dates are sorted
+                break
+
+    def __iter__(self):
+        ''' (timestamp in ns, tuple of prices) per date, in the order of the symbols.'''
+        for chunk in self.chunks():
+            timestamps = np.asarray(chunk.index, dtype='datetime64[ns]').view(np.int64).tolist()
+            yield from zip(timestamps, map(tuple, chunk.to_numpy(dtype=float).tolist()))
+
+    def events(self, on_chunk=None):
+        ''' The bars as eventEngine.MarketEvents, for EventEngine.add_feed; on_chunk(chunk)
+        is called with every chunk before its events, e.g. to keep indicator columns.
+        '''
+        for chunk in self.chunks():
+            if on_chunk is not None:
+                on_chunk(chunk)
+            yield from bar_feed(chunk)
@@ -0,0 +1,313 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import statsmodels.tsa.vector_ar.vecm as vm
+from statsmodels.tsa.coint_tables import c_sjt
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)),
+                          'data', '.cache', 'cointegration_screen.json')
+CACHE_WINDOWS = 8  # training windows kept in the screen cache, the most recently screened ones
+MIN_OBS = 250 * 7  # fewer bars in the window and the stock is taken as non-cointegrated
+
+# Training panel of a worker process, set once by _init_worker instead of being pickled with every task
+_panel = None
+_etf = None
+
+
+def _init_worker(panel, etf):
+    global _panel, _etf
+    _panel = panel
+    _etf = etf
+
+
+def johansen_trace(stock, etf, min_obs=MIN_OBS):
+    ''' Johansen trace test of one stock against the ETF on the dates where both have a price.
+    Returns (trace statistic, 95% critical value, number of observations); the
+    statistics are NaN when there are not more than min_obs observations.
+    '''
+    valid = ~np.isnan(stock) & ~np.isnan(etf)  # filter out dates that contain any null
+    n_obs = int(valid.sum())
+    if n_obs <= min_obs:
+        return np.nan, np.nan, n_obs
+    result = vm.coint_johansen(np.column_stack((stock[valid], etf[valid])), det_order=0, k_ar_diff=1)
+    return float(result.lr1[0]), float(result.cvt[0, 1]), n_obs
+
+
+def _screen_columns(args):
+    columns, min_obs = args
+    return [johansen_trace(_panel[:, c], _etf, min_obs) for c in columns]
+
+
+def _fingerprint(values):
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=float).tobytes()).hexdigest()
+
+
+def _load_cache(cache_file):
+    if cache_file and os.path.isfile(cache_file):
+        with open(cache_file) as file:
+            return json.load(file)
+    return {}
+
+
+def _cache_window(key):
+    ''' (symbol, window) of a cache key symbol|start|end|min_obs|etf fingerprint|stock fingerprint.'''
+    parts = key.split('|')
+    return parts[0], '|'.join(parts[1:4])
+
+
+def _prune_cache(cache, keys, max_windows=CACHE_WINDOWS):
+    ''' Keep only the current keys of their (symbol, window), the results for older prices of the
+    same window are dropped, and only the max_windows windows screened last.
+    '''
+    current = {_cache_window(key): key for key in keys}
+    pruned = {key: stat for key, stat in cache.items() if current.get(_cache_window(key), key) == key}
+    for key in keys:  # the window just screened becomes the most recent one
+        pruned[key] = pruned.pop(key)
+    recent = list(dict.fromkeys(_cache_window(key)[1] for key in reversed(pruned)))[:max_windows]
+    return {key: stat for key, stat in pruned.items() if _cache_window(key)[1] in recent}
+
+
+def _save_cache(cache, cache_file):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_path = cache_file + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, cache_file)
+
+
+def screen_cointegration(cl_stocks, cl_etf, train_idx, max_workers=None, min_obs=MIN_OBS, cache_file=CACHE_FILE):
+    ''' Johansen screen of every stock against the ETF over the training window.
+
+    cl_stocks: DataFrame
+        stock prices, one column per symbol
+    cl_etf: Series
+        ETF prices on the same dates
+    train_idx: index
+        dates of the training window
+    max_workers: int
+        size of the process pool, defaults to the number of cores; 1 runs in process
+    cache_file: str
+        JSON file of previous results keyed by (symbol, window), holding the
+        last CACHE_WINDOWS windows; None disables it
+
+    Returns a DataFrame indexed by symbol with the trace statistic, the 95%
+    critical value, the number of observations and isCoint.
+    '''
+    # slice the training panel once, the workers only get column positions
+    panel = cl_stocks.loc[train_idx].to_numpy(dtype=float)
+    etf = cl_etf.loc[train_idx].to_numpy(dtype=float)
+    symbols = list(cl_stocks.columns)
+    window = f'{train_idx[0]}|{train_idx[-1]}|{min_obs}|{_fingerprint(etf)}'
+
+    cache = _load_cache(cache_file)
+    keys = [f'{symbol}|{window}|{_fingerprint(panel[:, c])}' for c, symbol in enumerate(symbols)]
+    todo = [c for c, key in enumerate(keys) if key not in cache]
+
+    if todo:
+        max_workers = max_workers or os.cpu_count() or 1
+        n_chunks = min(len(todo), max_workers * 4)
+        chunks = [(todo[i::n_chunks], min_obs) for i in range(n_chunks)]
+        if max_workers == 1:
+            _init_worker(panel, etf)
+            results = [_screen_columns(chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(panel, etf)) as pool:
+                results = list(pool.map(_screen_columns, chunks))
+        for (columns, _), stats in zip(chunks, results):
+            for c, stat in zip(columns, stats):
+                cache[keys[c]] = stat
+    if cache_file:
+        pruned = _prune_cache(cache, keys)
+        if todo or list(pruned) != list(cache):
+            _save_cache(pruned, cache_file)
+
+    screen = pd.DataFrame([cache[key] for key in keys], index=pd.Index(symbols, name='symbol'),
+                          columns=['trace_stat', 'crit_95', 'n_obs'])
+    screen['isCoint'] = screen['trace_stat'] > screen['crit_95']  # 95%, NaN (too little data) is False
+    return screen
+
+
+########################################################################
+# Walk-forward re-screening on rolling windows
+########################################################################
+
+def _moment_rows(stocks, etf):
+    ''' Per-bar regressors of the Johansen test (k_ar_diff=1, constant), one row per bar and stock.
+
+    Row t of stock s is [ds_t, de_t, s_t-1, e_t-1, ds_t-1, de_t-1, 1]; it is zero
+    when a price at t, t-1 or t-2 is missing, so it adds nothing to the moments.
+    Returns an array of shape (bars, stocks, 7).
+    '''
+    n_bars, n_stocks = stocks.shape
+    etf = np.broadcast_to(etf[:, np.newaxis], stocks.shape)
+    rows = np.zeros((n_bars, n_stocks, 7))
+    if n_bars < 3:
+        return rows
+    ds = np.diff(stocks, axis=0)
+    de = np.diff(etf, axis=0)
+    rows[2:, :, 0] = ds[1:]
+    rows[2:, :, 1] = de[1:]
+    rows[2:, :, 2] = stocks[1:-1]
+    rows[2:, :, 3] = etf[1:-1]
+    rows[2:, :, 4] = ds[:-1]
+    rows[2:, :, 5] = de[:-1]
+    rows[2:, :, 6] = 1.
+    rows[np.isnan(rows).any(axis=2)] = 0.
+    return rows
+
+
+def johansen_trace_from_moments(moments):
+    ''' Trace statistic of the Johansen test (det_order=0, k_ar_diff=1) from regressor moments.
+
+    moments: array (..., 7, 7)
+        sums of v v' over the rows of _moment_rows in the window
+    Equivalent to vm.coint_johansen(...).lr1[0]: the residual moments of
+    [dy_t, y_t-1] on [dy_t-1, 1] follow from the moment matrix by partitioned
+    regression, so a window only needs its moment sums. Returns the trace
+    statistics and the number of regression rows.
+    '''
+    n_rows = moments[..., 6, 6]
+    m_wz = moments[..., :4, 4:]
+    residual = moments[..., :4, :4] - m_wz @ np.linalg.solve(moments[..., 4:, 4:], np.swapaxes(m_wz, -1, -2))
+    residual = residual / n_rows[..., np.newaxis, np.newaxis]
+    s00 = residual[..., :2, :2]
+    sk0 = residual[..., 2:, :2]
+    skk = residual[..., 2:, 2:]
+    sig = sk0 @ np.linalg.solve(s00, np.swapaxes(sk0, -1, -2))
+    eigenvalues = np.linalg.eigvals(np.linalg.solve(skk, sig)).real
+    return -n_rows * np.log(1. - eigenvalues).sum(axis=-1), n_rows
+
+
+# Panel of a walk-forward worker process, set once by _init_walk_forward_worker
+_wf_stocks = None
+_wf_etf = None
+_wf_rows = None
+
+
+def _init_walk_forward_worker(stocks, etf):
+    global _wf_stocks, _wf_etf, _wf_rows
+    _wf_stocks = stocks
+    _wf_etf = etf
+    # levels are centered per stock: the test has a constant, so this only improves the rounding
+    valid = ~np.isnan(stocks)
+    center = np.where(valid, stocks, 0.).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    _wf_rows = _moment_rows(stocks - center, etf - np.nanmean(etf))
+
+
+def _window_returns(train, test, is_coint, lookback):
+    ''' Fit the long-only portfolio of the cointegrating stocks on the training bars and
+    trade its spread against the ETF over the test bars, as in indexArbitrage.py.
+    Returns the daily returns of the test bars and the eigenvector weights.
+    '''
+    log_stocks = np.log(_wf_stocks[:, is_coint])
+    log_etf = np.log(_wf_etf)
+    log_mkt_val_long = np.nansum(log_stocks[train], axis=1)
+    result = vm.coint_johansen(np.column_stack((log_mkt_val_long, log_etf[train])), det_order=0, k_ar_diff=1)
+    w_stocks, w_etf = result.evec[0, 0], result.evec[1, 0]
+
+    # spread from lookback bars before the test window on, so the z-score is warm on its first bar
+    bars = np.arange(max(test.start - lookback - 1, 0), test.stop)
+    spread = w_stocks * np.nansum(log_stocks[bars], axis=1) + w_etf * log_etf[bars]
+    spread = pd.Series(spread)
+    num_units = (-(spread - spread.rolling(lookback).mean()) / spread.rolling(lookback).std()).to_numpy()
+    weights = np.append(np.full(is_coint.sum(), w_stocks), w_etf)
+    positions = num_units[:, np.newaxis] * weights
+    log_prices = np.column_stack((log_stocks[bars], log_etf[bars]))
+    changes = np.diff(log_prices, axis=0)
+    pnl = np.nansum(positions[:-1] * changes, axis=1)
+    gross = np.nansum(np.abs(positions[:-1]), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = pnl / gross
+    n_test = test.stop - test.start
+    return returns[-n_test:], w_stocks, w_etf
+
+
+def _walk_forward_block(args):
+    ''' Run consecutive windows: the first window's moments are summed from scratch,
+    every later one is updated with the rows entering and leaving the window.
+    '''
+    windows, min_obs, lookback, crit_95 = args
+    moments = None
+    previous_first = previous_end = None  # rows of the window before, set once moments exist
+    out = []
+    for train_start, train_end, test_end in windows:
+        first_row = train_start + 2  # a row needs bars t-2..t inside the window
+        if moments is None:
+            block = _wf_rows[first_row:train_end]
+            moments = np.einsum('tsi,tsj->sij', block, block)
+        else:
+            entering = _wf_rows[previous_end:train_end]
+            leaving = _wf_rows[previous_first:first_row]
+            moments += np.einsum('tsi,tsj->sij', entering, entering)
+            moments -= np.einsum('tsi,tsj->sij', leaving, leaving)
+        previous_first, previous_end = first_row, train_end
+
+        enough = moments[:, 6, 6] + 2 > min_obs  # regression rows + 2 = observations in the window
+        trace = np.full(len(moments), np.nan)
+        if enough.any():
+            trace[enough] = johansen_trace_from_moments(moments[enough])[0]
+        is_coint = trace > crit_95
+        if is_coint.any():
+            returns, w_stocks, w_etf = _window_returns(slice(train_start, train_end), slice(train_end, test_end),
+                                                       is_coint, lookback)
+        else:
+            returns, w_stocks, w_etf = np.zeros(test_end - train_end), np.nan, np.nan
+        out.append((np.flatnonzero(is_coint), returns, w_stocks, w_etf))
+    return out
+
+
+def walk_forward(cl_stocks, cl_etf, train_years=7, freq='MS', start=None, lookback=5,
+                 min_obs=MIN_OBS, max_workers=None):
+    ''' Walk-forward version of the indexArbitrage.py strategy.
+
+    At every rebalance date (pandas frequency freq, e.g. 'MS' for monthly)
+    the stocks are re-screened against the ETF and the portfolio weights
+    re-estimated on the preceding train_years, then the spread is traded
+    until the next rebalance date.
+
+    The screen uses johansen_trace_from_moments: the window moments are
+    updated with the bars entering and leaving the window rather than
+    recomputed. Bars with a missing price (and the two after it) are left
+    out of the moments instead of joining the prices across the gap.
+    Consecutive windows are split into blocks that run on a process pool.
+
+    Returns the daily out-of-sample returns and one row per window with the
+    number of cointegrating stocks and the eigenvector weights.
+    '''
+    dates = pd.DatetimeIndex(pd.to_datetime(cl_stocks.index))
+    stocks = cl_stocks.to_numpy(dtype=float)
+    etf = cl_etf.to_numpy(dtype=float)
+    crit_95 = c_sjt(2, 0)[1]
+
+    first = dates[0] + pd.DateOffset(years=train_years)
+    rebalance = pd.date_range(max(first, pd.Timestamp(start)) if start else first, dates[-1], freq=freq)
+    ends = np.searchsorted(dates, rebalance, side='right')  # training ends after the rebalance date
+    ends = np.unique(np.append(ends, len(dates)))
+    windows = []
+    for train_end, test_end in zip(ends[:-1], ends[1:]):
+        train_start = np.searchsorted(dates, dates[train_end - 1] - pd.DateOffset(years=train_years), side='right')
+        windows.append((int(train_start), int(train_end), int(test_end)))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    n_blocks = max(1, min(len(windows), max_workers))
+    size = -(-len(windows) // n_blocks)
+    blocks = [(windows[i:i + size], min_obs, lookback, crit_95) for i in range(0, len(windows), size)]
+    if max_workers == 1:
+        _init_walk_forward_worker(stocks, etf)
+        results = [_walk_forward_block(block) for block in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers, initializer=_init_walk_forward_worker, initargs=(stocks, etf)) as pool:
+            results = list(pool.map(_walk_forward_block, blocks))
+
+    returns = []
+    summary = []
+    for (train_start, train_end, test_end), (coint, window_returns, w_stocks, w_etf) in zip(
+            windows, [window for block in results for window in block]):
+        returns.append(pd.Series(window_returns, index=cl_stocks.index[train_end:test_end]))
+        summary.append({'rebalance': cl_stocks.index[train_end - 1], 'train_start': cl_stocks.index[train_start],
+                        'n_coint': len(coint), 'symbols': list(cl_stocks.columns[coint]),
+                        'w_stocks': w_stocks, 'w_etf': w_etf})
+    return pd.concat(returns).rename('Return'), pd.DataFrame(summary).set_index('rebalance')
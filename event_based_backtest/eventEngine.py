@@ -0,0 +1,327 @@
+import heapq
+from collections import deque
+from itertools import chain, count
+import numpy as np
+from indicators import SMA
+from tradeLedger import TradeLedger
+
+# Event types, which double as their priority at equal timestamps: the events a
+# market event triggers (signal -> order -> fill) are handled before the next one.
+FILL, ORDER, SIGNAL, MARKET = range(4)
+
+
+class Event(object):
+    ''' Base of the engine events; timestamps are int nanoseconds since the epoch.'''
+    __slots__ = ('timestamp',)
+    type = None
+
+
+class MarketEvent(Event):
+    ''' New close price of one symbol.'''
+    __slots__ = ('symbol', 'price')
+    type = MARKET
+
+    def __init__(self, timestamp, symbol, price):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.price = price
+
+    def __repr__(self):
+        return f'MarketEvent({self.timestamp}, {self.symbol!r}, {self.price})'
+
+
+class SignalEvent(Event):
+    ''' Strategy view on a symbol: direction 1 to go long with strength (a fraction
+    of the free cash), -1 to go flat.
+    '''
+    __slots__ = ('symbol', 'direction', 'strength')
+    type = SIGNAL
+
+    def __init__(self, timestamp, symbol, direction, strength=1.):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.direction = direction
+        self.strength = strength
+
+    def __repr__(self):
+        return f'SignalEvent({self.timestamp}, {self.symbol!r}, {self.direction}, {self.strength})'
+
+
+class OrderEvent(Event):
+    ''' Market order of units (unsigned) on side TradeLedger.BUY or TradeLedger.SELL.'''
+    __slots__ = ('symbol', 'side', 'units')
+    type = ORDER
+
+    def __init__(self, timestamp, symbol, side, units):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.side = side
+        self.units = units
+
+    def __repr__(self):
+        return f'OrderEvent({self.timestamp}, {self.symbol!r}, {self.side}, {self.units})'
+
+
+class FillEvent(Event):
+    ''' Executed order, at price and with commission.'''
+    __slots__ = ('symbol', 'side', 'units', 'price', 'commission')
+    type = FILL
+
+    def __init__(self, timestamp, symbol, side, units, price, commission=0.):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.side = side
+        self.units = units
+        self.price = price
+        self.commission = commission
+
+    def __repr__(self):
+        return f'FillEvent({self.timestamp}, {self.symbol!r}, {self.side}, {self.units}, {self.price}, {self.commission})'
+
+
+def bar_feed(prices, chunk_bars=65536):
+    ''' Market events of a price DataFrame (DatetimeIndex, one column per symbol), bar by bar.
+    NaN prices are skipped; chunk_bars bars at a time are converted to Python objects and
+    their events are built by map, so the engine reads them without resuming a generator.
+    '''
+    symbols = np.array([str(symbol) for symbol in prices.columns], dtype=object)
+    values = prices.to_numpy(dtype=float)
+    timestamps = np.asarray(prices.index, dtype='datetime64[ns]').view(np.int64)
+
+    def chunks():
+        for start in range(0, len(values), chunk_bars):
+            chunk = values[start:start + chunk_bars]
+            rows, columns = np.nonzero(~np.isnan(chunk))  # row-major: bar by bar, symbols in column order
+            yield map(MarketEvent, timestamps[start + rows].tolist(), symbols[columns].tolist(),
+                      chunk[rows, columns].tolist())
+
+    return chain.from_iterable(chunks())
+
+
+class EventEngine(object):
+    ''' Dispatches events in (timestamp, type, arrival) order.
+
+    Handlers subscribe per event type, optionally only for the events of one
+    symbol, and are called in subscription order (handlers of all symbols
+    first), so any number of strategies, portfolios and execution handlers
+    can share one data feed. Feeds are iterators of MarketEvents in
+    timestamp order; they are read lazily, one event per feed is held at a
+    time, and while nothing queued comes first the next one is dispatched
+    straight away.
+
+    Future events wait in a heapq priority queue. Signals, orders and fills
+    put at the timestamp being handled, which is what handlers raise, go to
+    one FIFO deque per type instead: they come before the next market event
+    anyway, so they never take the heap round trip.
+    '''
+
+    def __init__(self):
+        self._queue = []
+        self._pending = (deque(), deque(), deque())  # FILL, ORDER, SIGNAL events at the current timestamp
+        self._now = None
+        self._sequence = count()
+        self._handlers = ([], [], [], [])  # by event type
+        self._symbol_handlers = ({}, {}, {}, {})  # by event type, then symbol
+        self.processed = 0
+
+    def subscribe(self, event_type, handler, symbol=None):
+        if symbol is None:
+            self._handlers[event_type].append(handler)
+        else:
+            self._symbol_handlers[event_type].setdefault(symbol, []).append(handler)
+
+    def unsubscribe(self, event_type, handler, symbol=None):
+        if symbol is None:
+            self._handlers[event_type].remove(handler)
+            return
+        handlers = self._symbol_handlers[event_type][symbol]
+        handlers.remove(handler)
+        if not handlers:
+            del self._symbol_handlers[event_type][symbol]
+
+    def put(self, event):
+        if event.timestamp == self._now and event.type != MARKET:
+            self._pending[event.type].append(event)
+        else:
+            heapq.heappush(self._queue, (event.timestamp, event.type, next(self._sequence), event, None))
+
+    def add_feed(self, feed):
+        feed = iter(feed).__next__
+        try:
+            event = feed()
+        except StopIteration:
+            return
+        heapq.heappush(self._queue, (event.timestamp, event.type, next(self._sequence), event, feed))
+
+    def run(self):
+        ''' Handle events until the queue and all feeds are exhausted, returning how many were handled.'''
+        queue = self._queue
+        pending = self._pending
+        fills, orders, signals = pending
+        handlers = self._handlers
+        symbol_handlers = self._symbol_handlers
+        sequence = self._sequence
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        for events in pending:  # put at the last timestamp of a previous run
+            while events:
+                event = events.popleft()
+                heappush(queue, (event.timestamp, event.type, next(sequence), event, None))
+        processed = 0
+        while queue:
+            now, event_type, _, event, feed = heappop(queue)
+            self._now = now
+            type_handlers = handlers[event_type]
+            type_routed = symbol_handlers[event_type]
+            while True:
+                for handler in type_handlers:
+                    handler(event)
+                if type_routed:
+                    for handler in type_routed.get(event.symbol, ()):
+                        handler(event)
+                processed += 1
+
+                # what the event raised at its timestamp, fills before orders before signals
+                while fills or orders or signals:
+                    events = fills or orders or signals
+                    raised = events.popleft()
+                    raised_type = raised.type
+                    if queue and (queue[0][0] < raised.timestamp
+                                  or (queue[0][0] == raised.timestamp and queue[0][1] <= raised_type)):
+                        events.appendleft(raised)  # queued before for this timestamp, so that goes first
+                        raised = heappop(queue)[3]
+                        raised_type = raised.type
+                    for handler in handlers[raised_type]:
+                        handler(raised)
+                    routed = symbol_handlers[raised_type]
+                    if routed:
+                        for handler in routed.get(raised.symbol, ()):
+                            handler(raised)
+                    processed += 1
+
+                if feed is None:
+                    break
+                try:
+                    event = feed()  # a MarketEvent, as the one before
+                except StopIteration:
+                    break
+                timestamp = event.timestamp
+                if queue:
+                    head = queue[0]
+                    if head[0] < timestamp or (head[0] == timestamp and head[1] <= MARKET):
+                        heappush(queue, (timestamp, MARKET, next(sequence), event, feed))
+                        break
+                # nothing queued comes first: dispatch the next event of the feed without a heap round trip
+                self._now = timestamp
+        self.processed += processed
+        return processed
+
+
+class SMACrossStrategy(object):
+    ''' Long while the SMA1 of symbol is above its SMA2, flat otherwise; as SMAsCross,
+    signals start after the SMA2 warm-up.
+    '''
+
+    def __init__(self, engine, symbol, SMA1, SMA2, strength=1.):
+        self.engine = engine
+        self.symbol = symbol
+        self.warmup = SMA2
+        self.strength = strength
+        self.sma1 = SMA(SMA1)
+        self.sma2 = SMA(SMA2)
+        self.bars = 0
+        self.position = 0
+        engine.subscribe(MARKET, self.on_market, symbol)
+
+    def on_market(self, event):
+        sma1 = self.sma1.update(event.price)
+        sma2 = self.sma2.update(event.price)
+        self.bars += 1
+        if self.bars <= self.warmup:
+            return
+        if self.position == 0 and sma1 > sma2:
+            self.position = 1
+            self.engine.put(SignalEvent(event.timestamp, self.symbol, 1, self.strength))
+        elif self.position == 1 and sma1 < sma2:
+            self.position = 0
+            self.engine.put(SignalEvent(event.timestamp, self.symbol, -1))
+
+
+class Portfolio(object):
+    ''' Turns signals into orders and books the fills: cash, units per symbol,
+    the trade ledger, and cash and net wealth after every bar (equity_timestamp,
+    cash_balance, net_wealth).
+    '''
+
+    def __init__(self, engine, cash, symbols=None):
+        self.engine = engine
+        self.cash = cash
+        self.symbols = list(symbols) if symbols is not None else None
+        self._symbol_index = {symbol: i for i, symbol in enumerate(self.symbols or ())}
+        self.units = {}
+        self.last_prices = {}
+        self.market_value = 0.
+        self.trades = 0
+        self.trade_ledger = TradeLedger(self.symbols)
+        self.equity_timestamp = []
+        self.cash_balance = []
+        self.net_wealth = []
+        engine.subscribe(MARKET, self.on_market)
+        engine.subscribe(SIGNAL, self.on_signal)
+        engine.subscribe(FILL, self.on_fill)
+
+    def on_market(self, event):
+        symbol, price = event.symbol, event.price
+        units = self.units.get(symbol)
+        if units:
+            self.market_value += units * (price - self.last_prices[symbol])
+        self.last_prices[symbol] = price
+        equity = self.cash + self.market_value
+        if self.equity_timestamp and self.equity_timestamp[-1] == event.timestamp:
+            self.net_wealth[-1] = equity
+        else:
+            self.equity_timestamp.append(event.timestamp)
+            self.cash_balance.append(self.cash)
+            self.net_wealth.append(equity)
+
+    def on_signal(self, event):
+        symbol = event.symbol
+        if event.direction > 0:
+            units = int(self.cash * event.strength / self.last_prices[symbol])
+            side = TradeLedger.BUY
+        else:
+            units = self.units.get(symbol, 0)
+            side = TradeLedger.SELL
+        self.engine.put(OrderEvent(event.timestamp, symbol, side, units))
+
+    def on_fill(self, event):
+        symbol, units, price = event.symbol, event.units, event.price
+        signed = event.side * units
+        self.cash -= signed * price + event.commission
+        self.units[symbol] = self.units.get(symbol, 0) + signed
+        self.market_value += signed * self.last_prices[symbol]  # marked at the last close, as in on_market
+        self.trades += 1
+        self.trade_ledger.append(event.timestamp, event.side, units, price, event.commission,
+                                 self._symbol_index.get(symbol, 0))
+        if self.net_wealth:
+            self.cash_balance[-1] = self.cash
+            self.net_wealth[-1] = self.cash + self.market_value
+
+
+class SimulatedExecution(object):
+    ''' Fills every order at once at the last close of its symbol, with commission(units, price).'''
+
+    def __init__(self, engine, commission=None):
+        self.engine = engine
+        self.commission = commission
+        self.last_prices = {}
+        engine.subscribe(MARKET, self.on_market)
+        engine.subscribe(ORDER, self.on_order)
+
+    def on_market(self, event):
+        self.last_prices[event.symbol] = event.price
+
+    def on_order(self, event):
+        price = self.last_prices[event.symbol]
+        commission = self.commission(event.units, price) if self.commission else 0.
+        self.engine.put(FillEvent(event.timestamp, event.symbol, event.side, event.units, price, commission))
@@ -0,0 +1,258 @@
+import abc
+import math
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+INF = float('inf')
+
+
+class Indicator(metaclass=abc.ABCMeta):
+    ''' Streaming indicator: update(x) consumes one new bar in O(1) and returns the current value.
+
+    During warm-up the value is NaN, bar for bar the same as the pandas
+    expression named in each subclass (up to floating point rounding).
+    '''
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = NAN
+
+    @abc.abstractmethod
+    def update(self, x):
+        pass
+
+    @property
+    def ready(self):
+        return not math.isnan(self.value)
+
+    def update_many(self, values):
+        ''' Feed a whole array of bars, returning the value after each of them.'''
+        update = self.update
+        return np.array([update(x) for x in np.asarray(values, dtype=float).tolist()])
+
+
+class SMA(Indicator):
+    ''' Simple moving average, as series.rolling(window).mean().'''
+    __slots__ = ('window', '_buffer', '_pos', '_count', '_nans', '_sum', '_compensation')
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self._buffer = [0.] * window  # ring buffer of the last window bars
+        self._pos = 0
+        self._count = 0
+        self._nans = 0  # NaN or infinite bars in the window, the mean is NaN while there is any (as in pandas)
+        self._sum = 0.
+        self._compensation = 0.  # Kahan summation, keeps the running sum from drifting
+
+    def _add(self, x):
+        y = x - self._compensation
+        t = self._sum + y
+        self._compensation = (t - self._sum) - y
+        self._sum = t
+
+    def update(self, x):
+        old = self._buffer[self._pos]
+        if self._count == self.window:
+            if not -INF < old < INF:
+                self._nans -= 1
+            else:
+                self._add(-old)
+        else:
+            self._count += 1
+        self._buffer[self._pos] = x
+        self._pos = (self._pos + 1) % self.window
+        if not -INF < x < INF:
+            self._nans += 1
+        else:
+            self._add(x)
+
+        if self._count < self.window or self._nans:
+            self.value = NAN
+        else:
+            self.value = self._sum / self.window
+        return self.value
+
+    def _history(self):
+        ''' The last window - 1 bars, oldest first: what the next window still needs.'''
+        if self._count < self.window:
+            bars = self._buffer[:self._count]
+        else:
+            bars = self._buffer[self._pos:] + self._buffer[:self._pos]
+        return bars[max(len(bars) - self.window + 1, 0):] if self.window > 1 else []
+
+    def update_many(self, values):
+        ''' Vectorized update with a whole chunk of bars, e.g. one chunk of a barFeed.BarFeed.
+        The rolling mean runs over the carried history followed by the chunk, so the
+        warm-up continues across chunk boundaries; the state afterwards is the same
+        as after updating bar by bar.
+        '''
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return np.empty(0)
+        history = self._history()
+        bars = np.concatenate([history, values])
+        means = pd.Series(bars).rolling(self.window).mean().to_numpy()[len(history):]
+
+        tail = bars[-self.window:].tolist()
+        self._count = len(tail)
+        self._pos = len(tail) % self.window
+        self._buffer = tail + [0.] * (self.window - len(tail))
+        self._nans = sum(1 for x in tail if not -INF < x < INF)
+        self._sum = math.fsum(x for x in tail if -INF < x < INF)
+        self._compensation = 0.
+        self.value = float(means[-1])
+        return means
+
+
+class EMA(Indicator):
+    ''' Exponential moving average, as series.ewm(span=span, adjust=adjust).mean().'''
+    __slots__ = ('span', 'alpha', 'adjust', 'min_periods', '_numerator', '_denominator', '_count')
+
+    def __init__(self, span, adjust=True, min_periods=0):
+        super().__init__()
+        self.span = span
+        self.alpha = 2. / (span + 1.)
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self._numerator = 0.
+        self._denominator = 0.
+        self._count = 0
+
+    def update(self, x):
+        decay = 1. - self.alpha
+        if x != x:  # NaN: weights keep decaying, the value is carried forward
+            if self._count:
+                self._numerator *= decay
+                self._denominator *= decay
+            return self.value
+        self._count += 1
+        if self.adjust:
+            self._numerator = self._numerator * decay + x
+            self._denominator = self._denominator * decay + 1.
+        elif self._count == 1:
+            self._numerator = x
+            self._denominator = 1.
+        else:
+            # adjust=False: y = (1 - alpha) * y + alpha * x, the old weight decays further over NaN gaps
+            self._numerator = self._numerator * decay + self.alpha * x
+            self._denominator = self._denominator * decay + self.alpha
+        average = self._numerator / self._denominator
+        if not self.adjust:
+            self._numerator = average  # pandas resets the old weight to 1 after every observation
+            self._denominator = 1.
+        if self._count >= max(self.min_periods, 1):
+            self.value = average
+        return self.value
+
+
+class RollingStd(Indicator):
+    ''' Rolling standard deviation, as series.rolling(window).std(ddof).
+
+    Keeps the window mean and sum of squared deviations up to date with the
+    same add/remove recurrences as pandas, instead of sum and sum of squares.
+    Infinite bars are kept out of them like NaN ones, so the value is NaN while
+    one is in the window and recovers once it has left (as in pandas).
+    '''
+    __slots__ = ('window', 'ddof', 'mean', '_buffer', '_pos', '_count', '_nans', '_nobs', '_ssqdm')
+
+    def __init__(self, window, ddof=1):
+        super().__init__()
+        self.window = window
+        self.ddof = ddof
+        self.mean = NAN
+        self._buffer = [0.] * window
+        self._pos = 0
+        self._count = 0
+        self._nans = 0  # NaN or infinite bars in the window
+        self._nobs = 0  # finite bars in the window
+        self._ssqdm = 0.
+
+    def _add(self, x):
+        self._nobs += 1
+        if self._nobs == 1:
+            self.mean = x
+            self._ssqdm = 0.
+            return
+        delta = x - self.mean
+        self.mean += delta / self._nobs
+        self._ssqdm += ((self._nobs - 1) * delta ** 2) / self._nobs
+
+    def _remove(self, x):
+        self._nobs -= 1
+        if self._nobs == 0:
+            self.mean = NAN
+            self._ssqdm = 0.
+            return
+        delta = x - self.mean
+        self.mean -= delta / self._nobs
+        self._ssqdm -= ((self._nobs + 1) * delta ** 2) / self._nobs
+
+    def update(self, x):
+        old = self._buffer[self._pos]
+        if self._count == self.window:
+            if not -INF < old < INF:
+                self._nans -= 1
+            else:
+                self._remove(old)
+        else:
+            self._count += 1
+        self._buffer[self._pos] = x
+        self._pos = (self._pos + 1) % self.window
+        if not -INF < x < INF:
+            self._nans += 1
+        else:
+            self._add(x)
+
+        if self._count < self.window or self._nans or self._nobs <= self.ddof:
+            self.value = NAN
+        else:
+            self.value = math.sqrt(max(self._ssqdm, 0.) / (self._nobs - self.ddof))
+        return self.value
+
+
+class ZScore(Indicator):
+    ''' Distance from the rolling mean in rolling standard deviations,
+    as (series - series.rolling(window).mean()) / series.rolling(window).std().
+    '''
+    __slots__ = ('window', '_mean', '_std')
+
+    def __init__(self, window, ddof=1):
+        super().__init__()
+        self.window = window
+        self._mean = SMA(window)
+        self._std = RollingStd(window, ddof)
+
+    def update(self, x):
+        mean = self._mean.update(x)
+        std = self._std.update(x)
+        try:
+            self.value = (x - mean) / std
+        except ZeroDivisionError:  # constant window: NaN or +/-inf, as the pandas division gives
+            self.value = NAN if x == mean else math.copysign(math.inf, x - mean)
+        return self.value
+
+
+class Momentum(Indicator):
+    ''' Mean log return over the last window bars, as
+    np.log(series / series.shift(1)).rolling(window).mean() (the BacktestLongShort momentum signal).
+    '''
+    __slots__ = ('window', '_previous', '_mean')
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self._previous = NAN
+        self._mean = SMA(window)
+
+    def update(self, x):
+        previous = self._previous
+        if 0 < x < INF and 0 < previous < INF:
+            log_return = math.log(x / previous)
+        else:  # zero, negative, infinite or missing prices: +/-inf or NaN like np.log instead of raising
+            with np.errstate(all='ignore'):
+                log_return = float(np.log(np.float64(x) / previous))
+        self._previous = x
+        self.value = self._mean.update(log_return)
+        return self.value
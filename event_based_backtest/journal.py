@@ -0,0 +1,133 @@
+import sqlite3
+import sys
+from collections import namedtuple
+import pandas as pd
+
+# Levels: DEBUG balances after every trade, INFO trades and close-outs, SUMMARY run header and results
+DEBUG, INFO, SUMMARY, OFF = 10, 20, 30, 100
+
+JournalRecord = namedtuple('JournalRecord', ['timestamp', 'level', 'event', 'symbol', 'units', 'price', 'value',
+                                             'cash', 'text'])
+
+SEPARATOR = '=' * 55
+
+# console line(s) of every event; date is the timestamp formatted with the date format of the backtest
+FORMATS = {'start': '{text}\n' + SEPARATOR,
+           'buy': '{date} | buying {units} units at {price:.2f} ',
+           'sell': '{date} | selling {units} units at {price:.2f} ',
+           'buy_basket': '{date} | buying {units} symbols for {value:.2f} ',
+           'sell_basket': '{date} | selling {units} symbols for {value:.2f} ',
+           'balance': '{date} | current balance {cash:.2f}',
+           'close_out': '{date} | inventory {units} units at {price:.2f}\n' + SEPARATOR,
+           'close_out_basket': '{date} | inventory 0 units in {units} symbols\n' + SEPARATOR,
+           'final': 'Final balance   [$] {cash:.2f}\nTrades Executed [#] {units:.2f}\n' + SEPARATOR}
+
+
+def format_record(record, date_format='%Y-%m-%d'):
+    ''' The console line(s) of one journal record.'''
+    record = JournalRecord._make(record)
+    date = record.timestamp.strftime(date_format) if record.timestamp is not None else ''
+    line = FORMATS.get(record.event, '{date} | {event} {text}')
+    return line.format(date=date, **record._asdict())
+
+
+class Journal(object):
+    ''' In-memory journal of the trades and events of a backtest, written to its sinks in bulk.
+
+    record() only appends a tuple of the raw fields (a JournalRecord) when
+    level is at least the journal level, nothing is formatted or written on
+    the bar loop. flush() hands the buffered records to every sink at once,
+    it runs at the end of a run (close_out) and whenever buffer_size records
+    are waiting. Records flushed without a sink are dropped.
+    '''
+
+    def __init__(self, level=INFO, sinks=None, buffer_size=65536, date_format='%Y-%m-%d'):
+        self.level = level
+        self.sinks = list(sinks) if sinks is not None else []
+        self.buffer_size = buffer_size
+        self.date_format = date_format
+        self._records = []
+
+    def __len__(self):
+        return len(self._records)
+
+    def record(self, level, event, timestamp=None, symbol=None, units=None, price=None, value=None, cash=None,
+               text=None):
+        if level < self.level:
+            return
+        self._records.append((timestamp, level, event, symbol, units, price, value, cash, text))
+        if len(self._records) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._records:
+            return
+        records, self._records = self._records, []
+        for sink in self.sinks:
+            sink.write(records, self.date_format)
+
+
+class ConsoleSink(object):
+    ''' Formatted records to a text stream, sys.stdout at the time of the flush by default.'''
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, records, date_format):
+        stream = self.stream or sys.stdout
+        stream.write('\n'.join(format_record(record, date_format) for record in records) + '\n')
+
+
+class FileSink(object):
+    ''' Formatted records appended to a log file, e.g. one per job of a parameter sweep.'''
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, records, date_format):
+        with open(self.path, 'a') as file:
+            file.write('\n'.join(format_record(record, date_format) for record in records) + '\n')
+
+
+class DataFrameSink(object):
+    ''' Keeps the records in memory; to_frame() returns them as a DataFrame.'''
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, records, date_format):
+        self.records.extend(records)
+
+    def to_frame(self):
+        return pd.DataFrame(self.records, columns=JournalRecord._fields)
+
+
+class SQLiteSink(object):
+    ''' Records inserted into a SQLite table, one executemany per flush; timestamps are stored in ns.'''
+
+    def __init__(self, db_name, tbl_name='journal'):
+        self.db_name = db_name
+        self.tbl_name = tbl_name
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.tbl_name} (TIMESTAMP INTEGER, LEVEL INTEGER, EVENT TEXT, '
+                         f'SYMBOL TEXT, UNITS REAL, PRICE REAL, VALUE REAL, CASH REAL, TEXT TEXT)')
+        conn.close()
+
+    @staticmethod
+    def _row(record):
+        timestamp, *fields = record
+        timestamp = pd.Timestamp(timestamp).value if timestamp is not None else None
+        return [timestamp] + [field.item() if hasattr(field, 'item') else field for field in fields]  # NumPy scalars
+
+    def write(self, records, date_format):
+        with sqlite3.connect(self.db_name) as conn:
+            conn.executemany(f'INSERT INTO {self.tbl_name} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             map(self._row, records))
+        conn.close()
+
+    def to_frame(self):
+        with sqlite3.connect(self.db_name) as conn:
+            frame = pd.read_sql_query(f'SELECT * FROM {self.tbl_name}', conn)
+        conn.close()
+        frame['TIMESTAMP'] = pd.to_datetime(frame['TIMESTAMP'])
+        return frame
@@ -0,0 +1,176 @@
+import os
+import json
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+MinuteBars = namedtuple('MinuteBars', ['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+COLUMN_DTYPES = {'timestamp': np.int64,  # nanoseconds since the epoch
+                 'open': np.float32,
+                 'high': np.float32,
+                 'low': np.float32,
+                 'close': np.float32,
+                 'volume': np.int64}
+
+
+class MinuteBarStore(object):
+    ''' Memory-mapped store of intraday OHLCV bars, one directory of raw column files per symbol.
+
+    Every symbol has a sorted int64 nanosecond timestamp column, float32
+    open/high/low/close and int64 volume, 32 bytes per bar: a year of
+    regular-session minute bars (252 x 390) of 500 symbols takes about
+    1.6 GB. Opening a symbol only maps its files, ranges are found by binary
+    search on the timestamps and returned as views. New bars are appended to
+    the end of the files, so a daily update does not rewrite the history.
+    meta.json holds the number of bars of every symbol. An append writes and
+    fsyncs the columns before it atomically replaces meta.json, and opening the
+    store truncates the columns to that number, so bars of an append cut short
+    by a crash are dropped, never read half written.
+    '''
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._meta = self._read_meta()
+        self._maps = {}  # symbol -> MinuteBars of np.memmap, dropped when the symbol is appended to
+        self._truncate_columns()
+
+    def _read_meta(self):
+        meta_path = os.path.join(self.root, self.META_FILE)
+        if not os.path.isfile(meta_path):
+            return {'symbols': {}, 'rows': {}}
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if 'rows' not in meta:  # written before the bar counts were kept: the shortest column is complete
+            meta['rows'] = {symbol: min(self._file_rows(os.path.join(self.root, directory, f'{column}.bin'), dtype)
+                                        for column, dtype in COLUMN_DTYPES.items())
+                            for symbol, directory in meta['symbols'].items()}
+        return meta
+
+    @staticmethod
+    def _file_rows(path, dtype):
+        return os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.isfile(path) else 0
+
+    def _write_meta(self):
+        ''' Replace meta.json in one step: written and fsynced under a temporary name, then renamed.'''
+        tmp_path = os.path.join(self.root, self.META_FILE + '.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(self._meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, os.path.join(self.root, self.META_FILE))
+
+    def _truncate_columns(self):
+        ''' Cut every column back to the bar count in meta.json, dropping what an interrupted append left.'''
+        for symbol in self._meta['symbols']:
+            for column, dtype in COLUMN_DTYPES.items():
+                path = self._path(symbol, column)
+                size = self._meta['rows'][symbol] * np.dtype(dtype).itemsize
+                if os.path.isfile(path) and os.path.getsize(path) > size:
+                    os.truncate(path, size)
+
+    @property
+    def symbols(self):
+        return list(self._meta['symbols'])
+
+    def _path(self, symbol, column):
+        return os.path.join(self.root, self._meta['symbols'][symbol], f'{column}.bin')
+
+    def __len__(self):
+        return len(self._meta['symbols'])
+
+    def rows(self, symbol):
+        ''' Number of bars stored for symbol.'''
+        return self._meta['rows'].get(symbol, 0)
+
+    def _columns(self, symbol):
+        if symbol not in self._maps:
+            n = self.rows(symbol)
+            self._maps[symbol] = MinuteBars(*[
+                np.memmap(self._path(symbol, column), dtype=dtype, mode='r', shape=(n,)) if n else np.empty(0, dtype)
+                for column, dtype in COLUMN_DTYPES.items()])
+        return self._maps[symbol]
+
+    def append(self, symbol, bars):
+        ''' Append bars to symbol: a MinuteBars of arrays (or the six arrays in its order), with
+        timestamps in ns or datetime64, increasing and after the stored ones.
+        '''
+        bars = MinuteBars(*bars)
+        timestamp = np.asarray(bars.timestamp)
+        if np.issubdtype(timestamp.dtype, np.datetime64):
+            timestamp = timestamp.astype('datetime64[ns]').view(np.int64)
+        columns = {column: np.ascontiguousarray(values, dtype=COLUMN_DTYPES[column])
+                   for column, values in zip(COLUMN_DTYPES, [timestamp, *bars[1:]])}
+        if len({len(values) for values in columns.values()}) != 1:
+            raise ValueError('All columns must have the same number of bars')
+        timestamp = columns['timestamp']
+        if not len(timestamp):
+            return
+        if (np.diff(timestamp) <= 0).any():
+            raise ValueError(f'Timestamps of {symbol} are not increasing')
+        n = self.rows(symbol)
+        if n and timestamp[0] <= self._columns(symbol).timestamp[-1]:
+            raise ValueError(f'Bars of {symbol} must start after the last stored one')
+
+        if symbol not in self._meta['symbols']:
+            self._meta['symbols'][symbol] = f'sym_{len(self._meta["symbols"]):05d}'  # symbols such as 'BRK/B' are not used as file names
+            self._meta['rows'][symbol] = 0
+            os.makedirs(os.path.join(self.root, self._meta['symbols'][symbol]), exist_ok=True)
+            self._write_meta()
+        self._maps.pop(symbol, None)
+        # the columns first, each written from the end of the counted bars (over what a failed append left)
+        # and fsynced; only then does meta.json count the new bars
+        for column, values in columns.items():
+            path = self._path(symbol, column)
+            with open(path, 'r+b' if os.path.isfile(path) else 'wb') as file:
+                file.seek(n * values.itemsize)
+                file.truncate()
+                values.tofile(file)
+                file.flush()
+                os.fsync(file.fileno())
+        self._meta['rows'][symbol] = n + len(timestamp)
+        self._write_meta()
+
+    def append_frame(self, symbol, frame):
+        ''' Append a DataFrame of bars: DatetimeIndex and open, high, low, close, volume columns (any case).'''
+        frame = frame.rename(columns=str.lower)
+        self.append(symbol, MinuteBars(frame.index.values, *[frame[column].to_numpy() for column in MinuteBars._fields[1:]]))
+
+    def _slice(self, timestamp, start, end):
+        ''' Positions of [start, end] in the timestamps; a date without a time as end includes the whole day, as .loc.'''
+        first = 0 if start is None else int(np.searchsorted(timestamp, pd.Timestamp(start).value, 'left'))
+        if end is None:
+            return slice(first, len(timestamp))
+        end_ts = pd.Timestamp(end)
+        if isinstance(end, str) and ':' not in end and end_ts == end_ts.normalize():
+            last = np.searchsorted(timestamp, (end_ts + pd.Timedelta(days=1)).value, 'left')
+        else:
+            last = np.searchsorted(timestamp, end_ts.value, 'right')
+        return slice(first, int(last))
+
+    def bars(self, symbol, start=None, end=None):
+        ''' Bars of symbol between start and end as MinuteBars of read-only views into the files.'''
+        columns = self._columns(symbol)
+        rows = self._slice(columns.timestamp, start, end)
+        return MinuteBars(*[values[rows] for values in columns])
+
+    def load_frame(self, symbol, start=None, end=None):
+        ''' Bars of symbol between start and end as an OHLCV DataFrame indexed by timestamp.'''
+        bars = self.bars(symbol, start, end)
+        index = pd.DatetimeIndex(bars.timestamp.view('datetime64[ns]'), name='Date')
+        return pd.DataFrame({column: getattr(bars, column) for column in MinuteBars._fields[1:]}, index=index)
+
+    def load_closes(self, symbols=None, start=None, end=None):
+        ''' Close prices of several symbols (all if None), one float column per symbol on the union of
+        their timestamps, e.g. as the data of a BacktestBase.
+        '''
+        symbols = self.symbols if symbols is None else list(symbols)
+        closes = {}
+        for symbol in symbols:
+            bars = self.bars(symbol, start, end)
+            closes[symbol] = pd.Series(bars.close.astype(float),
+                                       index=pd.DatetimeIndex(bars.timestamp.view('datetime64[ns]'), name='Date'))
+        return pd.DataFrame(closes, columns=symbols)
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+from BacktestBase import BacktestBase
+from performance import calculate_metrics, periods_per_year, TRADING_DAYS
+
+# Shared state of a worker process, set once by _init_worker instead of being pickled with every task
+_price = None
+_smas = None
+_cash = None
+_commission_included = None
+_periods = None
+_benchmark_returns = None
+
+
+def _init_worker(price, smas, cash, commission_included, periods=TRADING_DAYS, benchmark_returns=None):
+    global _price, _smas, _cash, _commission_included, _periods, _benchmark_returns
+    _price = price
+    _smas = smas
+    _cash = cash
+    _commission_included = commission_included
+    _periods = periods
+    _benchmark_returns = benchmark_returns
+
+
+def sma_table(price, windows):
+    ''' Rolling means of price, computed once for every distinct window length.'''
+    series = pd.Series(price)
+    return {window: series.rolling(window).mean().to_numpy() for window in sorted(set(windows))}
+
+
+def sma_cross_net_wealth(price, sma1, sma2, warmup, cash, commission_included=False):
+    ''' Net wealth, trade count and win rate of the SMAsCross long/flat strategy.
+
+    Gives the same net_wealth column as SMAsCross.signal_calculation without a
+    bar loop: the position after each bar is the last strict crossing seen
+    (flat before the first one), so trades sit where it changes. Only the
+    trades are walked in Python, units and cash are then broadcast over the
+    holding periods. The win rate is the share of the buy/sell round trips that
+    made money, the last one closed at the final price if still open, as
+    TradeLedger.win_rate scores the backtest.
+    '''
+    n = len(price)
+    up = sma1[warmup:] > sma2[warmup:]
+    decisive = up | (sma1[warmup:] < sma2[warmup:])
+    last = np.maximum.accumulate(np.where(decisive, np.arange(len(up)), -1))
+    position = (last >= 0) & up[np.maximum(last, 0)]
+    trade_bars = np.flatnonzero(np.diff(position, prepend=False)) + warmup
+
+    held = [0]
+    cash_after = [float(cash)]
+    units = 0
+    pnl = []
+    for k, trade_price in enumerate(price[trade_bars].tolist()):
+        if k % 2 == 0:  # buy with all cash
+            cash_before = cash
+            units = int(cash / trade_price)
+            commission = BacktestBase.calculate_commission(units, trade_price) if commission_included else 0
+            cash -= (units * trade_price) + commission
+        else:  # sell all units
+            commission = BacktestBase.calculate_commission(units, trade_price) if commission_included else 0
+            cash += (units * trade_price) - commission
+            units = 0
+            pnl.append(cash - cash_before)
+        held.append(units)
+        cash_after.append(cash)
+    if units:  # closed out at the final price
+        pnl.append(cash + units * price[-1] - cash_before)
+    win_rate = np.mean(np.array(pnl) > 0) if pnl else np.nan
+
+    period = np.searchsorted(trade_bars, np.arange(n), side='right')  # 0 before the first trade
+    net_wealth = np.array(held, dtype=float)[period] * price + np.array(cash_after)[period]
+    return net_wealth, len(trade_bars) + 1, win_rate  # + 1 for the close out
+
+
+def score_net_wealth(net_wealth, periods=TRADING_DAYS, benchmark_returns=None):
+    ''' summary_stats metrics for a (bars x runs) block of net wealth curves, scored in one calculate_metrics call.'''
+    returns = np.zeros_like(net_wealth)
+    returns[1:] = net_wealth[1:] / net_wealth[:-1] - 1
+    metrics = calculate_metrics(returns, benchmark_returns, periods)  # flat runs (e.g. SMA1 == SMA2) score NaN
+    stats = {'Total Return': metrics.total_return,
+             'CAGR': metrics.cagr,
+             'Sharpe Ratio': metrics.sharpe_ratio,
+             'Sortino Ratio': metrics.sortino_ratio,
+             'Calmar Ratio': metrics.calmar_ratio,
+             'Max Drawdown': metrics.max_drawdown,
+             'Drawdown Duration': metrics.drawdown_duration}
+    if benchmark_returns is not None:
+        stats.update({'Information Ratio': metrics.information_ratio,
+                      'Beta': metrics.beta,
+                      'Alpha': metrics.alpha})
+    return stats
+
+
+def _run_chunk(combos):
+    ''' Backtest a chunk of (SMA1, SMA2) pairs against the worker's shared price data.'''
+    net_wealth = np.empty((len(_price), len(combos)))
+    trades = np.empty(len(combos), dtype=int)
+    win_rate = np.empty(len(combos))
+    for k, (SMA1, SMA2) in enumerate(combos):
+        net_wealth[:, k], trades[k], win_rate[k] = sma_cross_net_wealth(
+            _price, _smas[SMA1], _smas[SMA2], SMA2, _cash, _commission_included)
+    stats = score_net_wealth(net_wealth, _periods, _benchmark_returns)
+    stats['Trades'] = trades
+    stats['Win Rate'] = win_rate
+    stats['Final Balance'] = net_wealth[-1]
+    return combos, stats
+
+
+class SMAsCrossSweep(object):
+    ''' Parameter sweep of the SMAsCross strategy over a (SMA1, SMA2) grid.'''
+
+    def __init__(self, symbol, start, end, cash, commission_included=False):
+        backtest = BacktestBase(symbol, start, end, cash, commission_included, verbose=False)
+        self.symbol = symbol
+        self.cash = cash
+        self.commission_included = commission_included
+        self.index = backtest.data.index
+        self.price = backtest.data[symbol].to_numpy(dtype=float)  # loaded once for the whole grid
+        self.periods = periods_per_year(self.index)  # bars per year, to annualize the scores
+        benchmark_returns = backtest.benchmark_returns()  # scored against BacktestBase.BENCHMARK_SYMBOL if available
+        self.benchmark_returns = benchmark_returns.to_numpy() if benchmark_returns is not None else None
+
+    def run(self, SMA1, SMA2, max_workers=None, chunks_per_worker=4):
+        ''' Run every (SMA1, SMA2) combination and return one row of stats per combination.
+        SMA1, SMA2: iterables of int
+            window lengths of the shorter and longer term simple moving average
+        max_workers: int
+            size of the process pool, defaults to the number of cores; 1 runs in process
+        '''
+        combos = list(product(SMA1, SMA2))
+        smas = sma_table(self.price, [w for combo in combos for w in combo])
+        initargs = (self.price, smas, self.cash, self.commission_included, self.periods, self.benchmark_returns)
+        max_workers = max_workers or os.cpu_count() or 1
+        n_chunks = max(1, min(len(combos), max_workers * chunks_per_worker))
+        chunks = [combos[i::n_chunks] for i in range(n_chunks)]
+
+        if max_workers == 1:
+            _init_worker(*initargs)
+            results = [_run_chunk(chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=initargs) as pool:
+                results = list(pool.map(_run_chunk, chunks))
+
+        frames = []
+        for chunk, stats in results:
+            frame = pd.DataFrame(chunk, columns=['SMA1', 'SMA2'])
+            for name, values in stats.items():
+                frame[name] = values
+            frames.append(frame)
+        return pd.concat(frames).sort_values(['SMA1', 'SMA2']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    sweep = SMAsCrossSweep('AAPL.O', '2010-1-1', '2019-12-31', 10000)
+    results = sweep.run(range(1, 101), range(1, 101))
+    print(results.sort_values('Sharpe Ratio', ascending=False).head(10))
@@ -1,5 +1,42 @@
 import numpy as np
 import pandas as pd
+from collections import namedtuple
+
+TRADING_DAYS = 252
+DAY_NS = 86400 * 10 ** 9
+
+
+def _epoch_ns(index):
+    ''' Nanoseconds since the epoch of a DatetimeIndex, in local time for tz-aware ones.'''
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return np.asarray(index, dtype='datetime64[ns]').view(np.int64)
+
+
+def is_intraday(index):
+    ''' True if any bar of the DatetimeIndex has a time of day.'''
+    return isinstance(index, pd.DatetimeIndex) and bool((_epoch_ns(index) % DAY_NS).any())
+
+
+def periods_per_year(index):
+    ''' Bars per year of a DatetimeIndex, to annualize its returns.
+
+    TRADING_DAYS for daily bars; for intraday bars TRADING_DAYS times the
+    median number of bars per day (98280 for regular-session minute bars);
+    one per median spacing for coarser bars (52 for weekly ones). Without a
+    DatetimeIndex the bars are taken to be daily.
+    '''
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return TRADING_DAYS
+    ns = _epoch_ns(index)
+    if (ns % DAY_NS).any():
+        days = ns // DAY_NS
+        day_ends = np.append(np.flatnonzero(np.diff(days)) + 1, len(days))  # the bars are sorted
+        return TRADING_DAYS * float(np.median(np.diff(day_ends, prepend=0)))
+    spacing_days = float(np.median(np.diff(ns))) / DAY_NS
+    if spacing_days <= 1.:
+        return TRADING_DAYS
+    return 365.25 / spacing_days
 
 
 def create_equity_curve_dataframe(data_df):
@@ -9,35 +46,192 @@ def create_equity_curve_dataframe(data_df):
     return data_df
 
 
-def calculate_sharpe_ratio(returns, periods=252):
+def calculate_sharpe_ratio(returns, periods=None):
+    if periods is None:  # from the bar frequency of the index
+        periods = periods_per_year(getattr(returns, 'index', None))
     return (np.sqrt(periods) * np.mean(returns)) / np.std(returns)
 
 
-def calculate_annualized_return(equity_curve):
+def calculate_annualized_return(equity_curve, periods=None):
+    if periods is None:
+        periods = periods_per_year(getattr(equity_curve, 'index', None))
     total_periods = len(equity_curve) - 1
     total_return = equity_curve.iloc[-1] / equity_curve.iloc[0] - 1
-    annualized_return = (1 + total_return) ** (
-                252 / total_periods) - 1  # Assuming daily returns and 252 trading days in a year
+    annualized_return = (1 + total_return) ** (periods / total_periods) - 1  # periods bars in a year
     return annualized_return
 
 
-def calculate_calmar_ratio(equity_curve):
-    annualized_return = calculate_annualized_return(equity_curve)
-    max_drawdown, _ = calculate_drawdowns(equity_curve)
+def calculate_calmar_ratio(equity_curve, max_drawdown=None, periods=None):
+    annualized_return = calculate_annualized_return(equity_curve, periods)
+    if max_drawdown is None:
+        max_drawdown, _ = calculate_drawdowns(equity_curve)
     calmar_ratio = annualized_return / max_drawdown
     return calmar_ratio
 
 
+Drawdowns = namedtuple('Drawdowns', ['drawdown', 'duration', 'max_drawdown', 'max_duration',
+                                     'peak', 'trough', 'recovery'])
+
+
+def drawdown_kernel(equity_curve):
+    """ Vectorized drawdown/duration of one equity curve or a 2-D block of them.
+
+    equity_curve: Series, DataFrame or array, bars along axis 0 and one
+        column per run for the 2-D case
+    Returns a Drawdowns tuple: the drawdown and duration series (same shape and
+    type as the input), the max drawdown/duration per curve and the peak,
+    trough and recovery of the max drawdown. These are index labels for
+    pandas input and positions otherwise; a curve that never recovers gets
+    None (labels) or -1 (positions).
+
+    As in the original loop, the high-water mark starts at 0 and the first bar
+    only seeds the series, so drawdown and duration are NaN there.
+    """
+    values = np.asarray(equity_curve, dtype=float)
+    one_d = values.ndim == 1
+    if one_d:
+        values = values[:, np.newaxis]
+    n, m = values.shape
+
+    drawdown = np.full((n, m), np.nan)
+    duration = np.full((n, m), np.nan)
+    if n > 1:
+        body = values[1:]
+        hwm = np.fmax.accumulate(np.fmax(body, 0), axis=0)  # fmax skips NaN bars, like max() in the loop
+        drawdown[1:] = hwm - body
+
+        # duration = bars since the last zero drawdown, NaN until the first one
+        rows = np.arange(1, n)[:, np.newaxis]
+        last_zero = np.maximum.accumulate(np.where(drawdown[1:] == 0, rows, -1), axis=0)
+        duration[1:] = np.where(last_zero >= 0, rows - last_zero, np.nan)
+
+    max_drawdown = np.fmax.reduce(drawdown, axis=0)
+    max_duration = np.fmax.reduce(duration, axis=0)
+
+    trough = np.argmax(np.where(np.isnan(drawdown), -np.inf, drawdown), axis=0)
+    is_zero = drawdown == 0
+    # peak: last zero-drawdown bar up to the trough, recovery: first one after it
+    before = is_zero & (np.arange(n)[:, np.newaxis] <= trough)
+    peak = np.where(before.any(axis=0), n - 1 - np.argmax(before[::-1], axis=0), 0)
+    after = is_zero & (np.arange(n)[:, np.newaxis] > trough)
+    recovery = np.where(after.any(axis=0), np.argmax(after, axis=0), -1)
+
+    index = getattr(equity_curve, 'index', None)
+    if index is not None:
+        peak, trough = index[peak], index[trough]
+        recovery = [index[r] if r >= 0 else None for r in recovery]
+        if one_d:
+            drawdown = pd.Series(drawdown[:, 0], index=index)
+            duration = pd.Series(duration[:, 0], index=index)
+        else:
+            columns = equity_curve.columns
+            drawdown = pd.DataFrame(drawdown, index=index, columns=columns)
+            duration = pd.DataFrame(duration, index=index, columns=columns)
+            max_drawdown = pd.Series(max_drawdown, index=columns)
+            max_duration = pd.Series(max_duration, index=columns)
+            peak = pd.Series(peak, index=columns)
+            trough = pd.Series(trough, index=columns)
+            recovery = pd.Series(recovery, index=columns, dtype=object)
+    elif one_d:
+        drawdown, duration = drawdown[:, 0], duration[:, 0]
+
+    if one_d:
+        return Drawdowns(drawdown, duration, max_drawdown[0], max_duration[0],
+                         peak[0], trough[0], recovery[0])
+    return Drawdowns(drawdown, duration, max_drawdown, max_duration, peak, trough, recovery)
+
+
 def calculate_drawdowns(equity_curve):
-    hwm = [0]
-    eq_index = equity_curve.index
-    drawdown = pd.Series(index=eq_index)
-    duration = pd.Series(index=eq_index)
-
-    for i in range(1, len(eq_index)):
-        current_hwm = max(hwm[i - 1], equity_curve.iloc[i])
-        hwm.append(current_hwm)
-        drawdown.iloc[i] = hwm[i] - equity_curve.iloc[i]
-        duration.iloc[i] = 0 if drawdown.iloc[i] == 0 else duration.iloc[i - 1] + 1
-
-    return drawdown.max(), duration.max()
+    result = drawdown_kernel(equity_curve)
+    return result.max_drawdown, result.max_duration
+
+
+class Metrics(namedtuple('Metrics', ['total_return', 'cagr', 'volatility', 'sharpe_ratio', 'sortino_ratio',
+                                     'calmar_ratio', 'max_drawdown', 'drawdown_duration', 'positive_bars',
+                                     'information_ratio', 'tracking_error', 'beta', 'alpha', 'correlation'])):
+    ''' Result of calculate_metrics: scalars for one return series, one value per run otherwise.'''
+    __slots__ = ()
+
+    def to_frame(self):
+        ''' One row per run, e.g. to rank the runs of a parameter sweep.'''
+        if isinstance(self.total_return, pd.Series):
+            return pd.DataFrame(self._asdict())
+        return pd.DataFrame({name: np.atleast_1d(value) for name, value in self._asdict().items()})
+
+
+def calculate_metrics(returns, benchmark_returns=None, periods=None):
+    """ All summary metrics of one return series or a (bars x runs) block of them at once.
+
+    returns: Series, DataFrame or array of per-bar returns, e.g. the pct_change of
+        the net wealth with 0 for the first bar, as create_equity_curve_dataframe
+    benchmark_returns: per-bar returns of a benchmark (e.g. SPY) on the same bars,
+        1-D for all runs or one column per run; without it the benchmark-relative
+        fields (information ratio, tracking error, beta, alpha, correlation) are NaN
+    periods: bars per year, inferred from the index of returns if None
+
+    The equity curve, the drawdowns and the return moments are computed once
+    for all runs. Sharpe, Calmar, max drawdown and its duration equal the
+    separate calculate_* functions; cagr is the annualized return of the
+    equity curve (NaN for a single bar), positive_bars the share of the bars
+    with a non-zero return that gained (a bar statistic, not the win rate of
+    the trades), alpha is annualized and beta against the benchmark returns.
+    """
+    if periods is None:
+        periods = periods_per_year(getattr(returns, 'index', None))
+    values = np.asarray(returns, dtype=float)
+    one_d = values.ndim == 1
+    if one_d:
+        values = values[:, np.newaxis]
+    n, m = values.shape
+    scale = np.sqrt(periods)
+
+    with np.errstate(divide='ignore', invalid='ignore'):  # flat runs score NaN or inf
+        equity_curve = np.cumprod(1.0 + values, axis=0)
+        drawdowns = drawdown_kernel(equity_curve)
+        mean = values.mean(axis=0)
+        deviation = values - mean
+        std = np.sqrt((deviation ** 2).mean(axis=0))
+        downside = np.sqrt((np.minimum(values, 0.) ** 2).mean(axis=0))
+        total_return = equity_curve[-1] - 1.0
+        if n > 1:
+            cagr = (equity_curve[-1] / equity_curve[0]) ** (periods / (n - 1)) - 1
+        else:  # no time elapsed
+            cagr = np.full(m, np.nan)
+        positive_bars = (values > 0).sum(axis=0) / (values != 0).sum(axis=0)
+        fields = {'total_return': total_return,
+                  'cagr': cagr,
+                  'volatility': scale * std,
+                  'sharpe_ratio': scale * mean / std,
+                  'sortino_ratio': scale * mean / downside,
+                  'calmar_ratio': cagr / drawdowns.max_drawdown,
+                  'max_drawdown': drawdowns.max_drawdown,
+                  'drawdown_duration': drawdowns.max_duration,
+                  'positive_bars': positive_bars}
+
+        if benchmark_returns is None:
+            for name in ('information_ratio', 'tracking_error', 'beta', 'alpha', 'correlation'):
+                fields[name] = np.full(m, np.nan)
+        else:
+            benchmark = np.asarray(benchmark_returns, dtype=float)
+            if benchmark.ndim == 1:
+                benchmark = benchmark[:, np.newaxis]
+            active = values - benchmark
+            active_mean = active.mean(axis=0)
+            active_std = np.sqrt(((active - active_mean) ** 2).mean(axis=0))
+            benchmark_mean = benchmark.mean(axis=0)
+            benchmark_deviation = benchmark - benchmark_mean
+            benchmark_var = (benchmark_deviation ** 2).mean(axis=0)
+            covariance = (deviation * benchmark_deviation).mean(axis=0)
+            beta = covariance / benchmark_var
+            fields['information_ratio'] = scale * active_mean / active_std
+            fields['tracking_error'] = scale * active_std
+            fields['beta'] = beta
+            fields['alpha'] = periods * (mean - beta * benchmark_mean)
+            fields['correlation'] = covariance / (std * np.sqrt(benchmark_var))
+
+    if one_d:
+        return Metrics(**{name: float(np.asarray(value).reshape(-1)[0]) for name, value in fields.items()})
+    columns = getattr(returns, 'columns', None)
+    if columns is not None:
+        return Metrics(**{name: pd.Series(np.broadcast_to(value, (m,)), index=columns) for name, value in fields.items()})
+    return Metrics(**{name: np.broadcast_to(value, (m,)).copy() for name, value in fields.items()})
@@ -0,0 +1,165 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+class PriceCache(object):
+    ''' Memory-mapped columnar cache of a wide price CSV (date index + one column per symbol).
+
+    The CSV is parsed once, chunk by chunk, into <data dir>/.cache/<csv name>/:
+    the date index, a mask of the rows without any missing value and one .npy
+    file per symbol. Later loads memory-map those files, find the date range by binary
+    search on the index and slice without copying. The cache is rebuilt when
+    the size or modification time of the source CSV changes.
+    '''
+
+    META_FILE = 'meta.json'
+    INDEX_FILE = 'index.npy'
+    COMPLETE_FILE = 'complete.npy'
+
+    def __init__(self, csv_path, cache_dir=None):
+        self.csv_path = os.path.abspath(csv_path)
+        if cache_dir is None:
+            name = os.path.splitext(os.path.basename(self.csv_path))[0]
+            cache_dir = os.path.join(os.path.dirname(self.csv_path), '.cache', name)
+        self.cache_dir = cache_dir
+        self._meta = None
+        self._index = None
+
+    def _source_signature(self):
+        stat = os.stat(self.csv_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _read_meta(self):
+        meta_path = os.path.join(self.cache_dir, self.META_FILE)
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path) as file:
+            return json.load(file)
+
+    def is_valid(self):
+        ''' True if the cache exists and was built from the current source CSV.'''
+        meta = self._read_meta()
+        return meta is not None and meta['source'] == self._source_signature()
+
+    def build(self, chunk_rows=100000):
+        ''' Parse the source CSV and (re)write the cache files, chunk_rows lines at a time.'''
+        signature = self._source_signature()
+        n_rows = sum(len(chunk) for chunk in pd.read_csv(self.csv_path, usecols=[0], chunksize=chunk_rows))
+        columns = list(pd.read_csv(self.csv_path, index_col=0, nrows=0).columns)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        files = {column: f'col_{i:04d}.npy' for i, column in enumerate(columns)}  # symbols such as '.SPX' or 'EUR=' are not used as file names
+        complete = np.lib.format.open_memmap(os.path.join(self.cache_dir, self.COMPLETE_FILE), 'w+', bool, (n_rows,))
+        values = {column: np.lib.format.open_memmap(os.path.join(self.cache_dir, files[column]), 'w+', float, (n_rows,))
+                  for column in columns}
+        dates = None
+        index_name = None
+        row = 0
+        for chunk in pd.read_csv(self.csv_path, index_col=0, parse_dates=True, chunksize=chunk_rows):
+            if dates is None:
+                index_name = chunk.index.name
+                dates = np.lib.format.open_memmap(os.path.join(self.cache_dir, self.INDEX_FILE), 'w+',
+                                                  chunk.index.values.dtype, (n_rows,))
+            rows = slice(row, row + len(chunk))
+            dates[rows] = chunk.index.values
+            complete[rows] = chunk.notna().all(axis=1).to_numpy()
+            for column in columns:
+                values[column][rows] = chunk[column].to_numpy(dtype=float)
+            row += len(chunk)
+        if dates is None:  # header only
+            np.save(os.path.join(self.cache_dir, self.INDEX_FILE), np.empty(0, dtype='datetime64[ns]'))
+        else:
+            dates.flush()
+        for array in [complete, *values.values()]:
+            array.flush()
+        del dates, complete, values
+
+        meta = {'source': signature, 'index_name': index_name, 'columns': files}
+        tmp_path = os.path.join(self.cache_dir, self.META_FILE + '.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.META_FILE))  # meta last, so a half-written cache is never valid
+        self._meta = None
+        self._index = None
+
+    def _ensure(self):
+        if self._meta is not None and self._meta['source'] == self._source_signature():
+            return
+        if not self.is_valid():
+            self.build()
+        self._meta = self._read_meta()
+        dates = np.load(os.path.join(self.cache_dir, self.INDEX_FILE), mmap_mode='r')
+        self._index = pd.DatetimeIndex(dates, name=self._meta['index_name'])
+
+    @property
+    def columns(self):
+        self._ensure()
+        return list(self._meta['columns'])
+
+    @property
+    def index(self):
+        self._ensure()
+        return self._index
+
+    def _column(self, symbol):
+        return np.load(os.path.join(self.cache_dir, self._meta['columns'][symbol]), mmap_mode='r')
+
+    def _slice(self, start, end):
+        ''' Positions of [start, end] in the date index, using the same rules as .loc[start:end].'''
+        return self._index.slice_indexer(start, end)
+
+    def load(self, symbol, start=None, end=None):
+        ''' Price series of one symbol between start and end, a read-only view of the cache file.'''
+        self._ensure()
+        rows = self._slice(start, end)
+        return pd.Series(self._column(symbol)[rows], index=self._index[rows], name=symbol, copy=False)
+
+    def load_frame(self, symbols=None, start=None, end=None, complete_rows=False):
+        ''' Prices of several symbols (all if None) between start and end, one read-only view of the
+        cache file per column.
+        complete_rows: bool
+            keep only the dates without a missing value in any column of the
+            source file, i.e. the rows read_csv(...).dropna() would keep; when
+            that drops dates, the selected rows are copied
+        '''
+        self._ensure()
+        symbols = self.columns if symbols is None else list(symbols)
+        rows = self._slice(start, end)
+        frame = pd.DataFrame({symbol: self._column(symbol)[rows] for symbol in symbols},
+                             index=self._index[rows], columns=symbols, copy=False)
+        if complete_rows:
+            mask = np.load(os.path.join(self.cache_dir, self.COMPLETE_FILE), mmap_mode='r')[rows]
+            if not mask.all():
+                frame = frame[mask]
+        return frame
+
+    def iter_chunks(self, symbols=None, start=None, end=None, chunk_rows=65536, complete_rows=False):
+        ''' load_frame(symbols, start, end, complete_rows) as consecutive frames of up to chunk_rows dates,
+        each a read-only view of the memory-mapped columns (a copy of the kept rows where complete_rows drops dates).
+        '''
+        self._ensure()
+        symbols = self.columns if symbols is None else list(symbols)
+        rows = self._slice(start, end)
+        first, last = rows.start, rows.stop
+        columns = {symbol: self._column(symbol) for symbol in symbols}
+        mask = np.load(os.path.join(self.cache_dir, self.COMPLETE_FILE), mmap_mode='r') if complete_rows else None
+        for chunk_start in range(first, last, chunk_rows):
+            chunk = slice(chunk_start, min(chunk_start + chunk_rows, last))
+            frame = pd.DataFrame({symbol: columns[symbol][chunk] for symbol in symbols},
+                                 index=self._index[chunk], columns=symbols, copy=False)
+            if mask is not None and not mask[chunk].all():
+                frame = frame[mask[chunk]]
+            yield frame
+
+
+_caches = {}
+
+
+def get_price_cache(csv_path):
+    ''' Shared PriceCache of csv_path, so the date index is only mapped once per process.'''
+    key = os.path.abspath(csv_path)
+    if key not in _caches:
+        _caches[key] = PriceCache(key)
+    return _caches[key]
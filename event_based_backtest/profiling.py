@@ -0,0 +1,79 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+import pandas as pd
+
+PhaseTiming = namedtuple('PhaseTiming', ['phase', 'seconds', 'bars', 'allocated_mb', 'peak_mb'])
+
+
+class RunProfile(object):
+    ''' Wall time, bar count and (with memory=True) allocations of every phase of a backtest run.
+
+    A phase is e.g. get_data, indicators, bar_loop, summary_stats or
+    plot_data. cprofile=True additionally collects cProfile statistics over
+    all phases, memory=True traces allocations with tracemalloc while a phase
+    runs: allocated_mb is what is still held at its end, peak_mb how far the
+    phase raised the traced peak. When the caller traces already, its peak is
+    left as it is, so a phase that stays below the caller's earlier peak
+    reports 0.
+    '''
+
+    def __init__(self, cprofile=False, memory=False):
+        self.phases = []
+        self.memory = memory
+        self.profiler = cProfile.Profile() if cprofile else None
+        self._depth = 0
+        self._tracing = False
+
+    @contextmanager
+    def phase(self, name, bars=None):
+        outer = self._depth == 0  # nested phases are timed, the captures run around the outermost one
+        self._depth += 1
+        if outer and self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        start_memory, start_peak = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+        if outer and self.profiler is not None:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if callable(bars):  # e.g. the length of the data loaded in the phase
+                try:
+                    bars = bars()
+                except Exception:  # the phase failed, do not hide its exception
+                    bars = None
+            if outer and self.profiler is not None:
+                self.profiler.disable()
+            allocated_mb = peak_mb = None
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                allocated_mb = (current - start_memory) / 2 ** 20
+                peak_mb = (peak - start_peak) / 2 ** 20
+                if outer and self._tracing:
+                    tracemalloc.stop()
+                    self._tracing = False
+            self._depth -= 1
+            self.phases.append(PhaseTiming(name, seconds, bars, allocated_mb, peak_mb))
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.phases, columns=PhaseTiming._fields).set_index('phase')
+        frame['bars_per_sec'] = frame['bars'] / frame['seconds']
+        return frame
+
+    def stats(self, sort='cumulative', limit=25):
+        ''' cProfile statistics of the profiled phases as text, None without cprofile.'''
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def __str__(self):
+        return self.to_frame().to_string(float_format=lambda x: f'{x:.4f}')
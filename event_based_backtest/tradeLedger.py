@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+
+class TradeLedger(object):
+    ''' Append-only columnar record of fills.
+
+    Every fill is one row of timestamp, side (+1 buy / -1 sell), units, price,
+    commission and the position of the symbol in self.symbols. The columns are
+    NumPy arrays that double their capacity when full, so recording n fills is
+    amortized O(n); a DataFrame is only built by to_frame().
+    '''
+
+    BUY = 1
+    SELL = -1
+
+    def __init__(self, symbols=None, capacity=64):
+        self.symbols = list(symbols) if symbols is not None else None
+        self._size = 0
+        self._timestamp = np.empty(capacity, dtype='datetime64[ns]')
+        self._side = np.empty(capacity, dtype=np.int8)
+        self._units = np.empty(capacity, dtype=float)
+        self._price = np.empty(capacity, dtype=float)
+        self._commission = np.empty(capacity, dtype=float)
+        self._symbol = np.empty(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._side)
+        if needed <= capacity:
+            return
+        capacity = max(2 * capacity, needed)
+        for name in ('_timestamp', '_side', '_units', '_price', '_commission', '_symbol'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, timestamp, side, units, price, commission=0., symbol=0):
+        ''' Record one fill, units are given unsigned.'''
+        self._reserve(1)
+        i = self._size
+        self._timestamp[i] = np.datetime64(timestamp, 'ns')
+        self._side[i] = side
+        self._units[i] = units
+        self._price[i] = price
+        self._commission[i] = commission
+        self._symbol[i] = symbol
+        self._size += 1
+
+    def extend(self, timestamp, side, units, price, commission=0., symbol=0):
+        ''' Record a batch of fills at one timestamp, e.g. all orders of a bar; scalars are broadcast.'''
+        units = np.atleast_1d(units)
+        n = len(units)
+        self._reserve(n)
+        rows = slice(self._size, self._size + n)
+        self._timestamp[rows] = np.datetime64(timestamp, 'ns')
+        self._side[rows] = side
+        self._units[rows] = units
+        self._price[rows] = price
+        self._commission[rows] = commission
+        self._symbol[rows] = symbol
+        self._size += n
+
+    # read-only views of the filled part of the columns
+    @property
+    def timestamp(self):
+        return self._timestamp[:self._size]
+
+    @property
+    def side(self):
+        return self._side[:self._size]
+
+    @property
+    def units(self):
+        return self._units[:self._size]
+
+    @property
+    def signed_units(self):
+        return self.side * self.units
+
+    @property
+    def price(self):
+        return self._price[:self._size]
+
+    @property
+    def commission(self):
+        return self._commission[:self._size]
+
+    @property
+    def symbol(self):
+        return self._symbol[:self._size]
+
+    def round_trip_pnl(self, marks=None):
+        ''' Profit of every closed round trip, in the order they close: the cash flows of the fills from
+        opening a position of a symbol until it is flat again, commissions included. A fill that flips
+        the position closes the trip with its share of units and opens the next one with the rest.
+        marks: prices at which positions still open are closed, e.g. the close-out prices; a scalar
+        or one price per position in self.symbols. Without marks open positions are left out.
+        '''
+        held = {}  # symbol -> signed units of the open position
+        flows = {}  # symbol -> cash flow since the position was opened
+        pnl = []
+        for symbol, units, price, commission in zip(self.symbol.tolist(), self.signed_units.tolist(),
+                                                    self.price.tolist(), self.commission.tolist()):
+            position = held.get(symbol, 0.)
+            if position * units < 0:  # reduces, closes or flips the position
+                closing = min(abs(units), abs(position))
+                share = closing / abs(units)
+                flows[symbol] -= share * (units * price + commission)
+                position += closing if units > 0 else -closing
+                if position == 0:
+                    pnl.append(flows.pop(symbol))
+                units *= 1 - share
+                commission *= 1 - share
+            if units:
+                flows[symbol] = flows.get(symbol, 0.) - (units * price + commission)
+                position += units
+            held[symbol] = position
+        if marks is not None:
+            for symbol, position in held.items():
+                if position:
+                    mark = marks[symbol] if np.ndim(marks) else marks
+                    pnl.append(flows[symbol] + position * mark)
+        return np.array(pnl, dtype=float)
+
+    def win_rate(self, marks=None):
+        ''' Share of the round trips (see round_trip_pnl) that made a profit, NaN without any.'''
+        pnl = self.round_trip_pnl(marks)
+        return float((pnl > 0).mean()) if len(pnl) else np.nan
+
+    def to_frame(self):
+        ''' Fills as a DataFrame indexed by timestamp; repeated timestamps are kept.'''
+        frame = pd.DataFrame({'side': self.side.copy(),
+                              'units': self.units.copy(),
+                              'price': self.price.copy(),
+                              'commission': self.commission.copy()},
+                             index=pd.DatetimeIndex(self.timestamp.copy(), name='Date'))
+        if self.symbols is not None:
+            frame['symbol'] = np.asarray(self.symbols, dtype=object)[self.symbol]
+        return frame
@@ -0,0 +1,288 @@
+''' Benchmarks of the backtest, metrics, event engine and database hot paths on synthetic GBM prices.
+
+Not collected by pytest; run it from the repository root, with the paths pytest.ini gives the tests:
+
+    PYTHONPATH=.:event_based_backtest python tests/benchmark_hotpaths.py              # compare with the baselines
+    PYTHONPATH=.:event_based_backtest python tests/benchmark_hotpaths.py --save       # store them as baselines
+    PYTHONPATH=.:event_based_backtest python tests/benchmark_hotpaths.py --max-bars 100000
+
+Every benchmark reports wall time (best of --repeat runs), throughput and the
+peak memory traced by tracemalloc in one extra run. Throughput more than
+--tolerance below the baseline is reported as a regression (exit code 1).
+Event engine throughput below TARGET_THROUGHPUT is only reported: absolute
+rates depend on the machine, the baselines are what the gate compares with.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from SMAsCross_QuickStart import SMAsCross
+from BacktestPortfolio import PortfolioSMAsCross
+from performance import calculate_drawdowns, calculate_metrics
+from eventEngine import (EventEngine, SignalEvent, SMACrossStrategy, Portfolio, SimulatedExecution, bar_feed,
+                         MARKET, SIGNAL)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+BAR_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+UNIVERSE_SIZES = [10, 100, 1000]
+ORDER_SIZES = [1_000, 10_000, 100_000]
+EVENT_SIZES = [100_000, 1_000_000, 10_000_000]
+RUN_SIZES = [10, 100, 1_000]
+# throughput the engine is designed for, reported when a run falls short of it (not a failure)
+TARGET_THROUGHPUT = {'event_engine_dispatch': 1_000_000, 'event_engine_queue': 1_000_000}
+
+
+def gbm_prices(n_bars, n_symbols=1, mu=0.05, sigma=0.2, s0=100., bars_per_year=252 * 390, seed=0):
+    ''' Geometric Brownian motion close prices, one column per symbol (S0000, S0001, ...).
+    Bars are regular-session minutes, so that 10M bars still fit into the pandas timestamp range.
+    '''
+    rng = np.random.default_rng(seed)
+    dt = 1. / bars_per_year
+    log_returns = rng.standard_normal((n_bars, n_symbols)) * (sigma * np.sqrt(dt)) + (mu - 0.5 * sigma ** 2) * dt
+    prices = s0 * np.exp(np.cumsum(log_returns, axis=0))
+    index = pd.date_range('2000-01-03', periods=n_bars, freq='min', name='Date')
+    return pd.DataFrame(prices, index=index, columns=[f'S{i:04d}' for i in range(n_symbols)])
+
+
+def measure(setup, run, repeat=1):
+    ''' Best wall time of run(setup()) over repeat runs, then its peak traced memory in one more run.
+    Only run is timed and traced, setup builds its input.
+    '''
+    seconds = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        seconds.append(time.perf_counter() - start)
+        del state
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(seconds), peak
+
+
+def quiet(run):
+    ''' run without the per-run prints of the backtests.'''
+    def wrapped(state):
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(state)
+    return wrapped
+
+
+########################################################################
+# Benchmarks: name -> (sizes, unit, function(size) -> (setup, run, items))
+########################################################################
+
+def bench_signal_calculation(n_bars):
+    prices = gbm_prices(n_bars)
+
+    def setup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return SMAsCross('S0000', None, None, 10000, verbose=False, data=prices)
+
+    return setup, quiet(lambda bt: bt.signal_calculation(42, 252)), n_bars
+
+
+def bench_calculate_drawdowns(n_bars):
+    equity_curve = gbm_prices(n_bars)['S0000'] / 100.
+    return (lambda: equity_curve), calculate_drawdowns, n_bars
+
+
+def bench_calculate_metrics(n_runs, n_bars=2520):
+    ''' All the metrics of a (bars x runs) block of returns against a benchmark, as a parameter sweep scores them.'''
+    prices = gbm_prices(n_bars, n_runs + 1).to_numpy()
+    returns = np.zeros_like(prices)
+    returns[1:] = prices[1:] / prices[:-1] - 1
+    return (lambda: returns), lambda block: calculate_metrics(block[:, 1:], block[:, 0], 252), n_runs * n_bars
+
+
+def bench_summary_stats(n_bars):
+    prices = gbm_prices(n_bars)
+
+    def setup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            bt = SMAsCross('S0000', None, None, 10000, verbose=False, data=prices)
+            bt.signal_calculation(42, 252)
+        return bt
+
+    return setup, quiet(lambda bt: bt.summary_stats()), n_bars
+
+
+def bench_portfolio(n_symbols, n_bars=2520):
+    prices = gbm_prices(n_bars, n_symbols)
+
+    def setup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return PortfolioSMAsCross(list(prices.columns), None, None, 10000 * n_symbols, verbose=False, data=prices)
+
+    return setup, quiet(lambda pobt: pobt.signal_calculation(42, 252)), n_bars * n_symbols
+
+
+def bench_order_sync(n_orders):
+    from IBconnect.simulatedBroker import SimulatedBroker, SimulatedClient
+    from database.databaseManager import DatabaseManager
+    import ib_insync
+
+    client = SimulatedClient(gbm_prices(10, 100), cash=1e12)
+    client.advance(1)
+    contracts = client.qualifyContracts(*[ib_insync.Stock(symbol, 'SMART', 'USD') for symbol in client.symbols])
+    for i in range(n_orders):
+        client.placeOrder(contracts[i % len(contracts)], ib_insync.MarketOrder('BUY' if i % 2 else 'SELL', 10))
+    client.waitOnUpdate()
+    db_dir = tempfile.mkdtemp()
+
+    def setup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_name = os.path.join(db_dir, f'{time.perf_counter_ns()}.db')
+            db_manager = DatabaseManager(broker=SimulatedBroker(SimulatedClient(client.prices)), db_name=db_name)
+        db_manager.client = client  # connect after construction, which prints every known trade
+        return db_manager
+
+    def run(db_manager):
+        db_manager.update_orders_in_db()
+        db_manager.close()
+
+    return setup, quiet(run), n_orders
+
+
+def bench_event_dispatch(n_events):
+    ''' Raw engine throughput: one feed, one handler that does nothing.'''
+    prices = gbm_prices(n_events)
+
+    def setup():
+        engine = EventEngine()
+        engine.subscribe(MARKET, lambda event: None)
+        engine.add_feed(bar_feed(prices))
+        return engine
+
+    return setup, lambda engine: engine.run(), n_events
+
+
+def bench_event_queue(n_events):
+    ''' Every market event raises a signal event, which is queued and dispatched before the next market event.'''
+    prices = gbm_prices(n_events // 2)
+
+    def setup():
+        engine = EventEngine()
+        engine.subscribe(MARKET, lambda event: engine.put(SignalEvent(event.timestamp, event.symbol, 1)))
+        engine.subscribe(SIGNAL, lambda event: None)
+        engine.add_feed(bar_feed(prices))
+        return engine
+
+    return setup, lambda engine: engine.run(), n_events // 2 * 2
+
+
+def bench_event_strategies(n_events, n_symbols=10):
+    ''' One feed of n_symbols, an SMA cross strategy per symbol, a shared portfolio and simulated execution.'''
+    prices = gbm_prices(n_events // n_symbols, n_symbols)
+
+    def setup():
+        engine = EventEngine()
+        for symbol in prices.columns:
+            SMACrossStrategy(engine, symbol, 42, 252, strength=1. / n_symbols)
+        Portfolio(engine, 10000. * n_symbols, list(prices.columns))
+        SimulatedExecution(engine, SMAsCross.calculate_commission)
+        engine.add_feed(bar_feed(prices))
+        return engine
+
+    return setup, lambda engine: engine.run(), n_events
+
+
+BENCHMARKS = {
+    'signal_calculation': (BAR_SIZES, 'bars', bench_signal_calculation),
+    'calculate_drawdowns': (BAR_SIZES, 'bars', bench_calculate_drawdowns),
+    'calculate_metrics': (RUN_SIZES, 'run bars', bench_calculate_metrics),
+    'summary_stats': (BAR_SIZES, 'bars', bench_summary_stats),
+    'portfolio_signal_calculation': (UNIVERSE_SIZES, 'symbol bars', bench_portfolio),
+    'update_orders_in_db': (ORDER_SIZES, 'orders', bench_order_sync),
+    'event_engine_dispatch': (EVENT_SIZES, 'events', bench_event_dispatch),
+    'event_engine_queue': (EVENT_SIZES, 'events', bench_event_queue),
+    'event_engine_strategies': (EVENT_SIZES, 'market events', bench_event_strategies),
+}
+
+
+def run_benchmarks(names, max_bars, max_symbols, repeat):
+    results = {}
+    for name in names:
+        sizes, unit, bench = BENCHMARKS[name]
+        limit = max_symbols if unit == 'symbol bars' else max_bars
+        for size in sizes:
+            if size > limit:
+                continue
+            setup, run, items = bench(size)
+            seconds, peak = measure(setup, run, repeat)
+            results[f'{name}/{size}'] = {'seconds': seconds, 'throughput': items / seconds, 'unit': f'{unit}/s',
+                                         'peak_mb': peak / 2 ** 20}
+            print(f'{name + "/" + str(size):40s} {seconds:9.4f}s {items / seconds:14,.0f} {unit}/s '
+                  f'{peak / 2 ** 20:9.1f} MB', flush=True)
+    return results
+
+
+def compare(results, baselines, tolerance):
+    ''' Names of the benchmarks whose throughput fell more than tolerance below the baseline.'''
+    regressions = []
+    for key, result in results.items():
+        if key not in baselines:
+            continue
+        change = result['throughput'] / baselines[key]['throughput'] - 1.
+        flag = ''
+        if change < -tolerance:
+            regressions.append(key)
+            flag = '  <-- regression'
+        print(f'{key:40s} {change:+8.1%} throughput vs baseline{flag}')
+    return regressions
+
+
+def below_target(results):
+    ''' Names of the benchmarks whose throughput is below their TARGET_THROUGHPUT, for information.'''
+    short = []
+    for key, result in results.items():
+        target = TARGET_THROUGHPUT.get(key.split('/')[0])
+        if target is not None and result['throughput'] < target:
+            short.append(key)
+            print(f'{key:40s} {result["throughput"]:14,.0f} {result["unit"]} below the target of {target:,}')
+    return short
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', default=list(BENCHMARKS), help='benchmarks to run (default: all)')
+    parser.add_argument('--max-bars', type=int, default=max(BAR_SIZES))
+    parser.add_argument('--max-symbols', type=int, default=max(UNIVERSE_SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed throughput loss, as a fraction')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.max_bars, args.max_symbols, args.repeat)
+    below_target(results)
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as file:
+            baselines = json.load(file)
+    if args.save:
+        baselines.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+        print(f'Baselines saved to {args.baseline}')
+        return 0
+    regressions = compare(results, baselines, args.tolerance)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
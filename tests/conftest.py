@@ -0,0 +1,15 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault('MPLBACKEND', 'Agg')  # BacktestBase imports pyplot
+
+
+@pytest.fixture(scope='session')
+def prices():
+    ''' Daily GBM closes of S0000 and SPY over 1500 business days, SPY being the benchmark of summary_stats.'''
+    rng = np.random.default_rng(7)
+    log_returns = rng.normal(0.0003, 0.015, (1500, 2))
+    index = pd.bdate_range('2010-01-04', periods=1500, name='Date')
+    return pd.DataFrame(100. * np.exp(np.cumsum(log_returns, axis=0)), index=index, columns=['S0000', 'SPY'])
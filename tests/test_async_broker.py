@@ -0,0 +1,60 @@
+''' AsyncBrokerAPI on a SimulatedClient instead of TWS.'''
+import asyncio
+import pytest
+
+from IBconnect.InteractiveBrokerAsyncTradeAPI import AsyncBrokerAPI
+from IBconnect.simulatedBroker import SimulatedClient
+
+
+@pytest.fixture
+def client(prices):
+    client = SimulatedClient(prices, cash=100000., latency=0.01)
+    client.advance(100)
+    return client
+
+
+def run_connected(client, coroutine):
+    ''' coroutine(connected AsyncBrokerAPI), run to completion.'''
+    async def main():
+        async with AsyncBrokerAPI(api_client=client).establish_connection() as broker:
+            return await coroutine(broker)
+    return asyncio.run(main())
+
+
+def test_fetch_last_prices(client):
+    async def fetch(broker):
+        return await broker.fetch_last_prices(['S0000', 'SPY', 'NOPE'], timeout=0.05)
+
+    prices = run_connected(client, fetch)
+    assert prices == {'S0000': client.last_price('S0000'), 'SPY': client.last_price('SPY'), 'NOPE': 0}
+    assert not client.isConnected()
+
+
+def test_contracts_are_qualified_once(client, monkeypatch):
+    qualified = []
+    qualify = client.qualifyContractsAsync
+
+    async def counting(*contracts):
+        qualified.extend(contract.symbol for contract in contracts)
+        return await qualify(*contracts)
+
+    monkeypatch.setattr(client, 'qualifyContractsAsync', counting)
+
+    async def fetch_twice(broker):
+        await broker.fetch_last_prices(['S0000', 'SPY'], timeout=0.05)
+        return await broker.fetch_last_price('S0000', timeout=0.05)
+
+    assert run_connected(client, fetch_twice) == client.last_price('S0000')
+    assert qualified == ['S0000', 'SPY']
+
+
+def test_submit_orders_fills_every_order(client):
+    async def submit(broker):
+        return await broker.submit_orders({'S0000': 10, 'SPY': -5, 'NOPE': 1}, timeout=5)
+
+    report = {order['ticker']: order for order in run_connected(client, submit)}
+    assert [report[ticker]['status'] for ticker in ('S0000', 'SPY', 'NOPE')] == ['Filled', 'Filled', 'Inactive']
+    assert report['S0000']['side'] == 'BUY' and report['SPY']['side'] == 'SELL'
+    assert report['S0000']['avg_fill_price'] == client.last_price('S0000')
+    assert all(order['latency'] is not None for order in report.values())
+    assert client.positions['S0000'][0] == 10 and client.positions['SPY'][0] == -5
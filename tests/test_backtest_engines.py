@@ -0,0 +1,37 @@
+''' The numpy engine of SMAsCross against the pandas reference loop.'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from SMAsCross_QuickStart import SMAsCross
+from journal import Journal, OFF
+
+SMA1, SMA2 = 10, 60
+LEDGER = ['units', 'cash', 'net_wealth']
+
+
+def run(prices, engine, commission_included=False):
+    backtest = SMAsCross('S0000', None, None, 10000, commission_included, verbose=False, data=prices,
+                         journal=Journal(OFF, []))
+    backtest.signal_calculation(SMA1, SMA2, engine)
+    return backtest
+
+
+@pytest.mark.parametrize('commission_included', [False, True])
+def test_numpy_engine_matches_pandas_loop(prices, commission_included):
+    reference = run(prices, 'pandas', commission_included)
+    backtest = run(prices, 'numpy', commission_included)
+    assert reference.trades > 2
+
+    # the reference fills the object columns of get_data, the numpy engine writes float ledgers
+    pd.testing.assert_frame_equal(backtest.data, reference.data, check_dtype=False)
+    assert (backtest.data[['cash', 'net_wealth']].dtypes == np.float64).all()
+    assert backtest.data['units'].iloc[:SMA2].isna().all()  # nothing stored during the SMA2 warm-up
+    pd.testing.assert_frame_equal(backtest.tradeRecord, reference.tradeRecord)
+    assert backtest.cash == pytest.approx(reference.cash)
+    assert backtest.trades == reference.trades
+
+
+def test_unknown_engine_raises(prices):
+    with pytest.raises(ValueError):
+        run(prices, 'cython')
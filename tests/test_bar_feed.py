@@ -0,0 +1,80 @@
+''' BarFeed sources chunk by chunk, and stream backtests reading them.'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from barFeed import BarFeed
+from database.barStore import BarStore
+from SMAsCross_QuickStart import SMAsCross
+from journal import Journal, OFF
+
+START, END = '2011-03-01', '2014-06-30'
+
+
+@pytest.fixture
+def csv_file(prices, tmp_path):
+    frame = prices.copy()
+    frame.iloc[[300, 301, 900], 1] = np.nan
+    path = str(tmp_path / 'closes.csv')
+    frame.to_csv(path)
+    return path
+
+
+def read_csv(path):
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+@pytest.mark.parametrize('source', ['csv', 'binary', 'data', 'bar_store'])
+@pytest.mark.parametrize('complete_rows', [False, True])
+def test_sources_give_the_same_bars(csv_file, tmp_path, source, complete_rows):
+    expected = read_csv(csv_file).loc[START:END]
+    if complete_rows:
+        expected = expected.dropna()
+    kwargs = {'binary': source == 'binary'}
+    if source == 'data':
+        kwargs['data'] = read_csv(csv_file)
+    store = BarStore(str(tmp_path / 'bars.db')) if source == 'bar_store' else None
+    if store is not None:
+        store.sync_csv(csv_file)
+        kwargs['bar_store'] = store
+
+    if source == 'bar_store':  # long rows: only the dates with a bar of the requested symbols
+        expected = expected.dropna(subset=['SPY'])
+
+    feed = BarFeed(csv_file, ['SPY'], START, END, chunk_bars=97, complete_rows=complete_rows, **kwargs)
+    chunks = list(feed.chunks())
+    assert len(chunks) > 1 and all(len(chunk) <= 97 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected[['SPY']], check_freq=False, check_index_type=False)
+    bars = list(feed)
+    assert len(bars) == len(expected) and bars[-1] == (expected.index[-1].value, (expected['SPY'].iloc[-1],))
+    if store is not None:
+        store.close()
+
+
+class SmallChunks(SMAsCross):
+    ''' Stream backtest reading 97 bars at a time, so the run crosses many chunk boundaries.'''
+
+    def feed(self, chunk_bars=97, binary=True):
+        return super().feed(chunk_bars, binary)
+
+
+def backtest(cls, csv_file, **kwargs):
+    return cls('S0000', START, END, 10000, True, verbose=False, file_path=csv_file, journal=Journal(OFF, []), **kwargs)
+
+
+def test_stream_backtest_matches_the_loaded_run(csv_file):
+    loaded = backtest(SMAsCross, csv_file)
+    loaded.signal_calculation(10, 60, 'event')
+    streamed = backtest(SmallChunks, csv_file, stream=True)
+    assert streamed.data is None
+    streamed.signal_calculation(10, 60)
+
+    pd.testing.assert_frame_equal(streamed.data[loaded.data.columns], loaded.data, check_freq=False)
+    np.testing.assert_allclose(streamed.data['SMA1'], loaded.data['S0000'].rolling(10).mean())
+    pd.testing.assert_frame_equal(streamed.tradeRecord, loaded.tradeRecord)
+    assert streamed.cash == pytest.approx(loaded.cash) and streamed.sma2.value == pytest.approx(loaded.sma2.value)
+
+
+def test_stream_backtest_runs_on_the_event_engine_only(csv_file):
+    with pytest.raises(ValueError, match='event'):
+        backtest(SmallChunks, csv_file, stream=True).signal_calculation(10, 60, 'numpy')
@@ -0,0 +1,87 @@
+''' BarStore loads and queries against the CSV they come from, and BacktestBase reading through it.'''
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.barStore import BarStore
+from BacktestBase import BacktestBase
+from journal import Journal, OFF
+
+
+@pytest.fixture
+def csv_file(prices, tmp_path):
+    frame = prices.copy()
+    frame.iloc[[10, 600, 601], 0] = np.nan
+    path = str(tmp_path / 'eod prices.csv')
+    frame.to_csv(path)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    with BarStore(str(tmp_path / 'bars.db')) as store:
+        yield store
+
+
+def read_csv(path):
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+def backtest(csv_file, store, **kwargs):
+    return BacktestBase('S0000', None, None, 10000, file_path=csv_file, bar_store=store, verbose=False,
+                        journal=Journal(OFF, []), **kwargs)
+
+
+def test_queries_match_the_csv(csv_file, store):
+    tbl_name = store.sync_csv(csv_file)
+    assert tbl_name == 'eod_prices' and store.tables() == ['eod_prices']
+    assert store.symbols(tbl_name) == ['S0000', 'SPY']
+    expected = read_csv(csv_file)
+
+    frame = store.query_frame(['SPY', 'S0000'], '2011-01-01', '2012-06-30', tbl_name)
+    pd.testing.assert_frame_equal(frame, expected.loc['2011-01-01':'2012-06-30', ['SPY', 'S0000']],
+                                  check_freq=False, check_index_type=False)
+    complete = store.query_frame(None, '2010-01-01', '2013-12-31', tbl_name, complete_rows=True)
+    pd.testing.assert_frame_equal(complete, expected.loc['2010-01-01':'2013-12-31'].dropna(),
+                                  check_freq=False, check_index_type=False)
+
+    chunks = list(store.iter_chunks(None, '2010-01-01', '2013-12-31', tbl_name, chunk_bars=128, complete_rows=True))
+    assert len(chunks) > 1 and all(len(chunk) <= 128 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), complete)
+
+
+def test_date_only_end_covers_the_whole_day(store):
+    index = pd.date_range('2020-01-02 09:30', periods=3 * 390, freq='min')
+    index = index[index.indexer_between_time('09:30', '15:59')]
+    store.load_frame(pd.DataFrame({'X': np.arange(len(index), dtype=float)}, index=index), 'minutes')
+    frame = store.query_frame(['X'], '2020-01-02', '2020-01-02', 'minutes')
+    assert len(frame) == len(index[index.normalize() == '2020-01-02'])
+
+
+def test_backtest_syncs_a_fresh_store(csv_file, store):
+    stored = backtest(csv_file, store)  # the table does not exist yet
+    in_memory = BacktestBase('S0000', None, None, 10000, data=read_csv(csv_file), verbose=False,
+                             journal=Journal(OFF, []))
+    pd.testing.assert_frame_equal(stored.data, in_memory.data, check_freq=False, check_index_type=False)
+    assert store.is_current(csv_file)
+
+
+def test_backtest_reads_the_csv_as_it_is_now(csv_file, store):
+    backtest(csv_file, store)
+    frame = read_csv(csv_file).iloc[:800]
+    frame.iloc[-1, 0] = 1.
+    frame.to_csv(csv_file)
+    assert not store.is_current(csv_file)
+
+    data = backtest(csv_file, store).data
+    assert len(data) == len(frame.dropna()) and data['S0000'].iloc[-1] == 1.
+    chunks = list(backtest(csv_file, store, stream=True).feed(chunk_bars=100).chunks())
+    assert pd.concat(chunks)['S0000'].iloc[-1] == 1.
+
+
+def test_existing_table_without_its_csv(prices, tmp_path, store):
+    csv_file = str(tmp_path / 'gone.csv')
+    store.load_frame(prices, BarStore.table_name(csv_file))
+    assert not os.path.isfile(csv_file)
+    assert len(backtest(csv_file, store).data) == len(prices)
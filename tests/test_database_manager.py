@@ -0,0 +1,160 @@
+''' DatabaseManager on a SimulatedBroker, with its SQLite file in a temporary directory.'''
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+
+from database.databaseManager import DatabaseManager
+from IBconnect.simulatedBroker import SimulatedBroker, SimulatedClient
+
+
+@pytest.fixture
+def broker(prices):
+    client = SimulatedClient(prices, cash=1e9)
+    client.advance(10)
+    return SimulatedBroker(client)
+
+
+@pytest.fixture
+def manager(broker, tmp_path):
+    manager = DatabaseManager(broker=broker, db_name=str(tmp_path / 'ib.db'))
+    yield manager
+    manager.close()
+
+
+def trade(broker, orders, bars=1):
+    with broker.establish_connection() as sim:
+        sim.submit_orders(orders, timeout=1)
+    broker.client.advance(bars)
+
+
+def statements(db_conn):
+    ''' The SQL statements run on db_conn, recorded from now on.'''
+    executed = []
+    db_conn.set_trace_callback(executed.append)
+    return executed
+
+
+def test_one_connection_in_wal_mode(manager):
+    with manager.sqlite_connect() as first, manager.sqlite_connect() as second:
+        assert first is second is manager.db_conn
+    assert manager.db_conn.execute('PRAGMA journal_mode;').fetchone()[0] == 'wal'
+    executed = statements(manager.db_conn)
+    manager.get_orders()
+    manager.get_commission_from_db(1)
+    assert not [sql for sql in executed if 'sqlite_master' in sql or sql.startswith('CREATE')]
+
+
+def test_orders_are_written_in_one_transaction(broker, manager):
+    for _ in range(20):
+        trade(broker, {'S0000': 10, 'SPY': -5})
+    executed = statements(manager.db_conn)
+    manager.update_orders_in_db()
+
+    assert sum(sql.startswith('INSERT INTO orders') for sql in executed) == 40
+    assert [sql for sql in executed if sql in ('BEGIN ', 'COMMIT')] == ['BEGIN ', 'COMMIT']
+    orders = manager.get_orders()
+    assert len(orders) == 40 and set(orders['ORDER_STATUS']) == {'Filled'}
+    assert orders['COMMISSION'].sum() == pytest.approx(sum(fill.commissionReport.commission
+                                                           for fill in broker.client.fills()))
+
+
+def test_legacy_local_times_are_migrated_to_utc_once(broker, tmp_path, monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    db_name = str(tmp_path / 'legacy.db')
+    legacy = datetime.now() - timedelta(hours=1)  # written as naive local time before CREATE_TIME was UTC
+    with sqlite3.connect(db_name) as db_conn:
+        db_conn.execute('''CREATE TABLE orders (ID INTEGER PRIMARY KEY AUTOINCREMENT, CREATE_TIME DATETIME NOT NULL,
+            SYMBOL TEXT NOT NULL, ORDER_ID TEXT NOT NULL UNIQUE, ACTION TEXT NOT NULL, QUANTITY INT NOT NULL,
+            ORDER_STATUS TEXT NOT NULL, COMMISSION FLOAT NOT NULL, ACCOUNT TEXT NOT NULL);''')
+        db_conn.execute('INSERT INTO orders (CREATE_TIME, SYMBOL, ORDER_ID, ACTION, QUANTITY, ORDER_STATUS, COMMISSION, '
+                        "ACCOUNT) VALUES (?, 'SPY', 'legacy', 'BUY', 1, 'Filled', 1.5, 'DU0000001');", (str(legacy),))
+    db_conn.close()
+
+    try:
+        manager = DatabaseManager(broker=broker, db_name=db_name)
+        trade(broker, {'S0000': 10})
+        manager.update_orders_in_db()
+
+        orders = manager.get_orders(datetime.now(timezone.utc) - timedelta(hours=2), datetime.now(timezone.utc))
+        assert list(orders['ORDER_ID']) == ['legacy', '1']
+        assert orders['CREATE_TIME'].iloc[0] == str(legacy.astimezone(timezone.utc))
+        assert manager.get_commission_from_db(1) == pytest.approx(orders['COMMISSION'].sum())
+        assert manager.db_conn.execute('PRAGMA user_version;').fetchone()[0] == manager.IB_SQLITE_SCHEMA_VERSION
+        manager.close()
+
+        migrations = []
+        monkeypatch.setattr(DatabaseManager, '_sqlite_migrate_create_time',
+                            lambda self, db_conn: migrations.append(db_conn))
+        DatabaseManager(broker=broker, db_name=db_name).close()
+        assert not migrations  # a migrated database is not scanned again
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+class CountingFills(list):
+    ''' client.fills() counting the fills a sync reads.'''
+    read = 0
+
+    def __iter__(self):
+        for fill in super().__iter__():
+            self.read += 1
+            yield fill
+
+    def __reversed__(self):
+        for fill in super().__reversed__():
+            self.read += 1
+            yield fill
+
+
+def test_sync_without_new_executions_does_no_work(broker, manager, monkeypatch):
+    for _ in range(50):
+        trade(broker, {'S0000': 10, 'SPY': -5})
+    manager.update_orders_in_db()
+
+    fills = CountingFills(broker.client.fills())
+    monkeypatch.setattr(broker.client, 'fills', lambda: fills)
+    monkeypatch.setattr(broker.client, 'trades', lambda: pytest.fail('trades read without new executions'))
+    executed = statements(manager.db_conn)
+    manager.update_orders_in_db()
+    assert not executed and fills.read == 2  # the newest fill, at the watermark, and the one before it
+
+
+def test_only_executions_past_the_watermark_are_written(broker, manager, tmp_path):
+    trade(broker, {'S0000': 10})
+    manager.update_orders_in_db()
+    trade(broker, {'SPY': 5})
+    executed = statements(manager.db_conn)
+    manager.update_orders_in_db()
+    assert sum(sql.startswith('INSERT INTO orders') for sql in executed) == 1
+
+    restarted = DatabaseManager(broker=broker, db_name=str(tmp_path / 'ib.db'))
+    executed = statements(restarted.db_conn)
+    restarted.update_orders_in_db()  # the watermark was persisted: nothing to write after a restart
+    assert not executed
+    assert list(restarted.get_orders()['QUANTITY']) == [10, 5]
+    restarted.close()
+
+
+def test_late_commission_reports_are_added_once(broker, manager, tmp_path):
+    trade(broker, {'S0000': 10, 'SPY': -5})
+    late, on_time = sorted(broker.client.fills(), key=lambda fill: fill.contract.symbol)
+    commission = late.commissionReport.commission
+    late.commissionReport.execId, late.commissionReport.commission = '', 0.  # not reported yet
+    manager.update_orders_in_db()
+    assert manager.get_commission_from_db(1) == pytest.approx(on_time.commissionReport.commission)
+
+    restarted = DatabaseManager(broker=broker, db_name=str(tmp_path / 'ib.db'))  # the pending fill is persisted
+    restarted.update_orders_in_db()
+    late.commissionReport.execId, late.commissionReport.commission = late.execution.execId, commission
+    executed = statements(restarted.db_conn)
+    restarted.update_orders_in_db()
+    assert sum(sql.startswith('INSERT INTO orders') for sql in executed) == 1
+    restarted.update_orders_in_db()
+    orders = restarted.get_orders().set_index('SYMBOL')
+    assert orders.loc['S0000', 'COMMISSION'] == pytest.approx(commission)
+    assert orders.loc['SPY', 'COMMISSION'] == pytest.approx(on_time.commissionReport.commission)
+    assert not restarted._pending_fills
+    restarted.close()
@@ -0,0 +1,71 @@
+''' EventEngine dispatch order, and the event backtest against the pandas reference loop.'''
+import pandas as pd
+import pytest
+
+from eventEngine import (EventEngine, MarketEvent, SignalEvent, OrderEvent, FillEvent, bar_feed,
+                         MARKET, SIGNAL, ORDER, FILL)
+from SMAsCross_QuickStart import SMAsCross
+from journal import Journal, OFF
+
+
+def recording_engine():
+    ''' Engine whose handlers log (type, timestamp, symbol) of every event.'''
+    engine = EventEngine()
+    log = []
+    for event_type in (MARKET, SIGNAL, ORDER, FILL):
+        engine.subscribe(event_type, lambda event: log.append((event.type, event.timestamp, event.symbol)))
+    return engine, log
+
+
+def test_events_are_dispatched_in_timestamp_then_type_order():
+    engine, log = recording_engine()
+    engine.subscribe(MARKET, lambda event: engine.put(SignalEvent(event.timestamp, event.symbol, 1)), 'A')
+    engine.subscribe(SIGNAL, lambda event: engine.put(OrderEvent(event.timestamp, event.symbol, 1, 10)))
+    engine.subscribe(ORDER, lambda event: engine.put(FillEvent(event.timestamp, event.symbol, 1, 10, 1.)))
+    engine.add_feed([MarketEvent(1, 'A', 1.), MarketEvent(3, 'A', 1.), MarketEvent(5, 'A', 1.)])
+    engine.add_feed([MarketEvent(2, 'B', 1.), MarketEvent(3, 'B', 1.), MarketEvent(4, 'B', 1.)])
+    engine.put(FillEvent(4, 'C', 1, 1, 1.))  # queued ahead of time: before the market event of its timestamp
+    engine.put(SignalEvent(6, 'C', -1))  # after both feeds
+
+    processed = engine.run()
+    assert processed == len(log) == 6 + 3 * 3 + 1 + 3
+    assert [entry[1] for entry in log] == sorted(entry[1] for entry in log)
+    # what a market event raises is handled before the next market event, signal -> order -> fill
+    assert log[:4] == [(MARKET, 1, 'A'), (SIGNAL, 1, 'A'), (ORDER, 1, 'A'), (FILL, 1, 'A')]
+    assert [entry for entry in log if entry[1] == 3] == [(MARKET, 3, 'A'), (SIGNAL, 3, 'A'), (ORDER, 3, 'A'),
+                                                         (FILL, 3, 'A'), (MARKET, 3, 'B')]
+    # queued events of a timestamp go by type, fills before market events
+    assert [entry for entry in log if entry[1] == 4] == [(FILL, 4, 'C'), (MARKET, 4, 'B')]
+    assert log[-3:] == [(SIGNAL, 6, 'C'), (ORDER, 6, 'C'), (FILL, 6, 'C')]
+
+
+def test_raised_events_wait_for_queued_ones_of_higher_priority():
+    engine, log = recording_engine()
+    engine.put(MarketEvent(1, 'A', 1.))
+    engine.put(OrderEvent(1, 'B', 1, 1))  # queued before the market event raised its signal
+    engine.subscribe(MARKET, lambda event: engine.put(SignalEvent(event.timestamp, event.symbol, 1)))
+    engine.run()
+    assert log == [(ORDER, 1, 'B'), (MARKET, 1, 'A'), (SIGNAL, 1, 'A')]
+
+
+def test_symbol_handlers_run_after_the_handlers_of_all_symbols():
+    engine = EventEngine()
+    calls = []
+    engine.subscribe(MARKET, lambda event: calls.append(('A only', event.symbol)), 'A')
+    engine.subscribe(MARKET, lambda event: calls.append(('all', event.symbol)))
+    engine.add_feed(bar_feed(pd.DataFrame({'A': [1., 2.], 'B': [3., float('nan')]},
+                                          index=pd.date_range('2020-01-01', periods=2))))
+    engine.run()
+    assert calls == [('all', 'A'), ('A only', 'A'), ('all', 'B'), ('all', 'A'), ('A only', 'A')]
+
+
+def test_event_engine_matches_pandas_loop(prices):
+    def run(engine):
+        backtest = SMAsCross('S0000', None, None, 10000, True, verbose=False, data=prices, journal=Journal(OFF, []))
+        backtest.signal_calculation(10, 60, engine)
+        return backtest
+
+    reference, backtest = run('pandas'), run('event')
+    pd.testing.assert_frame_equal(backtest.data, reference.data[backtest.data.columns], check_dtype=False)
+    pd.testing.assert_frame_equal(backtest.tradeRecord, reference.tradeRecord)
+    assert backtest.cash == pytest.approx(reference.cash) and backtest.trades == reference.trades
@@ -0,0 +1,151 @@
+''' Streaming indicators against the pandas expressions they replace, and the backtests they drive.'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import Indicator, SMA, EMA, RollingStd, ZScore, Momentum
+from BacktestLongShort import BacktestLongShort
+from SMAsCross_QuickStart import SMAsCross
+from journal import Journal, OFF
+
+WINDOW = 20
+
+
+@pytest.fixture
+def series(prices):
+    ''' A price path with a missing bar, infinite bars and a non-positive price in it.'''
+    series = prices['S0000'].reset_index(drop=True)
+    series.iloc[100] = np.nan
+    series.iloc[300] = np.inf
+    series.iloc[500] = -np.inf
+    series.iloc[700] = 0.
+    series.iloc[701] = -1.
+    return series
+
+
+def streamed(indicator, series):
+    return pd.Series([indicator.update(x) for x in series])
+
+
+def assert_matches(actual, expected):
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def test_sma(series):
+    assert_matches(streamed(SMA(WINDOW), series), series.rolling(WINDOW).mean())
+
+
+@pytest.mark.parametrize('adjust', [True, False])
+def test_ema(prices, adjust):
+    series = prices['S0000'].reset_index(drop=True)
+    series.iloc[[50, 51, 400]] = np.nan
+    assert_matches(streamed(EMA(WINDOW, adjust), series), series.ewm(span=WINDOW, adjust=adjust).mean())
+
+
+def test_rolling_std_recovers_after_non_finite_bars(series):
+    std = streamed(RollingStd(WINDOW), series)
+    assert_matches(std, series.rolling(WINDOW).std())
+    assert std.iloc[-1] == pytest.approx(series.iloc[-WINDOW:].std())
+
+
+def test_zscore_recovers_after_non_finite_bars(series):
+    mean = series.rolling(WINDOW).mean()
+    assert_matches(streamed(ZScore(WINDOW), series), (series - mean) / series.rolling(WINDOW).std())
+
+
+def test_momentum_on_non_positive_and_infinite_prices(series):
+    with np.errstate(all='ignore'):
+        expected = np.log(series / series.shift(1)).rolling(WINDOW).mean()
+    momentum = streamed(Momentum(WINDOW), series)  # no ValueError from math.log after the inf or 0 bars
+    assert_matches(momentum, expected)
+    assert np.isfinite(momentum.iloc[-1])
+
+
+def test_sma_update_many_carries_the_window_across_chunks(series):
+    chunked, single = SMA(WINDOW), SMA(WINDOW)
+    means = np.concatenate([chunked.update_many(chunk) for chunk in np.array_split(series.to_numpy(), 37)])
+    assert_matches(pd.Series(means), series.rolling(WINDOW).mean())
+    streamed(single, series)
+    for x in [101., 102., 103.]:  # same state afterwards as updating bar by bar
+        assert chunked.update(x) == pytest.approx(single.update(x))
+
+
+def test_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        Indicator()
+
+
+def test_stream_engine_matches_pandas_loop(prices):
+    def run(engine):
+        backtest = SMAsCross('S0000', None, None, 10000, True, verbose=False, data=prices, journal=Journal(OFF, []))
+        backtest.signal_calculation(10, 60, engine)
+        return backtest
+
+    reference, backtest = run('pandas'), run('stream')
+    pd.testing.assert_frame_equal(backtest.data, reference.data, check_dtype=False)
+    pd.testing.assert_frame_equal(backtest.tradeRecord, reference.tradeRecord)
+    assert backtest.cash == pytest.approx(reference.cash)
+    assert backtest.sma2.value == pytest.approx(prices['S0000'].iloc[-60:].mean())  # still warm
+
+
+class SignalRecorder(BacktestLongShort):
+    ''' BacktestLongShort recording its orders instead of placing them.'''
+    ftc = ptc = 0.
+
+    def go_long(self, bar, units=None, amount=None):
+        self.orders.append((bar, 'long'))
+
+    def go_short(self, bar, units=None, amount=None):
+        self.orders.append((bar, 'short'))
+
+    def place_buy_order(self, bar, units=None, cash=None):
+        self.orders.append((bar, 'buy'))
+
+    def place_sell_order(self, bar, units=None, cash=None):
+        self.orders.append((bar, 'sell'))
+
+    def close_out(self, bar):
+        pass
+
+
+def recorder(prices):
+    backtest = SignalRecorder('S0000', None, None, 10000, verbose=False, data=prices, journal=Journal(OFF, []))
+    backtest.orders = []
+    return backtest
+
+
+def long_short_orders(signal, start, long, short):
+    ''' The orders of the run_sma/run_momentum loops on a precomputed signal.'''
+    orders, position = [], 0
+    for bar in range(start, len(signal)):
+        if position in [0, -1] and long(bar):
+            orders.append((bar, 'long'))
+            position = 1
+        if position in [0, 1] and short(bar):
+            orders.append((bar, 'short'))
+            position = -1
+    return orders
+
+
+def test_long_short_strategies_trade_on_the_rolling_signals(prices):
+    price = prices['S0000']
+
+    backtest = recorder(prices)
+    backtest.run_sma_strategy(10, 60)
+    sma1, sma2 = price.rolling(10).mean().to_numpy(), price.rolling(60).mean().to_numpy()
+    expected = long_short_orders(sma1, 60, lambda bar: sma1[bar] > sma2[bar], lambda bar: sma1[bar] < sma2[bar])
+    assert len(expected) > 2 and backtest.orders == expected
+    np.testing.assert_allclose(backtest.data['SMA2'], sma2)
+
+    backtest = recorder(prices)
+    backtest.run_momentum_strategy(30)
+    momentum = np.log(price / price.shift(1)).rolling(30).mean().to_numpy()
+    expected = long_short_orders(momentum, 30, lambda bar: momentum[bar] > 0, lambda bar: momentum[bar] <= 0)
+    assert len(expected) > 2 and backtest.orders == expected
+
+    backtest = recorder(prices)
+    backtest.run_mean_reversion_strategy(50, 5)
+    sma = price.rolling(50).mean().to_numpy()
+    assert backtest.orders and backtest.orders[0][0] >= 50
+    bar, side = backtest.orders[0]
+    assert (price.iloc[bar] < sma[bar] - 5) if side == 'long' else (price.iloc[bar] > sma[bar] + 5)
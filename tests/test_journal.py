@@ -0,0 +1,80 @@
+''' Journal levels and buffering, its sinks, and the journal of a backtest run.'''
+import io
+import numpy as np
+import pandas as pd
+import pytest
+
+from journal import (Journal, ConsoleSink, FileSink, DataFrameSink, SQLiteSink, format_record,
+                     DEBUG, INFO, SUMMARY, OFF)
+from SMAsCross_QuickStart import SMAsCross
+
+DAY = pd.Timestamp('2024-01-02')
+
+
+def test_records_below_the_level_are_dropped():
+    sink = DataFrameSink()
+    journal = Journal(INFO, [sink])
+    journal.record(DEBUG, 'balance', DAY, cash=1.)
+    journal.record(INFO, 'buy', DAY, 'SPY', 10, 100., 1000.)
+    journal.record(SUMMARY, 'final', cash=2., units=1)
+    assert len(journal) == 2 and not sink.records  # nothing written before the flush
+    journal.flush()
+    assert list(sink.to_frame()['event']) == ['buy', 'final'] and len(journal) == 0
+
+    silent = Journal(OFF, [sink])
+    silent.record(SUMMARY, 'final', cash=2., units=1)
+    assert len(silent) == 0
+
+
+def test_full_buffer_is_flushed():
+    sink = DataFrameSink()
+    journal = Journal(DEBUG, [sink], buffer_size=3)
+    for i in range(7):
+        journal.record(DEBUG, 'balance', DAY, cash=float(i))
+    assert len(sink.records) == 6 and len(journal) == 1
+
+
+def test_console_and_file_sinks_format_the_records(tmp_path):
+    stream = io.StringIO()
+    path = str(tmp_path / 'run.log')
+    journal = Journal(DEBUG, [ConsoleSink(stream), FileSink(path)], date_format='%Y-%m-%d %H:%M')
+    journal.record(INFO, 'sell', DAY + pd.Timedelta(minutes=570), 'SPY', 10, 101.234, 1012.34)
+    journal.record(DEBUG, 'custom', DAY, text='note')
+    journal.flush()
+    lines = ['2024-01-02 09:30 | selling 10 units at 101.23 ', '2024-01-02 00:00 | custom note']
+    assert stream.getvalue() == '\n'.join(lines) + '\n'
+    journal.record(INFO, 'buy', DAY, 'SPY', 1, 1., 1.)
+    journal.flush()
+    with open(path) as file:
+        assert file.read().splitlines() == lines + [format_record((DAY, INFO, 'buy', 'SPY', 1, 1., 1., None, None),
+                                                                  '%Y-%m-%d %H:%M')]
+
+
+def test_sqlite_sink_round_trip(tmp_path):
+    sink = SQLiteSink(str(tmp_path / 'journal.db'))
+    journal = Journal(DEBUG, [sink])
+    journal.record(INFO, 'buy', DAY, 'SPY', np.int64(10), np.float64(100.5), 1005.)
+    journal.record(SUMMARY, 'final', cash=2., units=1)
+    journal.flush()
+    journal.record(DEBUG, 'balance', DAY, cash=3.)
+    journal.flush()
+
+    frame = sink.to_frame()
+    assert list(frame['EVENT']) == ['buy', 'final', 'balance']
+    assert frame['TIMESTAMP'].iloc[0] == DAY and pd.isna(frame['TIMESTAMP'].iloc[1])
+    assert frame['UNITS'].iloc[0] == 10 and frame['PRICE'].iloc[0] == 100.5
+
+
+def test_backtest_writes_its_trades_to_the_journal_only(prices, capsys):
+    sink = DataFrameSink()
+    backtest = SMAsCross('S0000', None, None, 10000, True, verbose=False, data=prices, journal=Journal(DEBUG, [sink]))
+    backtest.signal_calculation(10, 60)
+
+    assert capsys.readouterr().out == ''
+    events = sink.to_frame()
+    trades = events[events['event'].isin(['buy', 'sell'])]
+    assert len(trades) == len(backtest.tradeRecord) == backtest.trades - 1  # the close-out counts as a trade
+    assert (events['event'] == 'balance').sum() == len(trades)
+    assert events['event'].iloc[0] == 'start' and list(events['event'].iloc[-2:]) == ['close_out', 'final']
+    assert events['cash'].iloc[-1] == backtest.cash
+    assert list(trades['timestamp']) == list(backtest.tradeRecord.index)
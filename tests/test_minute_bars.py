@@ -0,0 +1,90 @@
+''' MinuteBarStore appends, range reads and recovery from an interrupted append; periods_per_year.'''
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from minuteBars import MinuteBarStore, MinuteBars, COLUMN_DTYPES
+from performance import periods_per_year
+
+
+def minute_frame(day, seed=0):
+    ''' One regular session of minute bars.'''
+    index = pd.date_range(f'{day} 09:30', f'{day} 15:59', freq='min', name='Date').as_unit('ns')
+    close = 100 + np.random.default_rng(seed).standard_normal(len(index)).cumsum()
+    return pd.DataFrame({'Open': close - 0.1, 'High': close + 0.5, 'Low': close - 0.5, 'Close': close,
+                         'Volume': np.arange(len(index)) * 10}, index=index)
+
+
+def expected(frame):
+    frame = frame.rename(columns=str.lower)
+    return frame.astype({column: dtype for column, dtype in COLUMN_DTYPES.items() if column != 'timestamp'})
+
+
+def test_append_and_read_ranges(tmp_path):
+    store = MinuteBarStore(str(tmp_path))
+    first, second = minute_frame('2024-01-02'), minute_frame('2024-01-03', 1)
+    store.append_frame('BRK/B', first)
+    store.append_frame('BRK/B', second)
+    assert store.symbols == ['BRK/B'] and store.rows('BRK/B') == 2 * 390
+
+    reopened = MinuteBarStore(str(tmp_path))
+    both = pd.concat([expected(first), expected(second)])
+    pd.testing.assert_frame_equal(reopened.load_frame('BRK/B'), both, check_freq=False)
+    pd.testing.assert_frame_equal(reopened.load_frame('BRK/B', '2024-01-03', '2024-01-03'), expected(second),
+                                  check_freq=False)
+    pd.testing.assert_frame_equal(reopened.load_frame('BRK/B', '2024-01-02 10:00', '2024-01-02 10:04'),
+                                  expected(first).loc['2024-01-02 10:00':'2024-01-02 10:04'], check_freq=False)
+    assert not reopened.bars('BRK/B').close.flags.writeable
+
+
+def test_appends_must_come_after_the_stored_bars(tmp_path):
+    store = MinuteBarStore(str(tmp_path))
+    store.append_frame('SPY', minute_frame('2024-01-03'))
+    with pytest.raises(ValueError, match='after the last stored'):
+        store.append_frame('SPY', minute_frame('2024-01-02'))
+    with pytest.raises(ValueError, match='not increasing'):
+        store.append_frame('SPY', minute_frame('2024-01-04').iloc[::-1])
+    assert store.rows('SPY') == 390
+
+
+def test_interrupted_append_is_dropped_on_open(tmp_path):
+    store = MinuteBarStore(str(tmp_path))
+    store.append_frame('SPY', minute_frame('2024-01-02'))
+    bars = MinuteBars(*[np.asarray(values, dtype=dtype)[:100] for values, dtype in
+                        zip(store.bars('SPY', '2024-01-02'), COLUMN_DTYPES.values())])
+    for column in ['timestamp', 'open', 'high']:  # crashed after three columns, before meta.json
+        with open(store._path('SPY', column), 'ab') as file:
+            getattr(bars, column).tofile(file)
+
+    reopened = MinuteBarStore(str(tmp_path))
+    assert reopened.rows('SPY') == 390
+    assert {os.path.getsize(reopened._path('SPY', column)) // np.dtype(dtype).itemsize
+            for column, dtype in COLUMN_DTYPES.items()} == {390}
+    second = minute_frame('2024-01-03', 1)
+    reopened.append_frame('SPY', second)
+    pd.testing.assert_frame_equal(MinuteBarStore(str(tmp_path)).load_frame('SPY', '2024-01-03'), expected(second),
+                                  check_freq=False)
+
+
+def test_meta_without_bar_counts_uses_the_shortest_column(tmp_path):
+    store = MinuteBarStore(str(tmp_path))
+    store.append_frame('SPY', minute_frame('2024-01-02'))
+    with open(store._path('SPY', 'close'), 'ab') as file:
+        np.zeros(5, dtype=np.float32).tofile(file)
+    meta_path = os.path.join(str(tmp_path), MinuteBarStore.META_FILE)
+    with open(meta_path) as file:
+        meta = json.load(file)
+    del meta['rows']
+    with open(meta_path, 'w') as file:
+        json.dump(meta, file)
+    assert MinuteBarStore(str(tmp_path)).rows('SPY') == 390
+
+
+def test_periods_per_year_follows_the_bar_frequency():
+    minutes = pd.concat([minute_frame('2024-01-02'), minute_frame('2024-01-03')]).index
+    assert periods_per_year(minutes) == 252 * 390
+    assert periods_per_year(pd.bdate_range('2024-01-01', periods=30)) == 252
+    assert periods_per_year(pd.date_range('2024-01-05', periods=30, freq='W-FRI')) == pytest.approx(365.25 / 7)
+    assert periods_per_year(pd.RangeIndex(10)) == 252
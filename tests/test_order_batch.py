@@ -0,0 +1,46 @@
+''' OrderBatch completion and BrokerAPI.submit_orders waiting on order status events.'''
+import ib_insync
+import pytest
+
+from IBconnect.InteractiveBrokerTradeAPI_test import OrderBatch
+from IBconnect.simulatedBroker import SimulatedBroker, SimulatedClient
+
+
+def trade(order_id, status):
+    order = ib_insync.MarketOrder('BUY', 1, orderId=order_id)
+    return ib_insync.Trade(ib_insync.Stock('SPY', 'SMART', 'USD'), order,
+                           ib_insync.OrderStatus(orderId=order_id, status=status))
+
+
+def test_batch_is_done_once_every_order_is_terminal():
+    batch = OrderBatch()
+    done = []
+    batch.on_done = lambda: done.append(True)
+    first, second = trade(1, 'Submitted'), trade(2, 'Submitted')
+    batch.add(first, 0.)
+    batch.add(second, 0.)
+
+    batch.on_status(first)
+    batch.on_status(trade(3, 'Filled'))  # not in the batch
+    assert not batch.done and not batch.latency
+
+    first.orderStatus.status = 'Filled'
+    batch.on_status(first)
+    batch.on_status(first)  # repeated status: the first terminal one counts
+    second.orderStatus.status = 'Inactive'
+    batch.on_status(second)
+    assert batch.done and done == [True]
+    assert [order['latency'] for order in batch.report()] == [batch.latency[1], batch.latency[2]]
+
+
+@pytest.mark.parametrize('latency, timeout, filled', [(0.01, 5, True), (5, 0.05, False)])
+def test_submit_orders_waits_until_done_or_timeout(prices, latency, timeout, filled):
+    client = SimulatedClient(prices, latency=latency)
+    client.advance(10)
+    with SimulatedBroker(client).establish_connection() as sim:
+        report = sim.submit_orders({'S0000': 10, 'SPY': -5}, timeout=timeout)
+
+    assert [order['status'] for order in report] == (['Filled'] * 2 if filled else ['PendingSubmit'] * 2)
+    assert all((order['latency'] is not None) == filled for order in report)
+    if filled:
+        assert all(latency <= order['latency'] < timeout for order in report)
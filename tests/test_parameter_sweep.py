@@ -0,0 +1,48 @@
+''' Every row of an SMAsCrossSweep against a separate SMAsCross backtest of the same parameters.'''
+import os
+import pandas as pd
+import pytest
+
+import parameterSweep
+from SMAsCross_QuickStart import SMAsCross
+from parameterSweep import SMAsCrossSweep
+from performance import create_equity_curve_dataframe, calculate_metrics
+from journal import Journal, OFF
+
+SYMBOL, START, END = 'AAPL.O', '2010-1-1', '2019-12-31'
+
+
+@pytest.fixture(autouse=True)
+def backtest_dir(monkeypatch):
+    ''' BacktestBase.DEFAULT_FILE_PATH is relative to the backtest directory, where the scripts run.'''
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(parameterSweep.__file__)))
+
+
+@pytest.mark.parametrize('commission_included', [False, True])
+def test_sweep_rows_match_single_backtests(commission_included):
+    sweep = SMAsCrossSweep(SYMBOL, START, END, 10000, commission_included)
+    table = sweep.run([5, 42], [66, 252, 30], max_workers=1)
+    assert len(table) == 6
+
+    for _, row in table.iterrows():
+        backtest = SMAsCross(SYMBOL, START, END, 10000, commission_included, verbose=False, journal=Journal(OFF, []))
+        backtest.signal_calculation(int(row['SMA1']), int(row['SMA2']))
+        data = create_equity_curve_dataframe(backtest.data)
+        metrics = calculate_metrics(data['returns'], backtest.benchmark_returns())
+
+        assert row['Trades'] == backtest.trades
+        assert row['Final Balance'] == pytest.approx(backtest.cash)
+        assert row['Total Return'] == pytest.approx(metrics.total_return)
+        assert row['CAGR'] == pytest.approx(metrics.cagr)
+        assert row['Sharpe Ratio'] == pytest.approx(metrics.sharpe_ratio, nan_ok=True)
+        assert row['Calmar Ratio'] == pytest.approx(metrics.calmar_ratio, nan_ok=True)
+        assert row['Max Drawdown'] == pytest.approx(metrics.max_drawdown)
+        assert row['Drawdown Duration'] == metrics.drawdown_duration
+        assert row['Win Rate'] == pytest.approx(backtest.trade_ledger.win_rate(backtest.close_out_prices()), nan_ok=True)
+        assert row['Beta'] == pytest.approx(metrics.beta, nan_ok=True)
+
+
+def test_sweep_is_the_same_in_a_process_pool():
+    sweep = SMAsCrossSweep(SYMBOL, START, END, 10000)
+    pd.testing.assert_frame_equal(sweep.run([5, 20], [66, 100], max_workers=2),
+                                  sweep.run([5, 20], [66, 100], max_workers=1))
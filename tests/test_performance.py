@@ -0,0 +1,67 @@
+''' The vectorized drawdown kernel against the bar loop calculate_drawdowns used to run.'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from performance import drawdown_kernel, calculate_drawdowns
+
+
+def loop_drawdowns(equity_curve):
+    ''' The original calculate_drawdowns, kept as the reference: drawdown and duration series.'''
+    hwm = [0]
+    eq_index = equity_curve.index
+    drawdown = pd.Series(index=eq_index, dtype=float)
+    duration = pd.Series(index=eq_index, dtype=float)
+
+    for i in range(1, len(eq_index)):
+        current_hwm = max(hwm[i - 1], equity_curve.iloc[i])
+        hwm.append(current_hwm)
+        drawdown.iloc[i] = hwm[i] - equity_curve.iloc[i]
+        duration.iloc[i] = 0 if drawdown.iloc[i] == 0 else duration.iloc[i - 1] + 1
+
+    return drawdown, duration
+
+
+@pytest.fixture
+def curves(prices):
+    returns = prices.pct_change().fillna(0)
+    curves = (1. + returns).cumprod()
+    curves.iloc[700, 0] = np.nan  # a missing bar is skipped by the high-water mark
+    return curves
+
+
+def test_kernel_matches_the_loop(curves):
+    for symbol in curves.columns:
+        drawdown, duration = loop_drawdowns(curves[symbol])
+        result = drawdown_kernel(curves[symbol])
+        pd.testing.assert_series_equal(result.drawdown, drawdown, check_names=False)
+        pd.testing.assert_series_equal(result.duration, duration, check_names=False)
+        assert calculate_drawdowns(curves[symbol]) == (drawdown.max(), duration.max())
+
+
+def test_block_of_curves_matches_each_curve(curves):
+    block = drawdown_kernel(curves)
+    for symbol in curves.columns:
+        single = drawdown_kernel(curves[symbol])
+        pd.testing.assert_series_equal(block.drawdown[symbol], single.drawdown, check_names=False)
+        assert block.max_drawdown[symbol] == single.max_drawdown
+        assert block.max_duration[symbol] == single.max_duration
+        assert (block.peak[symbol], block.trough[symbol], block.recovery[symbol]) == \
+               (single.peak, single.trough, single.recovery)
+
+    array = drawdown_kernel(curves.to_numpy())  # positions instead of labels
+    np.testing.assert_array_equal(array.max_drawdown, block.max_drawdown.to_numpy())
+    assert list(curves.index[array.trough]) == list(block.trough)
+
+
+def test_peak_trough_and_recovery():
+    index = pd.bdate_range('2020-01-01', periods=8)
+    curve = pd.Series([1., 1., 1.2, 1.1, 0.9, 1.0, 1.3, 1.25], index=index)
+    result = drawdown_kernel(curve)
+    assert result.max_drawdown == pytest.approx(0.3)
+    assert (result.peak, result.trough, result.recovery) == (index[2], index[4], index[6])
+    assert result.max_duration == 3  # three bars below the 1.2 peak
+    assert np.isnan(result.drawdown.iloc[0])  # the first bar only seeds the series
+
+    never = drawdown_kernel(curve.iloc[:6].to_numpy())
+    assert (never.peak, never.trough, never.recovery) == (2, 4, -1)
@@ -0,0 +1,66 @@
+''' PriceCache loads against read_csv of the same price file.'''
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from priceCache import PriceCache
+
+
+@pytest.fixture
+def csv_file(prices, tmp_path):
+    frame = prices.copy()
+    frame.iloc[[3, 500, 501], 1] = np.nan  # incomplete rows, dropped by complete_rows
+    path = tmp_path / 'prices.csv'
+    frame.to_csv(path)
+    return str(path)
+
+
+def read_csv(path):
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+def test_load_frame_matches_read_csv(csv_file):
+    cache = PriceCache(csv_file)
+    expected = read_csv(csv_file)
+    pd.testing.assert_frame_equal(cache.load_frame(), expected, check_freq=False)
+    pd.testing.assert_frame_equal(cache.load_frame(['SPY'], '2011-01-01', '2011-06-30'),
+                                  expected.loc['2011-01-01':'2011-06-30', ['SPY']], check_freq=False)
+    pd.testing.assert_frame_equal(cache.load_frame(complete_rows=True), expected.dropna(), check_freq=False)
+    pd.testing.assert_series_equal(cache.load('S0000', end='2010-03-01'), expected.loc[:'2010-03-01', 'S0000'],
+                                   check_freq=False)
+    assert os.path.isfile(os.path.join(cache.cache_dir, PriceCache.META_FILE))
+
+
+def test_frames_are_read_only_views_of_the_cache(csv_file):
+    cache = PriceCache(csv_file)
+    frame = cache.load_frame(['S0000'], '2011-01-01', '2011-12-31')
+    base = frame['S0000'].to_numpy()
+    while not isinstance(base, np.memmap) and isinstance(base, np.ndarray):
+        base = base.base
+    assert isinstance(base, np.memmap)  # no copy between the cache file and the frame
+    with pytest.raises(ValueError):
+        frame.iloc[0, 0] = 0.
+
+
+def test_iter_chunks_concatenate_to_load_frame(csv_file):
+    cache = PriceCache(csv_file)
+    for complete_rows in (False, True):
+        chunks = list(cache.iter_chunks(['S0000', 'SPY'], '2010-02-01', '2014-12-31', chunk_rows=100,
+                                        complete_rows=complete_rows))
+        assert len(chunks) > 1 and all(len(chunk) <= 100 for chunk in chunks)
+        pd.testing.assert_frame_equal(pd.concat(chunks),
+                                      cache.load_frame(['S0000', 'SPY'], '2010-02-01', '2014-12-31', complete_rows))
+
+
+def test_cache_is_rebuilt_when_the_csv_changes(csv_file):
+    cache = PriceCache(csv_file)
+    assert len(cache.index) == 1500
+    assert cache.is_valid()
+
+    frame = read_csv(csv_file).iloc[:1000]
+    frame.iloc[-1, 0] = 1.
+    frame.to_csv(csv_file)
+    assert not PriceCache(csv_file).is_valid()
+    assert len(cache.index) == 1000
+    assert cache.load('S0000').iloc[-1] == 1.
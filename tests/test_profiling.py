@@ -0,0 +1,67 @@
+''' RunProfile phases: timing, bar counts, cProfile and tracemalloc captures.'''
+import tracemalloc
+import numpy as np
+import pytest
+
+from profiling import RunProfile
+
+MB = 2 ** 20
+
+
+def test_phases_are_timed_with_their_bars():
+    profile = RunProfile()
+    data = []
+    with profile.phase('run', bars=1000):
+        with profile.phase('get_data', bars=lambda: len(data)):  # counted when the phase ends
+            data.extend(range(250))
+    with pytest.raises(KeyError):
+        with profile.phase('failing', bars=lambda: {}['bars']):
+            raise KeyError('phase')
+
+    get_data, run, failing = profile.phases  # in the order they end
+    assert (get_data.phase, run.phase, failing.phase) == ('get_data', 'run', 'failing')
+    assert (get_data.bars, run.bars, failing.bars) == (250, 1000, None)
+    assert run.seconds >= get_data.seconds > 0 and get_data.allocated_mb is None
+    assert profile.to_frame().loc['run', 'bars_per_sec'] == pytest.approx(1000 / run.seconds)
+    assert profile.stats() is None
+
+
+def test_cprofile_covers_the_outer_phase():
+    profile = RunProfile(cprofile=True)
+    with profile.phase('run'):
+        with profile.phase('inner'):
+            np.sort(np.arange(1000))
+    assert 'sort' in profile.stats()
+
+
+def test_memory_of_a_phase():
+    profile = RunProfile(memory=True)
+    with profile.phase('run'):
+        held = np.ones(4 * MB // 8)
+        with profile.phase('temporary'):
+            np.ones(8 * MB // 8).sum()
+    timing = profile.to_frame()
+    assert timing.loc['run', 'allocated_mb'] == pytest.approx(4, abs=0.5)
+    assert timing.loc['run', 'peak_mb'] == pytest.approx(12, abs=0.5)
+    assert timing.loc['temporary', 'peak_mb'] == pytest.approx(8, abs=0.5)
+    assert not tracemalloc.is_tracing()  # started by the profile, stopped with its outer phase
+    del held
+
+
+def test_caller_tracing_is_left_alone():
+    tracemalloc.start()
+    try:
+        np.ones(16 * MB // 8).sum()  # the caller's peak
+        _, caller_peak = tracemalloc.get_traced_memory()
+        profile = RunProfile(memory=True)
+        with profile.phase('small'):
+            np.ones(MB // 8).sum()
+        with profile.phase('large'):
+            np.ones(32 * MB // 8).sum()
+
+        small, large = profile.phases
+        assert small.peak_mb == 0  # below the caller's peak
+        assert large.peak_mb == pytest.approx(32 - caller_peak / MB, abs=0.5)
+        assert tracemalloc.is_tracing() and tracemalloc.get_traced_memory()[1] >= caller_peak
+    finally:
+        tracemalloc.stop()
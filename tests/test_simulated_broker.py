@@ -0,0 +1,53 @@
+''' SimulatedBroker and SimulatedClient: fills, commission and account state without TWS.'''
+import pytest
+
+from BacktestBase import BacktestBase
+from IBconnect.simulatedBroker import SimulatedBroker, SimulatedClient
+
+
+@pytest.fixture
+def broker(prices):
+    client = SimulatedClient(prices, cash=100000.)
+    client.advance(10)
+    return SimulatedBroker(client)
+
+
+def test_orders_fill_at_the_close_with_commission(broker):
+    client = broker.client
+    price = client.last_price('S0000')
+    with broker.establish_connection() as sim:
+        report = sim.submit_orders({'S0000': 100, 'NOPE': 1}, timeout=1)
+
+    assert [order['status'] for order in report] == ['Filled', 'Inactive']
+    assert report[0]['avg_fill_price'] == price
+    fill, = broker.fetch_transaction_history()
+    assert fill.execution.shares == 100 and fill.execution.side == 'BOT'
+    assert fill.commissionReport.commission == BacktestBase.calculate_commission(100, price)
+    assert client.cash == pytest.approx(100000. - 100 * price - fill.commissionReport.commission)
+    assert client.positions['S0000'] == [100, price]
+    assert not client.isConnected()
+
+
+def test_average_cost_and_account_values(broker):
+    client = broker.client
+    with broker.establish_connection() as sim:
+        sim.submit_orders({'S0000': 100}, timeout=1)
+        first = client.last_price('S0000')
+        client.advance(5)
+        second = client.last_price('S0000')
+        sim.submit_orders({'S0000': 50}, timeout=1)
+        sim.submit_orders({'S0000': -30}, timeout=1)  # reducing keeps the average cost
+        accounts, positions, _ = sim.retrieve_account_info()
+
+    assert client.positions['S0000'][0] == 120
+    assert client.positions['S0000'][1] == pytest.approx((100 * first + 50 * second) / 150)
+    position, = positions
+    assert position['quantity'] == 120 and position['market_value'] == pytest.approx(120 * second)
+    assert accounts[0]['total_value'] == pytest.approx(client.cash + 120 * second)
+
+
+def test_replay_stops_at_the_last_bar(prices):
+    client = SimulatedClient(prices)
+    assert client.advance(len(prices) - 1)
+    assert not client.advance()
+    assert client.date == prices.index[-1]
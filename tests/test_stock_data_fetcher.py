@@ -0,0 +1,52 @@
+''' StockDataFetcher.update_csv on a LocalPriceSource instead of yfinance.'''
+import os
+import pandas as pd
+import pytest
+
+from data.yfinance_dataFetch import StockDataFetcher, LocalPriceSource
+
+SYMBOLS = ['S0000', 'SPY']
+
+
+@pytest.fixture
+def csv_file(prices, tmp_path):
+    path = str(tmp_path / 'closes.csv')
+    prices.iloc[:1000].to_csv(path)  # saved a while ago
+    return path
+
+
+def fetcher(source):
+    return StockDataFetcher('2010-01-01', '2030-01-01', SYMBOLS, source)
+
+
+def read_csv(path):
+    return pd.read_csv(path, index_col=0, parse_dates=True)
+
+
+def test_only_the_new_bars_are_appended(prices, csv_file):
+    source = LocalPriceSource(prices)
+    merged = fetcher(source).update_csv(csv_file)
+    assert source.requests == 1
+    pd.testing.assert_frame_equal(read_csv(csv_file), prices, check_freq=False)
+    pd.testing.assert_frame_equal(merged, prices, check_freq=False)
+
+    mtime = os.stat(csv_file).st_mtime_ns
+    fetcher(source).update_csv(csv_file)  # up to date: the file is not rewritten
+    assert os.stat(csv_file).st_mtime_ns == mtime
+
+
+def test_stored_history_is_rescaled_after_a_dividend(prices, csv_file):
+    adjusted = prices.copy()
+    adjusted.iloc[:1100, 0] *= 0.98  # ex-dividend after the last stored date: the whole history before it moves
+    fetcher(LocalPriceSource(adjusted)).update_csv(csv_file)
+
+    result = read_csv(csv_file)
+    pd.testing.assert_frame_equal(result, adjusted, check_freq=False)
+    returns = result['S0000'].pct_change()
+    assert returns.abs().max() == pytest.approx(prices['S0000'].pct_change().abs().max())  # no jump at the seam
+
+
+def test_new_symbols_are_fetched_over_the_whole_range(prices, csv_file):
+    prices.iloc[:1000, :1].to_csv(csv_file)
+    fetcher(LocalPriceSource(prices)).update_csv(csv_file)
+    pd.testing.assert_frame_equal(read_csv(csv_file), prices, check_freq=False)
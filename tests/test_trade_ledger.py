@@ -0,0 +1,75 @@
+''' TradeLedger columns against the fills appended to it.'''
+import numpy as np
+import pandas as pd
+
+from tradeLedger import TradeLedger
+
+
+def test_append_grows_past_the_capacity():
+    ledger = TradeLedger(capacity=2)
+    dates = pd.bdate_range('2020-01-01', periods=5)
+    for k, date in enumerate(dates):
+        side = TradeLedger.BUY if k % 2 == 0 else TradeLedger.SELL
+        ledger.append(date, side, 10 + k, 100. + k, 0.5 * k)
+
+    assert len(ledger) == 5
+    frame = ledger.to_frame()
+    expected = pd.DataFrame({'side': np.array([1, -1, 1, -1, 1], dtype=np.int8),
+                             'units': [10., 11., 12., 13., 14.],
+                             'price': [100., 101., 102., 103., 104.],
+                             'commission': [0., 0.5, 1., 1.5, 2.]},
+                            index=pd.DatetimeIndex(dates, name='Date').as_unit('ns'))
+    pd.testing.assert_frame_equal(frame, expected, check_freq=False)
+    np.testing.assert_array_equal(ledger.signed_units, [10., -11., 12., -13., 14.])
+
+
+def test_extend_broadcasts_one_bar_of_fills():
+    ledger = TradeLedger(['AAA', 'BBB', 'CCC'], capacity=1)
+    ledger.append('2020-01-01', TradeLedger.BUY, 5, 10.)
+    ledger.extend('2020-01-02', TradeLedger.SELL, [1, 2], [11., 12.], 0.35, [2, 0])
+
+    frame = ledger.to_frame()
+    assert list(frame['symbol']) == ['AAA', 'CCC', 'AAA']
+    assert list(frame.index) == [pd.Timestamp('2020-01-01')] + [pd.Timestamp('2020-01-02')] * 2
+    np.testing.assert_array_equal(ledger.commission, [0., 0.35, 0.35])
+    np.testing.assert_array_equal(ledger.signed_units, [5., -1., -2.])
+
+
+def test_frame_does_not_share_the_columns():
+    ledger = TradeLedger()
+    ledger.append('2020-01-01', TradeLedger.BUY, 5, 10.)
+    frame = ledger.to_frame()
+    ledger.append('2020-01-02', TradeLedger.SELL, 5, 11.)  # may reuse the buffers frame was built from
+    assert len(frame) == 1 and frame['price'].iloc[0] == 10.
+
+
+def test_round_trips_of_long_and_short_positions():
+    ledger = TradeLedger(['AAA', 'BBB'])
+    ledger.append('2020-01-01', TradeLedger.BUY, 10, 100., 1., 0)
+    ledger.append('2020-01-02', TradeLedger.SELL, 4, 50., 0., 1)  # short BBB
+    ledger.append('2020-01-03', TradeLedger.SELL, 4, 110., 1., 0)  # AAA partly sold
+    ledger.append('2020-01-06', TradeLedger.SELL, 6, 90., 1., 0)
+    ledger.append('2020-01-07', TradeLedger.BUY, 4, 45., 0., 1)
+
+    np.testing.assert_allclose(ledger.round_trip_pnl(), [-1001. + 439. + 539., 20.])
+    assert ledger.win_rate() == 0.5
+
+
+def test_a_flip_closes_one_round_trip_and_opens_the_next():
+    ledger = TradeLedger()
+    ledger.append('2020-01-01', TradeLedger.BUY, 10, 100., 2.)
+    ledger.append('2020-01-02', TradeLedger.SELL, 20, 110., 4.)  # 10 close the long, 10 open a short
+    ledger.append('2020-01-03', TradeLedger.BUY, 10, 120., 2.)
+
+    np.testing.assert_allclose(ledger.round_trip_pnl(), [100. - 2. - 2., -100. - 2. - 2.])
+
+
+def test_marks_close_the_open_positions():
+    ledger = TradeLedger(['AAA', 'BBB'])
+    assert np.isnan(ledger.win_rate())
+    ledger.extend('2020-01-01', TradeLedger.BUY, [10, 5], [100., 20.], 0., [0, 1])
+    assert len(ledger.round_trip_pnl()) == 0 and np.isnan(ledger.win_rate())
+
+    np.testing.assert_allclose(ledger.round_trip_pnl(np.array([105., 18.])), [50., -10.])
+    np.testing.assert_allclose(ledger.round_trip_pnl(101.), [10., 405.])
+    assert ledger.win_rate(np.array([105., 18.])) == 0.5
@@ -0,0 +1,90 @@
+''' TradingCalendar parsing and lookups, and the calendar BrokerAPI keeps when it is not connected.'''
+import asyncio
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+import pytest
+
+from IBconnect.tradingCalendar import TradingCalendar
+from IBconnect.InteractiveBrokerAsyncTradeAPI import AsyncBrokerAPI
+from IBconnect.simulatedBroker import SimulatedBroker, SimulatedClient
+
+EASTERN = ZoneInfo('US/Eastern')
+LIQUID_HOURS = '20240102:0930-20240102:1600;20240103:0930-1600;20240106:CLOSED;20240108:0930-20240108:1600'
+
+
+def eastern(*args):
+    return datetime(*args, tzinfo=EASTERN)
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar.from_liquid_hours(LIQUID_HOURS, 'US/Eastern', date(2024, 1, 2))
+
+
+def test_sessions_are_parsed_in_both_formats(calendar):
+    assert calendar.opens == [eastern(2024, 1, 2, 9, 30), eastern(2024, 1, 3, 9, 30), eastern(2024, 1, 8, 9, 30)]
+    assert calendar.closes[1] == eastern(2024, 1, 3, 16, 0)  # old format, close on the same day
+    assert calendar.closed_days == [date(2024, 1, 6)]
+
+
+def test_is_open_and_next_session(calendar):
+    assert calendar.is_open(eastern(2024, 1, 2, 9, 30))
+    assert not calendar.is_open(eastern(2024, 1, 2, 16, 0))
+    assert not calendar.is_open(eastern(2024, 1, 2, 9, 29))
+    assert calendar.is_open(datetime(2024, 1, 3, 12, 0))  # naive: in the calendar time zone
+    assert calendar.is_open(datetime(2024, 1, 3, 17, 0, tzinfo=ZoneInfo('UTC')))
+    assert calendar.next_open(eastern(2024, 1, 3, 12, 0)) == eastern(2024, 1, 8, 9, 30)
+    assert calendar.next_close(eastern(2024, 1, 3, 12, 0)) == eastern(2024, 1, 3, 16, 0)
+    assert calendar.next_open(eastern(2024, 1, 9)) is None and calendar.next_close(eastern(2024, 1, 9)) is None
+    assert not calendar.is_trading_day(date(2024, 1, 6)) and calendar.is_trading_day(date(2024, 1, 8))
+
+
+def test_save_and_load(calendar, tmp_path):
+    file_path = str(tmp_path / 'calendar.json')
+    calendar.save(file_path)
+    loaded = TradingCalendar.load(file_path)
+    assert (loaded.opens, loaded.closes, loaded.closed_days, loaded.fetched_on) == \
+        (calendar.opens, calendar.closes, calendar.closed_days, calendar.fetched_on)
+
+
+def counting_details(client):
+    ''' Count the contract details requests of client.'''
+    requests = []
+    details = client.reqContractDetails
+
+    def counting(contract):
+        requests.append(contract.symbol)
+        return details(contract)
+
+    client.reqContractDetails = counting
+    return requests
+
+
+def test_broker_calendar_is_fetched_once_and_persisted(prices, tmp_path):
+    calendar_file = str(tmp_path / 'calendar.json')
+    client = SimulatedClient(prices)
+    requests = counting_details(client)
+    broker = SimulatedBroker(client, calendar_file=calendar_file)
+    with broker.establish_connection() as sim:
+        first = sim.trading_calendar()
+        assert sim.trading_calendar() is first and requests == ['SPY']
+    assert first.is_open(eastern(2010, 1, 4, 10, 0))  # first replayed bar
+    assert not first.is_open(eastern(2010, 1, 9, 10, 0))  # Saturday
+
+    offline = SimulatedBroker(client, calendar_file=calendar_file)  # never connected: read from the file
+    assert offline.trading_calendar().opens == first.opens and requests == ['SPY']
+
+
+def test_async_calendar_is_kept_after_disconnect(prices):
+    client = SimulatedClient(prices)
+    broker = AsyncBrokerAPI(api_client=client)
+
+    async def main():
+        async with broker.establish_connection():
+            first = await broker.trading_calendar()
+        return first, await broker.trading_calendar()  # disconnected: no request to the dead client
+
+    first, after_disconnect = asyncio.run(main())
+    assert after_disconnect is first
+    assert first.is_open(eastern(2010, 1, 4, 10, 0))
+    assert not first.is_open(eastern(2010, 1, 4, 17, 0))